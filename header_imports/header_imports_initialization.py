@@ -13,8 +13,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from resolver import *
 from analyzer import *
+from minimizer import *
 from collector import *
+from tracer import *
+from archive import *
 from compiler import *
+from payload import *
 from builder import *
 from utilities import *
+from cache import *
+from manifest import *
+from watcher import *
+from elf import *
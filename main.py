@@ -15,6 +15,46 @@ def main():
     parser.add_argument('--exclude', action='append', help='Exclude modules')
     parser.add_argument('--include', action='append', help='Include additional modules')
     parser.add_argument('--add-data', action='append', help='Add data files (format: src:dest)')
+    parser.add_argument('--cache-dir', help='Directory of the persistent build cache')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the persistent build cache')
+    parser.add_argument('--payload', choices=['append', 'embed'], default='append',
+                        help='Append the payload to a prebuilt bootstrap or embed it as C data')
+    parser.add_argument('--payload-access', choices=['mmap', 'read'], default='mmap',
+                        help='Map an appended payload read-only at runtime or read it into private memory')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Make the executable write per-module startup timings on exit')
+    parser.add_argument('--startup-profile',
+                        help='Lay out archives in the import order recorded by a --profile-startup run')
+    parser.add_argument('--trace-startup', action='store_true',
+                        help='Run the script at build time to record its import order for the archive layout')
+    parser.add_argument('--frozen-startup', action='store_true',
+                        help="Run the script's import phase at build time and ship the imported modules pre-marshalled as one section")
+    parser.add_argument('--freeze', action='append',
+                        help='Register modules matching this pattern as frozen modules (:local for all local modules, :small-stdlib for small stdlib modules)')
+    parser.add_argument('--compression', action='append',
+                        help='Codec per archive category (format: category=codec[:level], codecs: stored, deflate, zstd, lz4)')
+    parser.add_argument('--trace-analysis', action='store_true',
+                        help='Run the script at build time and add every module it loads to the analyzed dependencies')
+    parser.add_argument('--trace-args', action='append',
+                        help='Arguments of a traced analysis run of the script, repeatable (implies --trace-analysis)')
+    parser.add_argument('--trace-command', action='append',
+                        help='Shell command whose Python processes are traced for analysis, repeatable')
+    parser.add_argument('--lazy-imports', action='store_true',
+                        help='Load third-party modules that are only used inside functions lazily, on first attribute access')
+    parser.add_argument('--lazy-allow', action='append',
+                        help='Always load third-party modules matching this pattern lazily (implies --lazy-imports)')
+    parser.add_argument('--lazy-deny', action='append',
+                        help='Never load modules matching this pattern lazily')
+    parser.add_argument('--bundle-system-libs', action='store_true',
+                        help='Also bundle the shared libraries extension modules load from system directories')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Keep a stable work directory and manifest and only redo work for changed files')
+    parser.add_argument('--watch', action='store_true',
+                        help='Stay running and rebuild incrementally whenever a local module or data file changes')
+    parser.add_argument('--jobs', type=int, help='Number of parallel analysis and compile workers (default: CPU count)')
+    parser.add_argument('--no-minimize-stdlib', action='store_true', help='Keep every analyzed stdlib module')
+    parser.add_argument('--stdlib-allow', action='append', help='Always keep stdlib modules matching this pattern')
+    parser.add_argument('--stdlib-deny', action='append', help='Drop stdlib modules matching this pattern')
     
     args = parser.parse_args()
     
@@ -40,42 +80,51 @@ def main():
         output_name = script_path.stem
     
     # Initialize configuration
-    config = ConfigManager(
-        script_path=script_path,
-        output_name=output_name,
-        onefile=args.onefile,
-        windowed=args.windowed,
-        debug=args.debug,
-        exclude_modules=args.exclude or [],
-        include_modules=args.include or [],
-        add_data=args.add_data or []
-    )
+    try:
+        config = ConfigManager(
+            script_path=script_path,
+            output_name=output_name,
+            onefile=args.onefile,
+            windowed=args.windowed,
+            debug=args.debug,
+            exclude_modules=args.exclude or [],
+            include_modules=args.include or [],
+            add_data=args.add_data or [],
+            cache_dir=args.cache_dir,
+            no_cache=args.no_cache,
+            payload_mode=args.payload,
+            payload_access=args.payload_access,
+            profile_startup=args.profile_startup,
+            startup_profile=args.startup_profile,
+            trace_startup=args.trace_startup,
+            compression=args.compression or [],
+            frozen_startup=args.frozen_startup,
+            freeze=args.freeze or [],
+            incremental=args.incremental or args.watch,
+            trace_analysis=args.trace_analysis,
+            trace_args=args.trace_args or [],
+            trace_commands=args.trace_command or [],
+            lazy_imports=args.lazy_imports or bool(args.lazy_allow),
+            lazy_allow=args.lazy_allow or [],
+            lazy_deny=args.lazy_deny or [],
+            bundle_system_libs=args.bundle_system_libs,
+            jobs=args.jobs,
+            minimize_stdlib=not args.no_minimize_stdlib,
+            stdlib_allow=args.stdlib_allow or [],
+            stdlib_deny=args.stdlib_deny or []
+        )
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    
+    if args.watch:
+        config.compression_policy = resolve_compression_policy(config.compression_policy, logger)
+        BuildWatcher(config, logger).watch(lambda: build(config, logger))
+        return
     
     try:
-        logger.info(f"Converting Python {script_path} to executable...")
-        
-        # Step 1: Analyze dependencies
-        logger.info("Analyzing dependencies...")
-        analyzer = DependencyAnalyzer(config, logger)
-        dependencies = analyzer.analyze()
-        
-        # Step 2: Collect code and resources
-        logger.info("Collecting code and resources...")
-        collector = CodeCollector(config, logger)
-        collected_files = collector.collect(dependencies)
-        
-        # Step 3: Compile to bytecode
-        logger.info("Compiling to bytecode...")
-        compiler = BytecodeCompiler(config, logger)
-        bytecode_files = compiler.compile(collected_files)
-        
-        # Step 4: Build executable
-        logger.info("Building executable...")
-        builder = ExecutableBuilder(config, logger)
-        executable_path = builder.build(bytecode_files)
-        
-        logger.info(f"Executable created: {executable_path}")
-        
+        config.compression_policy = resolve_compression_policy(config.compression_policy, logger)
+        build(config, logger)
     except Exception as e:
         logger.error(f"Build failed: {e}")
         if args.debug:
@@ -83,5 +132,59 @@ def main():
             traceback.print_exc()
         sys.exit(1)
 
+def build(config: ConfigManager, logger: Logger) -> List[Path]:
+    """Run every build stage once and return the project files the executable was built from"""
+    logger.info(f"Converting Python {config.script_path} to executable...")
+    
+    # Step 1: Analyze dependencies
+    if config.trace_analysis or config.trace_args or config.trace_commands:
+        logger.info("Tracing imports at runtime...")
+        config.traced_modules = ImportTracer(config, logger).trace_analysis()
+    
+    logger.info("Analyzing dependencies...")
+    analyzer = DependencyAnalyzer(config, logger)
+    dependencies = analyzer.analyze()
+    
+    if config.minimize_stdlib:
+        logger.info("Minimizing standard library...")
+        minimizer = StdlibMinimizer(config, logger)
+        dependencies = minimizer.minimize(dependencies, analyzer.import_graph)
+    
+    if config.lazy_imports:
+        config.lazy_modules = analyzer.lazy_modules(dependencies['third_party'])
+        logger.info(f"Loading {len(config.lazy_modules)} third-party modules lazily")
+        logger.debug(f"Lazy modules: {', '.join(config.lazy_modules)}")
+    
+    # Step 2: Collect code and resources
+    logger.info("Collecting code and resources...")
+    collector = CodeCollector(config, logger)
+    collected_files = collector.collect(dependencies)
+    
+    if config.startup_profile or config.trace_startup:
+        logger.info("Recording startup import order...")
+        tracer = ImportTracer(config, logger)
+        config.startup_order = tracer.startup_order()
+    
+    if config.frozen_startup:
+        logger.info("Tracing the import phase...")
+        config.warm_modules = ImportTracer(config, logger).trace_import_phase()
+    
+    # Step 3: Compile to bytecode
+    logger.info("Compiling to bytecode...")
+    compiler = BytecodeCompiler(config, logger)
+    bytecode_files = compiler.compile(collected_files)
+    
+    # Step 4: Build executable
+    logger.info("Building executable...")
+    builder = ExecutableBuilder(config, logger)
+    executable_path = builder.build(bytecode_files)
+    
+    config.manifest.save(config.cache.export_digests())
+    logger.info(f"Executable created: {executable_path}")
+    logger.debug(f"Build cache: {config.cache.hits} hits, {config.cache.misses} misses")
+    
+    # Local modules, their resources and data files; the stdlib is not expected to change
+    return collected_files['main_script'] + [entry.path for category in ['local_modules', 'data_files'] for entry in collected_files[category]]
+
 if __name__ == "__main__":
     main()
@@ -40,6 +40,8 @@ setup(
     python_requires=">=3.0",
     extras_require={
         "dev": ["pytest", "pytest-cov[all]", "mypy", "black"],
+        "zstd": ["zstandard"],
+        "lz4": ["lz4"],
     },
     entry_points={
         'console_scripts': [
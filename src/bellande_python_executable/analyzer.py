@@ -4,31 +4,82 @@ Analyzes Python files to find all imports and dependencies
 """
 
 from header_imports import *
+from minimizer import module_matches
+from payload import runtime_modules
+
+# Present in every source file that imports anything
+IMPORT_KEYWORD = b'import'
+
+# Fields of AST nodes that hold nested statements, the only place imports occur
+STATEMENT_BLOCK_FIELDS = ('body', 'orelse', 'finalbody', 'handlers', 'cases')
+
+IMPORT_ERRORS = {'ImportError', 'ModuleNotFoundError'}
+
+# Import contexts, from needed on import to needed on demand
+CONTEXT_ORDER = ['module', 'optional', 'deferred', 'function']
+
+# Waves of sources at least this large in total are parsed in worker processes
+PARALLEL_PARSE_SIZE = 256 * 1024
 
 class DependencyAnalyzer:
-    """Analyzes Python files to find dependencies"""
+    """Analyzes Python files to find dependencies
+    
+    Builds a module-level import graph: nodes are dotted module names (the entry
+    script is '__main__') and edges point from an importer to what it imports.
+    import_contexts holds the context of each edge (see ImportVisitor).
+    
+    Pending modules are analyzed in waves: the files of a wave are read on a
+    thread pool and large ones parsed on a process pool, while resolution and
+    the graph are only touched from the calling thread, so the result is the
+    same as analyzing one file at a time.
+    """
     
     def __init__(self, config, logger):
         self.config = config
         self.logger = logger
+        self.resolver = config.resolver
         self.analyzed_files = set()
         self.dependencies = set()
         self.import_graph = {}
+        self.import_contexts = {}
+        self._pending = []
+        self._readers = None
+        self._parsers = None
     
     def analyze(self) -> Dict[str, Set[str]]:
         """Analyze the main script and return all dependencies"""
         self.logger.debug("Starting dependency analysis")
         
         # Start with the main script
-        self._analyze_file(self.config.script_path)
+        self._analyze_module('__main__', self.config.script_path)
         
-        # Add explicitly included modules
-        for module in self.config.include_modules:
-            self._add_module_dependency(module)
+        # Add explicitly included modules and allowed stdlib modules
+        allowed = [module for module in self.config.stdlib_allow if not any(c in module for c in '*?[')]
+        for module in self.config.include_modules + allowed:
+            if not self._add_module_dependency(module):
+                self.logger.warning(f"Module not found: {module}")
         
-        # Remove excluded modules
-        for module in self.config.exclude_modules:
-            self.dependencies.discard(module)
+        # The runtime decompresses archive entries with these, so they count as used by the script
+        for module in runtime_modules(self.config):
+            self._add_module_dependency(module, importer='__main__')
+        
+        # Follow imports until every reachable module has been analyzed
+        try:
+            self._analyze_pending()
+            
+            # Modules loaded by traced runs that static analysis cannot see, such as
+            # importlib.import_module calls and plugins, count as used by the script
+            missed = [module for module in self.config.traced_modules if module not in self.dependencies]
+            added = [module for module in missed if self._add_module_dependency(module, importer='__main__')]
+            if added:
+                self.logger.info(f"Traced runs loaded {len(added)} modules static analysis missed")
+                self.logger.debug(f"Traced modules: {', '.join(added)}")
+                self._analyze_pending()
+        finally:
+            if self._readers:
+                self._readers.shutdown()
+            if self._parsers:
+                self._parsers.shutdown(cancel_futures=True)
         
         # Categorize dependencies
         result = {
@@ -39,14 +90,11 @@ class DependencyAnalyzer:
         }
         
         for dep in self.dependencies:
-            if is_builtin_module(dep):
+            kind = self.resolver.kind(dep)
+            if kind in ['builtin', 'frozen']:
                 result['builtin'].add(dep)
-            elif is_stdlib_module(dep):
-                result['stdlib'].add(dep)
-            elif self._is_local_module(dep):
-                result['local'].add(dep)
-            else:
-                result['third_party'].add(dep)
+            elif kind != 'missing':
+                result[kind].add(dep)
         
         self.logger.debug(f"Found {len(self.dependencies)} dependencies")
         self.logger.debug(f"Builtin: {len(result['builtin'])}")
@@ -56,148 +104,328 @@ class DependencyAnalyzer:
         
         return result
     
-    def _analyze_file(self, file_path: Path):
-        """Analyze a single Python file"""
-        if file_path in self.analyzed_files:
-            return
+    def lazy_modules(self, modules: Set[str]) -> List[str]:
+        """Select the modules the runtime may load lazily
         
-        self.analyzed_files.add(file_path)
-        self.logger.debug(f"Analyzing {file_path}")
+        A module qualifies when every import of it is 'deferred' or 'function',
+        so its body is not needed until first use. --lazy-deny matches never
+        qualify and --lazy-allow matches always do.
+        """
+        incoming = {}
+        for contexts in self.import_contexts.values():
+            for imported, context in contexts.items():
+                incoming.setdefault(imported, set()).add(context)
         
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            try:
-                with open(file_path, 'r', encoding='latin-1') as f:
-                    content = f.read()
-            except Exception as e:
-                self.logger.warning(f"Could not read {file_path}: {e}")
-                return
+        selected = []
+        for module in sorted(modules):
+            if module_matches(module, self.config.lazy_deny) is not None:
+                continue
+            contexts = incoming.get(module)
+            if module_matches(module, self.config.lazy_allow) is not None or (contexts and contexts <= {'deferred', 'function'}):
+                selected.append(module)
         
-        try:
-            tree = ast.parse(content)
-        except SyntaxError as e:
-            self.logger.warning(f"Syntax error in {file_path}: {e}")
-            return
-        
-        # Find all imports
-        imports = self._extract_imports(tree)
-        
-        # Add to dependencies
-        for imp in imports:
-            self.dependencies.add(imp)
-            self._add_module_dependency(imp)
-        
-        # Find local imports and analyze them
-        for imp in imports:
-            if self._is_local_module(imp):
-                local_path = self._find_local_module_path(imp, file_path.parent)
-                if local_path:
-                    self._analyze_file(local_path)
-    
-    def _extract_imports(self, tree: ast.AST) -> List[str]:
-        """Extract import statements from AST"""
-        imports = []
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    imports.append(alias.name.split('.')[0])
+        return selected
+    
+    def _analyze_pending(self):
+        """Analyze pending modules in waves until none are left"""
+        while self._pending:
+            wave = []
+            while self._pending:
+                module_name = self._pending.pop()
+                record = self.resolver.resolve(module_name)
+                if record.path and record.path.suffix == '.py':
+                    wave.append((module_name, record.path))
             
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    imports.append(node.module.split('.')[0])
-                else:
-                    # Relative import
-                    imports.append('.')
+            imports = self._analyze_files([file_path for _, file_path in wave])
+            for (module_name, _), module_imports in zip(wave, imports):
+                self._add_imports(module_name, module_imports)
+    
+    def _analyze_module(self, module_name: str, file_path: Path):
+        """Add the imports of a module's source file to the graph"""
+        self._add_imports(module_name, self._analyze_file(file_path))
+    
+    def _add_imports(self, module_name: str, imports: List[list]):
+        """Add the [module, names, level, context] imports of a module to the graph"""
+        self.import_graph.setdefault(module_name, set())
         
-        return imports
+        # Missing modules are only worth a warning when the project itself imports them
+        report_missing = module_name == '__main__' or self._is_local_module(module_name)
+        
+        for imported, names, level, context in imports:
+            if level:
+                imported = self._resolve_relative_import(module_name, imported, level)
+                if imported is None:
+                    continue
+            
+            if not self._add_module_dependency(imported, module_name):
+                # Imports guarded by try/except ImportError are expected to be missing at times
+                if report_missing and context != 'optional':
+                    self.logger.warning(f"Module not found: {imported}")
+                else:
+                    self.logger.debug(f"Module not found: {imported} (imported by {module_name})")
+                continue
+            self._record_context(module_name, imported, context)
+            
+            # from package import submodule
+            if self.resolver.resolve(imported).is_package:
+                for name in names:
+                    submodule = f"{imported}.{name}"
+                    if name != '*' and self.resolver.kind(submodule) != 'missing':
+                        self._add_module_dependency(submodule, module_name)
+                        self._record_context(module_name, submodule, context)
+    
+    def _record_context(self, importer: str, imported: str, context: str):
+        """Record the context of an import edge, keeping the most eager one seen"""
+        contexts = self.import_contexts.setdefault(importer, {})
+        current = contexts.get(imported)
+        if current is None or CONTEXT_ORDER.index(context) < CONTEXT_ORDER.index(current):
+            contexts[imported] = context
     
-    def _add_module_dependency(self, module_name: str):
-        """Add a module and its dependencies"""
-        if module_name in ['', '.']:
-            return
+    def _analyze_file(self, file_path: Path) -> List[list]:
+        """Analyze a single Python file and return its imports as [module, names, level, context]"""
+        return self._analyze_files([file_path])[0]
+    
+    def _analyze_files(self, file_paths: List[Path]) -> List[List[list]]:
+        """Analyze Python files concurrently and return the imports of each, in order
         
-        try:
-            spec = importlib.util.find_spec(module_name)
-            if spec is None:
-                self.logger.warning(f"Module not found: {module_name}")
-                return
+        Files analyzed before, including earlier in the list, yield no imports.
+        """
+        files = []
+        for file_path in file_paths:
+            if file_path in self.analyzed_files:
+                files.append(None)
+            else:
+                self.analyzed_files.add(file_path)
+                files.append(file_path)
+        
+        # Reading, hashing and cache lookups release the GIL, so threads are enough
+        todo = [file_path for file_path in files if file_path is not None]
+        if len(todo) > 1 and self.config.jobs > 1:
+            if self._readers is None:
+                self._readers = ThreadPoolExecutor(max_workers=self.config.jobs)
+            loaded = dict(zip(todo, self._readers.map(self._load_imports, todo)))
+        else:
+            loaded = {file_path: self._load_imports(file_path) for file_path in todo}
+        
+        # Parsing holds the GIL; only large waves are worth shipping to other processes
+        misses = [file_path for file_path in todo if loaded[file_path][1] is None and loaded[file_path][2] is not None]
+        parsed = {}
+        if len(misses) > 1 and self.config.jobs > 1 and sum(len(loaded[file_path][2]) for file_path in misses) >= PARALLEL_PARSE_SIZE:
+            if self._parsers is None:
+                self._parsers = ProcessPoolExecutor(max_workers=self.config.jobs)
+            chunksize = max(1, len(misses) // (self.config.jobs * 4))
+            sources = [loaded[file_path][2] for file_path in misses]
+            parsed = dict(zip(misses, self._parsers.map(parse_imports, sources, chunksize=chunksize)))
+        
+        results = []
+        for file_path in files:
+            if file_path is None:
+                results.append([])
+                continue
             
-            # If it's a package, try to find submodules
-            if spec.submodule_search_locations:
-                self._find_package_modules(module_name, spec.submodule_search_locations)
+            self.logger.debug(f"Analyzing {file_path}")
+            digest, imports, raw = loaded[file_path]
+            if digest is None:
+                # Unreadable, already reported
+                results.append([])
+                continue
             
-        except ImportError as e:
-            self.logger.warning(f"Could not import {module_name}: {e}")
-    
-    def _find_package_modules(self, package_name: str, search_paths: List[str]):
-        """Find modules in a package"""
-        for search_path in search_paths:
-            path = Path(search_path)
-            if path.exists():
-                for py_file in path.glob('*.py'):
-                    if py_file.name != '__init__.py':
-                        module_name = f"{package_name}.{py_file.stem}"
-                        self.dependencies.add(module_name)
+            if imports is None:
+                imports, error = parsed[file_path] if file_path in parsed else parse_imports(raw)
+                if error:
+                    self.logger.warning(f"Syntax error in {file_path}: {error}")
+                    results.append([])
+                    continue
+                self.config.cache.put_json('imports', self.config.cache.key('imports', digest), imports)
+            
+            self.config.manifest.record_imports(digest, imports)
+            results.append(imports)
+        
+        return results
     
-    def _is_local_module(self, module_name: str) -> bool:
-        """Check if a module is local to the project"""
-        if module_name in ['', '.']:
-            return False
+    def _load_imports(self, file_path: Path) -> Tuple[Optional[str], Optional[list], Optional[bytes]]:
+        """Get (digest, imports, source) of a file, with imports from earlier builds or the source to parse"""
+        try:
+            digest = self.config.cache.file_digest(file_path)
+        except OSError as e:
+            self.logger.warning(f"Could not read {file_path}: {e}")
+            return None, None, None
+        
+        # Reuse imports extracted from identical content in earlier builds
+        imports = self.config.manifest.get_imports(digest)
+        if imports is None:
+            imports = self.config.cache.get_json('imports', self.config.cache.key('imports', digest))
+        if imports is not None:
+            return digest, imports, None
+        
+        try:
+            with open(file_path, 'rb') as f:
+                return digest, None, f.read()
+        except OSError as e:
+            self.logger.warning(f"Could not read {file_path}: {e}")
+            return None, None, None
+    
+    def _resolve_relative_import(self, importer: str, module_name: str, level: int) -> Optional[str]:
+        """Resolve a relative import against the importing module's package"""
+        if importer == '__main__':
+            self.logger.warning(f"Relative import in {self.config.script_path} has no parent package")
+            return None
+        
+        # A package is its own anchor, a plain module is anchored at its parent
+        if self.resolver.resolve(importer).is_package:
+            package = importer
+        else:
+            package = importer.rpartition('.')[0]
         
         try:
-            spec = importlib.util.find_spec(module_name)
-            if spec is None or spec.origin is None:
-                return False
+            return importlib.util.resolve_name('.' * level + module_name, package)
+        except (ImportError, ValueError) as e:
+            self.logger.warning(f"Could not resolve relative import in {importer}: {e}")
+            return None
+    
+    def _add_module_dependency(self, module_name: str, importer: Optional[str] = None) -> bool:
+        """Add a module and its parent packages to the graph, returning False if not found"""
+        if module_name in ['', '.'] or self._is_excluded(module_name):
+            return False
+        
+        if self.resolver.kind(module_name) == 'missing':
+            return False
+        
+        if importer:
+            self.import_graph.setdefault(importer, set()).add(module_name)
+        
+        # Importing a submodule runs every parent package first
+        parts = module_name.split('.')
+        for depth in range(1, len(parts) + 1):
+            name = '.'.join(parts[:depth])
+            if name in self.dependencies or self.resolver.kind(name) == 'missing':
+                continue
             
-            # Check if the module is in the project directory
-            project_dir = self.config.script_path.parent
-            module_path = Path(spec.origin)
+            self.dependencies.add(name)
+            self._pending.append(name)
             
-            try:
-                module_path.relative_to(project_dir)
-                return True
-            except ValueError:
-                return False
+            edges = self.import_graph.setdefault(name, set())
+            if depth > 1:
+                edges.add('.'.join(parts[:depth - 1]))
         
-        except ImportError:
-            return False
+        return True
+    
+    def _is_excluded(self, module_name: str) -> bool:
+        """Check if a module or one of its parent packages is excluded"""
+        return any(
+            module_name == excluded or module_name.startswith(excluded + '.')
+            for excluded in self.config.exclude_modules
+        )
+    
+    def _is_local_module(self, module_name: str) -> bool:
+        """Check if a module is local to the project"""
+        return self.resolver.kind(module_name) == 'local'
+
+def parse_imports(raw: bytes) -> Tuple[Optional[List[list]], Optional[str]]:
+    """Parse a source file and return (imports, error), imports as [module, names, level, context]"""
+    # Files without the keyword have no import statements and need no parse at all
+    if IMPORT_KEYWORD not in raw:
+        return [], None
     
-    def _find_local_module_path(self, module_name: str, base_path: Path) -> Optional[Path]:
-        """Find the path to a local module"""
-        # Try direct .py file
-        py_file = base_path / f"{module_name}.py"
-        if py_file.exists():
-            return py_file
-        
-        # Try package directory
-        package_dir = base_path / module_name
-        if package_dir.is_dir():
-            init_file = package_dir / "__init__.py"
-            if init_file.exists():
-                return init_file
-        
-        # Try searching in parent directories
-        parent = base_path.parent
-        if parent != base_path:  # Not at root
-            return self._find_local_module_path(module_name, parent)
-        
-        return None
+    try:
+        content = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        content = raw.decode('latin-1')
+    
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError) as e:
+        return None, str(e)
+    
+    return extract_imports(tree), None
+
+def extract_imports(tree: ast.AST) -> List[list]:
+    """Extract import statements from AST, in source order"""
+    visitor = ImportVisitor()
+    visitor.visit(tree)
+    return visitor.imports
 
 class ImportVisitor(ast.NodeVisitor):
-    """AST visitor to find imports"""
+    """AST visitor to find imports and the context they run in
+    
+    Only statement blocks are descended into, since imports cannot appear in
+    expressions. Contexts are 'module' for imports run when the module is
+    imported, 'deferred' for module-level 'import x' statements whose name is
+    used inside functions and nowhere else, 'function' for imports inside a
+    function body
+    and 'optional' for module-level imports guarded by try/except ImportError.
+    """
     
     def __init__(self):
         self.imports = []
+        self.context = 'module'
+        # Names used outside and inside function bodies, and the names module-level imports bind
+        self.module_names = set()
+        self.function_names = set()
+        self.bindings = []
+    
+    def visit_Module(self, node):
+        self.generic_visit(node)
+        # An import whose name is never used runs for its side effects, so it stays eager
+        for index, name in self.bindings:
+            if name in self.function_names and name not in self.module_names:
+                self.imports[index][3] = 'deferred'
     
     def visit_Import(self, node):
         for alias in node.names:
-            self.imports.append(alias.name)
-        self.generic_visit(node)
+            if self.context == 'module':
+                self.bindings.append((len(self.imports), alias.asname or alias.name.partition('.')[0]))
+            self.imports.append([alias.name, [], 0, self.context])
     
     def visit_ImportFrom(self, node):
-        if node.module:
-            self.imports.append(node.module)
-        self.generic_visit(node)
+        self.imports.append([node.module or '', [alias.name for alias in node.names], node.level, self.context])
+    
+    def visit_FunctionDef(self, node):
+        # Decorators, defaults and annotations are evaluated where the function is defined
+        self._collect_names(node)
+        self._visit_in_context(node.body, 'function')
+    
+    visit_AsyncFunctionDef = visit_FunctionDef
+    
+    def visit_Try(self, node):
+        guarded = self.context == 'module' and any(_catches_import_error(handler.type) for handler in node.handlers)
+        self._visit_in_context(node.body, 'optional' if guarded else self.context)
+        self._visit_in_context(node.handlers, 'optional' if guarded else self.context)
+        self._visit_in_context(node.orelse + node.finalbody, self.context)
+    
+    visit_TryStar = visit_Try
+    
+    def generic_visit(self, node):
+        self._collect_names(node)
+        for field in STATEMENT_BLOCK_FIELDS:
+            for child in getattr(node, field, None) or []:
+                self.visit(child)
+    
+    def _collect_names(self, node):
+        """Record the names used by a statement's own expressions"""
+        names = self.function_names if self.context == 'function' else self.module_names
+        for field, value in ast.iter_fields(node):
+            if field in STATEMENT_BLOCK_FIELDS:
+                continue
+            for child in value if isinstance(value, list) else [value]:
+                if isinstance(child, ast.AST):
+                    names.update(inner.id for inner in ast.walk(child) if isinstance(inner, ast.Name))
+    
+    def _visit_in_context(self, nodes: list, context: str):
+        """Visit statements with the given context"""
+        outer, self.context = self.context, context
+        try:
+            for child in nodes:
+                self.visit(child)
+        finally:
+            self.context = outer
+
+def _catches_import_error(handler_type: Optional[ast.expr]) -> bool:
+    """Check if an except clause names ImportError or ModuleNotFoundError"""
+    if isinstance(handler_type, ast.Tuple):
+        return any(_catches_import_error(element) for element in handler_type.elts)
+    if isinstance(handler_type, ast.Name):
+        return handler_type.id in IMPORT_ERRORS
+    if isinstance(handler_type, ast.Attribute):
+        return handler_type.attr in IMPORT_ERRORS
+    return False
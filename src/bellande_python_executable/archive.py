@@ -0,0 +1,254 @@
+"""
+Indexed module archive for PyPack
+Packs modules and resources into a section the runtime resolves with a single hash probe
+
+Layout, all integers little-endian and offsets relative to the archive start:
+
+    header:  magic:8 count:u32 bucket_count:u32
+    buckets: bucket_count x u32, entry index + 1 or 0 when empty
+    entries: count x (name_offset:u32 name_size:u32 data_offset:u64
+                      data_size:u64 raw_size:u32 flags:u32)
+    names, then entry data
+
+Modules are keyed by dotted name and resources by their '/' separated path.
+Buckets are probed linearly from fnv1a_32(key) & (bucket_count - 1).
+Bits 8-11 of the flags hold the codec of the entry data.
+"""
+
+from header_imports import *
+
+ARCHIVE_MAGIC = b'BPEARC02'
+ARCHIVE_HEADER_SIZE = 16
+ARCHIVE_ENTRY_SIZE = 32
+
+# Entry flags
+FLAG_PACKAGE = 0x01
+FLAG_BYTECODE = 0x04
+FLAG_SOURCE = 0x08
+FLAG_EXTENSION = 0x10
+FLAG_RESOURCE = 0x20
+CODEC_SHIFT = 8
+CODEC_MASK = 0xf00
+
+# Codec ids stored in the entry flags
+CODECS = {'stored': 0, 'deflate': 1, 'zstd': 2, 'lz4': 3}
+DEFAULT_CODEC_LEVELS = {'stored': 0, 'deflate': 9, 'zstd': 19, 'lz4': 12}
+
+# Extension modules the runtime loads to decompress each codec, without importing
+# their packages; optional at build time
+CODEC_MODULES = {'deflate': ['zlib'], 'zstd': ['zstandard.backend_c'], 'lz4': ['lz4.block._block']}
+
+DEFAULT_CODEC = ('deflate', DEFAULT_CODEC_LEVELS['deflate'])
+
+ARCHIVE_CATEGORIES = ['stdlib_modules', 'third_party_modules', 'local_modules', 'data_files']
+
+EXTENSION_SUFFIXES = ('.so', '.pyd', '.dll')
+PYC_HEADER_SIZE = 16
+
+def fnv1a_32(data: bytes) -> int:
+    """FNV-1a hash, cheap enough to compute in pure Python at runtime"""
+    value = 0x811c9dc5
+    for byte in data:
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return value
+
+def parse_compression_policy(specs: List[str]) -> Dict[str, Tuple[str, int]]:
+    """Parse category=codec[:level] specs into a codec and level per archive category"""
+    policy = {category: DEFAULT_CODEC for category in ARCHIVE_CATEGORIES}
+    
+    for spec in specs:
+        category, _, value = spec.partition('=')
+        codec, _, level = value.partition(':')
+        if category not in policy:
+            raise ValueError(f"Unknown archive category in --compression {spec}, expected one of {', '.join(ARCHIVE_CATEGORIES)}")
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec in --compression {spec}, expected one of {', '.join(CODECS)}")
+        try:
+            policy[category] = (codec, int(level) if level else DEFAULT_CODEC_LEVELS[codec])
+        except ValueError:
+            raise ValueError(f"Invalid compression level in --compression {spec}")
+    
+    return policy
+
+def codec_available(codec: str) -> bool:
+    """Check if the modules implementing a codec can be imported"""
+    for module_name in CODEC_MODULES.get(codec, []):
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            return False
+    return True
+
+def resolve_compression_policy(policy: Dict[str, Tuple[str, int]], logger) -> Dict[str, Tuple[str, int]]:
+    """Replace codecs that are not installed with the default codec"""
+    resolved = {}
+    for category, (codec, level) in policy.items():
+        if not codec_available(codec):
+            logger.warning(f"{codec} is not installed, compressing {category} with {DEFAULT_CODEC[0]} instead")
+            codec, level = DEFAULT_CODEC
+        resolved[category] = (codec, level)
+    return resolved
+
+def compress_data(data: bytes, codec: str, level: int) -> bytes:
+    """Compress data with a codec; the raw size is stored separately"""
+    if codec == 'deflate':
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if codec == 'lz4':
+        import lz4.block
+        if level > 0:
+            return lz4.block.compress(data, mode='high_compression', compression=level, store_size=False)
+        return lz4.block.compress(data, store_size=False)
+    return data
+
+def decompress_data(data: bytes, codec: str, raw_size: int) -> bytes:
+    """Decompress the data of an entry, the inverse of compress_data"""
+    if codec == 'deflate':
+        return zlib.decompress(data, -15, raw_size)
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=raw_size)
+    if codec == 'lz4':
+        import lz4.block
+        return lz4.block.decompress(data, uncompressed_size=raw_size)
+    return data
+
+def read_archive(data: bytes) -> Dict[str, Tuple[int, bytes, int]]:
+    """Get the (flags, packed data, raw size) of every entry of an archive, by key"""
+    if data[:8] != ARCHIVE_MAGIC:
+        return {}
+    
+    count = int.from_bytes(data[8:12], 'little')
+    bucket_count = int.from_bytes(data[12:16], 'little')
+    
+    entries = {}
+    for index in range(count):
+        offset = ARCHIVE_HEADER_SIZE + 4 * bucket_count + ARCHIVE_ENTRY_SIZE * index
+        name_offset, name_size, data_offset, data_size, raw_size, flags = struct.unpack_from('<IIQQII', data, offset)
+        key = data[name_offset:name_offset + name_size].decode('utf-8')
+        entries[key] = (flags, data[data_offset:data_offset + data_size], raw_size)
+    
+    return entries
+
+def archive_key(arcname: str) -> Tuple[str, int]:
+    """Get the index key and kind flags of an archive path"""
+    parts = arcname.split('/')
+    filename = parts[-1]
+    
+    if filename.endswith('.pyc'):
+        flags, stem = FLAG_BYTECODE, filename[:-len('.pyc')]
+    elif filename.endswith('.py'):
+        flags, stem = FLAG_SOURCE, filename[:-len('.py')]
+    elif filename.endswith(EXTENSION_SUFFIXES):
+        flags, stem = FLAG_EXTENSION, filename.split('.')[0]
+    else:
+        return arcname, FLAG_RESOURCE
+    
+    if stem == '__init__':
+        return '.'.join(parts[:-1]), flags | FLAG_PACKAGE
+    return '.'.join(parts[:-1] + [stem]), flags
+
+class ArchiveWriter:
+    """Collects entries and serializes them with a precomputed hash index"""
+    
+    def __init__(self, codec: str = DEFAULT_CODEC[0], level: int = DEFAULT_CODEC[1]):
+        self.codec = codec
+        self.level = level
+        self.entries = {}
+    
+    def add(self, arcname: str, data: bytes, compress: bool = True, codec: Optional[Tuple[str, int]] = None, key: Optional[str] = None) -> bool:
+        """Add a file by archive path, returning False if its key is already taken
+        
+        codec overrides the archive's codec and level for this entry. key stores
+        the entry as a plain file under exactly that key instead of the one
+        archive_key derives from arcname.
+        """
+        if key is None:
+            key, flags = archive_key(arcname)
+        else:
+            flags = FLAG_RESOURCE
+        if key in self.entries:
+            return False
+        
+        # Bytecode is stored as the bare marshalled code object
+        if flags & FLAG_BYTECODE:
+            data = data[PYC_HEADER_SIZE:]
+        
+        raw_size = len(data)
+        codec_name, level = codec or (self.codec, self.level)
+        if compress and codec_name != 'stored':
+            packed = compress_data(data, codec_name, level)
+            # Keep whichever is smaller
+            if len(packed) < raw_size:
+                data = packed
+                flags |= CODECS[codec_name] << CODEC_SHIFT
+        
+        self.entries[key] = (flags, data, raw_size)
+        return True
+    
+    def add_packed(self, key: str, flags: int, data: bytes, raw_size: int):
+        """Add an entry exactly as read from an earlier archive"""
+        self.entries.setdefault(key, (flags, data, raw_size))
+    
+    def to_bytes(self, order: Optional[List[str]] = None) -> bytes:
+        """Serialize the archive, adding namespace packages for bare directories
+        
+        Entries named in order come first, in that order, so the data a program
+        reads at startup is contiguous; the rest keep their insertion order.
+        """
+        entries = dict(self.entries)
+        for key, (flags, _, _) in self.entries.items():
+            if flags & FLAG_RESOURCE:
+                continue
+            parts = key.split('.')
+            for depth in range(1, len(parts)):
+                entries.setdefault('.'.join(parts[:depth]), (FLAG_PACKAGE, b'', 0))
+        
+        keys = list(entries)
+        if order:
+            rank = {key: position for position, key in enumerate(order)}
+            keys.sort(key=lambda key: rank.get(key, len(rank)))
+        encoded_keys = [key.encode('utf-8') for key in keys]
+        
+        bucket_count = 1
+        while bucket_count < 2 * len(keys):
+            bucket_count *= 2
+        
+        buckets = [0] * bucket_count
+        for index, encoded in enumerate(encoded_keys):
+            slot = fnv1a_32(encoded) & (bucket_count - 1)
+            while buckets[slot]:
+                slot = (slot + 1) & (bucket_count - 1)
+            buckets[slot] = index + 1
+        
+        names_offset = ARCHIVE_HEADER_SIZE + 4 * bucket_count + ARCHIVE_ENTRY_SIZE * len(keys)
+        data_offset = names_offset + sum(len(encoded) for encoded in encoded_keys)
+        
+        table = []
+        name_position = names_offset
+        data_position = data_offset
+        for key, encoded in zip(keys, encoded_keys):
+            flags, data, raw_size = entries[key]
+            table.append(b''.join([
+                name_position.to_bytes(4, 'little'),
+                len(encoded).to_bytes(4, 'little'),
+                data_position.to_bytes(8, 'little'),
+                len(data).to_bytes(8, 'little'),
+                raw_size.to_bytes(4, 'little'),
+                flags.to_bytes(4, 'little'),
+            ]))
+            name_position += len(encoded)
+            data_position += len(data)
+        
+        return b''.join([
+            ARCHIVE_MAGIC,
+            len(keys).to_bytes(4, 'little'),
+            bucket_count.to_bytes(4, 'little'),
+            b''.join(slot.to_bytes(4, 'little') for slot in buckets),
+            *table,
+            *encoded_keys,
+            *(entries[key][1] for key in keys),
+        ])
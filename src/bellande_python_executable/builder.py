@@ -4,6 +4,9 @@ Creates the final executable with embedded Python runtime
 """
 
 from header_imports import *
+from archive import CODEC_MASK, CODEC_SHIFT, CODECS, FLAG_EXTENSION, decompress_data, read_archive
+from payload import BOOTSTRAP_SECTION, FROZEN_SECTION, MAIN_SECTION, NATIVE_SECTION, OPTIONS_SECTION, WARM_SECTION, PayloadWriter
+from utilities import create_temp_file, get_platform_info
 
 class ExecutableBuilder:
     """Builds the final executable"""
@@ -13,199 +16,511 @@ class ExecutableBuilder:
         self.logger = logger
         self.platform_info = get_platform_info()
     
-    def build(self, compiled_files: Dict[str, Path]) -> Path:
+    def build(self, compiled_files: Dict[str, Union[Path, bytes]]) -> Path:
         """Build the final executable"""
         self.logger.debug("Starting executable build")
         
-        # Create the bootstrap C code
-        bootstrap_c = self._create_bootstrap_code(compiled_files)
+        output_path = self.config.get_output_path(self.config.output_name)
+        if self.platform_info['system'] == 'windows':
+            output_path = output_path.with_suffix('.exe')
         
-        # Write bootstrap code to temporary file
-        bootstrap_path = create_temp_file(bootstrap_c, '.c')
+        payload = self._create_payload(compiled_files)
         
-        try:
-            # Compile the executable
-            executable_path = self._compile_executable(bootstrap_path, compiled_files)
-            
-            # Make executable on Unix-like systems
-            if self.platform_info['system'] in ['linux', 'darwin']:
-                os.chmod(executable_path, 0o755)
-            
-            self.logger.debug(f"Built executable: {executable_path}")
-            return executable_path
+        # Nothing to relink when neither the payload nor the bootstrap changed
+        output_digest = self.config.cache.key(
+            'output', payload.digest(), self._get_bootstrap_template(), self.config.payload_mode, *self._access_defines()
+        )
+        previous = self.config.manifest.get_output(str(output_path))
+        if previous and previous[0] == output_digest and output_path.is_file() and output_path.stat().st_size == previous[1]:
+            self.logger.debug(f"Payload unchanged, keeping {output_path}")
+            self.config.manifest.record_output(str(output_path), output_digest, previous[1])
+            return output_path
+        
+        if self.config.payload_mode == 'embed':
+            executable_path = self._build_embedded(payload, output_path)
+        else:
+            executable_path = self._build_appended(payload, output_path)
+        
+        # Make executable on Unix-like systems
+        if self.platform_info['system'] in ['linux', 'darwin']:
+            os.chmod(executable_path, 0o755)
+        
+        self.config.manifest.record_output(str(output_path), output_digest, executable_path.stat().st_size)
+        self.logger.debug(f"Built executable: {executable_path}")
+        return executable_path
+    
+    def _create_payload(self, compiled_files: Dict[str, Union[Path, bytes]]) -> PayloadWriter:
+        """Collect the runtime bootstrap, main script and archives into a payload"""
+        payload = PayloadWriter()
+        
+        # Runtime bootstrap, compiled by the same interpreter the executable links against
+        runtime_path = Path(__file__).with_name('runtime.py')
+        with open(runtime_path, 'r', encoding='utf-8') as f:
+            runtime_code = compile(f.read(), '<bpe-bootstrap>', 'exec')
+        payload.add_section(BOOTSTRAP_SECTION, marshal.dumps(runtime_code))
+        
+        # Read by the C bootstrap before the interpreter starts
+        if compiled_files.get('frozen_modules'):
+            payload.add_section(FROZEN_SECTION, compiled_files['frozen_modules'])
+        
+        # Warm modules come first so startup reads the front of the payload
+        if compiled_files.get('warm_modules'):
+            payload.add_section(WARM_SECTION, compiled_files['warm_modules'])
+        
+        # Main script bytecode
+        if compiled_files.get('main_script'):
+            payload.add_section(MAIN_SECTION, compiled_files['main_script'])
         
+        # Shared libraries, read by the runtime before the extension modules that need them
+        if compiled_files.get('native_libraries'):
+            payload.add_section(NATIVE_SECTION, compiled_files['native_libraries'])
+        
+        # Archives
+        for category in ['stdlib_modules', 'third_party_modules', 'local_modules', 'data_files']:
+            if compiled_files.get(category):
+                payload.add_section(category, compiled_files[category])
+        
+        # Last, so the build id can cover every other section
+        payload.add_section(OPTIONS_SECTION, marshal.dumps(self._runtime_options(payload.digest(), compiled_files)))
+        
+        return payload
+    
+    def _runtime_options(self, build_id: str, compiled_files: Dict[str, Union[Path, bytes]]) -> Dict[str, object]:
+        """Get the build options the runtime bootstrap acts on"""
+        return {
+            'profile_startup': self.config.profile_startup,
+            'lazy_modules': tuple(self.config.lazy_modules),
+            'native_dependencies': {name: tuple(keys) for name, keys in self.config.native_dependencies.items()},
+            'build_id': build_id[:16],
+            'extraction_checksums': self._extraction_checksums(compiled_files),
+        }
+    
+    def _extraction_checksums(self, compiled_files: Dict[str, Union[Path, bytes]]) -> Dict[Tuple[str, str], int]:
+        """Get the CRC-32 of every entry the runtime writes to disk, by (section, key)
+        
+        The runtime checks extracted files it finds in its cache against them.
+        """
+        codec_names = {codec_id: name for name, codec_id in CODECS.items()}
+        sections = {category: category for category in ['stdlib_modules', 'third_party_modules', 'local_modules']}
+        sections[NATIVE_SECTION] = 'native_libraries'
+        
+        checksums = {}
+        for section, category in sections.items():
+            if not compiled_files.get(category):
+                continue
+            for key, (flags, data, raw_size) in read_archive(compiled_files[category]).items():
+                if section == NATIVE_SECTION or flags & FLAG_EXTENSION:
+                    data = decompress_data(data, codec_names[(flags & CODEC_MASK) >> CODEC_SHIFT], raw_size)
+                    # The runtime checks with binascii.crc32, which computes the same value
+                    checksums[(section, key)] = zlib.crc32(data)
+        
+        return checksums
+    
+    def _build_appended(self, payload: PayloadWriter, output_path: Path) -> Path:
+        """Copy the data-free bootstrap and append the payload to it"""
+        bootstrap_path = create_temp_file(self._get_bootstrap_template(), '.c')
+        
+        try:
+            self._compile_executable([bootstrap_path], output_path, self._access_defines())
         finally:
             # Clean up temporary files
             try:
                 os.unlink(bootstrap_path)
-            except:
+            except OSError:
                 pass
-    
-    def _create_bootstrap_code(self, compiled_files: Dict[str, Path]) -> str:
-        """Create the C bootstrap code"""
-        template = self._get_bootstrap_template()
         
-        # Read main script bytecode
-        main_script_data = ""
-        if compiled_files.get('main_script'):
-            with open(compiled_files['main_script'], 'rb') as f:
-                bytecode = f.read()
-                main_script_data = self._bytes_to_c_array(bytecode)
+        with open(output_path, 'ab') as f:
+            payload_size = payload.write(f)
         
-        # Read archive data
-        archives_data = {}
-        for category in ['stdlib_modules', 'third_party_modules', 'local_modules', 'data_files']:
-            if compiled_files.get(category):
-                with open(compiled_files[category], 'rb') as f:
-                    archive_data = f.read()
-                    archives_data[category] = self._bytes_to_c_array(archive_data)
-        
-        # Fill in template
-        code = template.format(
-            main_script_data=main_script_data,
-            main_script_size=len(main_script_data.split(',')) if main_script_data else 0,
-            stdlib_data=archives_data.get('stdlib_modules', ''),
-            stdlib_size=len(archives_data.get('stdlib_modules', '').split(',')) if archives_data.get('stdlib_modules') else 0,
-            third_party_data=archives_data.get('third_party_modules', ''),
-            third_party_size=len(archives_data.get('third_party_modules', '').split(',')) if archives_data.get('third_party_modules') else 0,
-            local_data=archives_data.get('local_modules', ''),
-            local_size=len(archives_data.get('local_modules', '').split(',')) if archives_data.get('local_modules') else 0,
-            data_files_data=archives_data.get('data_files', ''),
-            data_files_size=len(archives_data.get('data_files', '').split(',')) if archives_data.get('data_files') else 0,
+        self.logger.debug(f"Appended {payload_size} byte payload")
+        return output_path
+    
+    def _build_embedded(self, payload: PayloadWriter, output_path: Path) -> Path:
+        """Compile the payload into the executable as a C array"""
+        data = payload.to_bytes()
+        payload_c = (
+            f"#include <stddef.h>\n"
+            f"const unsigned char bpe_payload_data[] = {{{self._bytes_to_c_array(data)}}};\n"
+            f"const size_t bpe_payload_size = {len(data)};\n"
         )
         
-        return code
+        bootstrap_path = create_temp_file(self._get_bootstrap_template(), '.c')
+        payload_path = create_temp_file(payload_c, '.c')
+        
+        try:
+            self._compile_executable([bootstrap_path, payload_path], output_path, ['BPE_EMBEDDED_PAYLOAD'])
+        finally:
+            # Clean up temporary files
+            for path in [bootstrap_path, payload_path]:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        
+        return output_path
+    
+    def _access_defines(self) -> List[str]:
+        """Get the bootstrap defines selecting how an appended payload is accessed"""
+        if self.config.payload_access == 'read':
+            return ['BPE_PAYLOAD_READ']
+        return []
     
     def _get_bootstrap_template(self) -> str:
-        """Get the C bootstrap template"""
-        return '''
+        """Get the C bootstrap source, which is the same for every build"""
+        return r"""
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <marshal.h>
+
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
-#include <sys/stat.h>
-#include <unistd.h>
+#include <stdint.h>
 
 #ifdef _WIN32
 #include <windows.h>
-#include <direct.h>
-#define PATH_SEP "\\\\"
 #else
-#include <dlfcn.h>
-#define PATH_SEP "/"
+#include <unistd.h>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 #endif
 
-#define PY_SSIZE_T_CLEAN
-#include <Python.h>
+#ifdef __APPLE__
+#include <mach-o/dyld.h>
+#endif
+
+#define BPE_MAGIC "BPEPAYL1"
+#define BPE_TRAILER_SIZE 48
 
-// Embedded data
-static unsigned char main_script_data[] = {{{main_script_data}}};
-static size_t main_script_size = {main_script_size};
+#ifdef BPE_EMBEDDED_PAYLOAD
+extern const unsigned char bpe_payload_data[];
+extern const size_t bpe_payload_size;
+#endif
 
-static unsigned char stdlib_data[] = {{{stdlib_data}}};
-static size_t stdlib_size = {stdlib_size};
+static uint64_t read_u64(const unsigned char *p) {
+    uint64_t value = 0;
+    for (int i = 7; i >= 0; i--) {
+        value = (value << 8) | p[i];
+    }
+    return value;
+}
 
-static unsigned char third_party_data[] = {{{third_party_data}}};
-static size_t third_party_size = {third_party_size};
+static uint32_t read_u32(const unsigned char *p) {
+    return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
 
-static unsigned char local_data[] = {{{local_data}}};
-static size_t local_size = {local_size};
+static uint16_t read_u16(const unsigned char *p) {
+    return (uint16_t)(p[0] | (p[1] << 8));
+}
 
-static unsigned char data_files_data[] = {{{data_files_data}}};
-static size_t data_files_size = {data_files_size};
+// Find a named section through the table of contents
+static const unsigned char *find_section(const unsigned char *payload, size_t payload_size,
+                                         const char *name, size_t *section_size) {
+    const unsigned char *trailer = payload + payload_size - BPE_TRAILER_SIZE;
+    const unsigned char *p = payload + read_u64(trailer + 16);
+    uint32_t count = read_u32(p);
+    size_t name_size = strlen(name);
+    p += 4;
+    
+    for (uint32_t i = 0; i < count; i++) {
+        uint16_t entry_name_size = read_u16(p);
+        const unsigned char *entry_name = p + 2;
+        p += 2 + entry_name_size;
+        if (entry_name_size == name_size && memcmp(entry_name, name, name_size) == 0) {
+            *section_size = (size_t)read_u64(p + 8);
+            return payload + read_u64(p);
+        }
+        p += 16;
+    }
+    return NULL;
+}
 
-// Extract embedded data to temporary directory
-static char* extract_data(unsigned char* data, size_t size, const char* filename) {{
-    if (size == 0) return NULL;
+// Register the modules of the __frozen__ section ahead of any existing frozen
+// modules. Must run before the interpreter is initialized.
+static int install_frozen_modules(const unsigned char *payload, size_t payload_size) {
+    size_t section_size = 0;
+    const unsigned char *p = find_section(payload, payload_size, "__frozen__", &section_size);
+    if (!p) return 0;
     
-    char* temp_dir = getenv("TMPDIR");
-    if (!temp_dir) temp_dir = "/tmp";
+    uint32_t count = read_u32(p);
+    p += 4;
     
-    char* filepath = malloc(strlen(temp_dir) + strlen(filename) + 20);
-    sprintf(filepath, "%s/pypacker_%d_%s", temp_dir, getpid(), filename);
+    size_t existing = 0;
+    if (PyImport_FrozenModules) {
+        while (PyImport_FrozenModules[existing].name) existing++;
+    }
     
-    FILE* f = fopen(filepath, "wb");
-    if (!f) {{
-        free(filepath);
+    struct _frozen *table = calloc(count + existing + 1, sizeof(struct _frozen));
+    if (!table) return -1;
+    
+    for (uint32_t i = 0; i < count; i++) {
+        uint16_t name_size = read_u16(p);
+        int is_package = p[2];
+        char *name = malloc(name_size + 1);
+        if (!name) return -1;
+        memcpy(name, p + 3, name_size);
+        name[name_size] = '\0';
+        p += 3 + name_size;
+        
+        uint32_t code_size = read_u32(p);
+        table[i].name = name;
+        table[i].code = p + 4;
+#if PY_VERSION_HEX >= 0x030B0000
+        table[i].size = (int)code_size;
+        table[i].is_package = is_package;
+#else
+        table[i].size = is_package ? -(int)code_size : (int)code_size;
+#endif
+        p += 4 + code_size;
+    }
+    
+    if (existing) {
+        memcpy(table + count, PyImport_FrozenModules, existing * sizeof(struct _frozen));
+    }
+    PyImport_FrozenModules = table;
+    return 0;
+}
+
+#ifndef BPE_EMBEDDED_PAYLOAD
+// Locate the running executable
+static int get_executable_path(char *buffer, size_t size) {
+#if defined(_WIN32)
+    DWORD length = GetModuleFileNameA(NULL, buffer, (DWORD)size);
+    return (length > 0 && length < size) ? 0 : -1;
+#elif defined(__APPLE__)
+    uint32_t length = (uint32_t)size;
+    return _NSGetExecutablePath(buffer, &length) == 0 ? 0 : -1;
+#else
+    ssize_t length = readlink("/proc/self/exe", buffer, size - 1);
+    if (length <= 0) return -1;
+    buffer[length] = '\0';
+    return 0;
+#endif
+}
+
+#ifdef BPE_PAYLOAD_READ
+// Read the payload appended to the executable, located through the trailer
+static unsigned char *load_payload(size_t *payload_size) {
+    char path[4096];
+    unsigned char trailer[BPE_TRAILER_SIZE];
+    
+    if (get_executable_path(path, sizeof(path)) != 0) return NULL;
+    
+    FILE *f = fopen(path, "rb");
+    if (!f) return NULL;
+    
+    if (fseek(f, -BPE_TRAILER_SIZE, SEEK_END) != 0 ||
+        fread(trailer, 1, BPE_TRAILER_SIZE, f) != BPE_TRAILER_SIZE ||
+        memcmp(trailer, BPE_MAGIC, 8) != 0) {
+        fclose(f);
+        return NULL;
+    }
+    
+    uint64_t size = read_u64(trailer + 8);
+    unsigned char *data = malloc(size);
+    if (!data ||
+        fseek(f, -(long)size, SEEK_END) != 0 ||
+        fread(data, 1, size, f) != size) {
+        free(data);
+        fclose(f);
         return NULL;
-    }}
+    }
     
-    fwrite(data, 1, size, f);
     fclose(f);
+    *payload_size = (size_t)size;
+    return data;
+}
+
+static void unload_payload(unsigned char *payload, size_t payload_size) {
+    free(payload);
+}
+#elif defined(_WIN32)
+static void *payload_mapping_base = NULL;
+
+// Map the payload appended to the executable read-only, located through the trailer
+static unsigned char *load_payload(size_t *payload_size) {
+    char path[4096];
+    unsigned char trailer[BPE_TRAILER_SIZE];
+    
+    if (get_executable_path(path, sizeof(path)) != 0) return NULL;
+    
+    HANDLE file = CreateFileA(path, GENERIC_READ, FILE_SHARE_READ, NULL, OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, NULL);
+    if (file == INVALID_HANDLE_VALUE) return NULL;
+    
+    LARGE_INTEGER file_size, position;
+    DWORD read_size = 0;
+    position.QuadPart = -BPE_TRAILER_SIZE;
+    if (!GetFileSizeEx(file, &file_size) || file_size.QuadPart < BPE_TRAILER_SIZE ||
+        !SetFilePointerEx(file, position, NULL, FILE_END) ||
+        !ReadFile(file, trailer, BPE_TRAILER_SIZE, &read_size, NULL) || read_size != BPE_TRAILER_SIZE ||
+        memcmp(trailer, BPE_MAGIC, 8) != 0) {
+        CloseHandle(file);
+        return NULL;
+    }
+    
+    uint64_t end = (uint64_t)file_size.QuadPart;
+    uint64_t size = read_u64(trailer + 8);
+    HANDLE mapping = NULL;
+    if (size >= BPE_TRAILER_SIZE && size <= end) {
+        mapping = CreateFileMappingA(file, NULL, PAGE_READONLY, 0, 0, NULL);
+    }
+    CloseHandle(file);
+    if (!mapping) return NULL;
     
-    return filepath;
-}}
+    // Views must start on an allocation granularity boundary
+    SYSTEM_INFO info;
+    GetSystemInfo(&info);
+    uint64_t start = end - size;
+    uint64_t aligned = start - start % info.dwAllocationGranularity;
+    unsigned char *base = MapViewOfFile(mapping, FILE_MAP_READ, (DWORD)(aligned >> 32), (DWORD)aligned, (SIZE_T)(end - aligned));
+    CloseHandle(mapping);
+    if (!base) return NULL;
+    
+    payload_mapping_base = base;
+    *payload_size = (size_t)size;
+    return base + (start - aligned);
+}
 
-// Custom import hook
-static PyObject* custom_import(PyObject* self, PyObject* args) {{
-    // This would implement custom import logic
-    // For now, use default import
-    return PyObject_CallMethod(PyImport_GetModuleDict(), "get", "s", "__import__");
-}}
+static void unload_payload(unsigned char *payload, size_t payload_size) {
+    UnmapViewOfFile(payload_mapping_base);
+}
+#else
+static size_t payload_mapping_delta = 0;
 
-int main(int argc, char* argv[]) {{
-    // Initialize Python
-    Py_Initialize();
+// Map the payload appended to the executable read-only, located through the trailer.
+// Pages are shared between every running instance and faulted in on first use.
+static unsigned char *load_payload(size_t *payload_size) {
+    char path[4096];
+    unsigned char trailer[BPE_TRAILER_SIZE];
+    struct stat st;
     
-    if (!Py_IsInitialized()) {{
-        fprintf(stderr, "Failed to initialize Python\\n");
+    if (get_executable_path(path, sizeof(path)) != 0) return NULL;
+    
+    int fd = open(path, O_RDONLY);
+    if (fd < 0) return NULL;
+    
+    if (fstat(fd, &st) != 0 || st.st_size < BPE_TRAILER_SIZE ||
+        pread(fd, trailer, BPE_TRAILER_SIZE, st.st_size - BPE_TRAILER_SIZE) != BPE_TRAILER_SIZE ||
+        memcmp(trailer, BPE_MAGIC, 8) != 0) {
+        close(fd);
+        return NULL;
+    }
+    
+    uint64_t size = read_u64(trailer + 8);
+    if (size < BPE_TRAILER_SIZE || size > (uint64_t)st.st_size) {
+        close(fd);
+        return NULL;
+    }
+    
+    // Mappings must start on a page boundary
+    uint64_t start = (uint64_t)st.st_size - size;
+    uint64_t page_size = (uint64_t)sysconf(_SC_PAGESIZE);
+    uint64_t aligned = start - start % page_size;
+    size_t length = (size_t)((uint64_t)st.st_size - aligned);
+    
+    void *base = mmap(NULL, length, PROT_READ, MAP_PRIVATE, fd, (off_t)aligned);
+    close(fd);
+    if (base == MAP_FAILED) return NULL;
+    
+    payload_mapping_delta = (size_t)(start - aligned);
+    *payload_size = (size_t)size;
+    return (unsigned char *)base + payload_mapping_delta;
+}
+
+static void unload_payload(unsigned char *payload, size_t payload_size) {
+    munmap(payload - payload_mapping_delta, payload_size + payload_mapping_delta);
+}
+#endif
+#endif
+
+int main(int argc, char *argv[]) {
+    const unsigned char *payload;
+    size_t payload_size = 0;
+
+#ifdef BPE_EMBEDDED_PAYLOAD
+    payload = bpe_payload_data;
+    payload_size = bpe_payload_size;
+#else
+    payload = load_payload(&payload_size);
+#endif
+
+    if (!payload || payload_size < BPE_TRAILER_SIZE) {
+        fprintf(stderr, "Could not load the executable payload\n");
         return 1;
-    }}
-    
-    // Set up sys.argv
-    PySys_SetArgv(argc, argv);
-    
-    // Extract and run main script
-    if (main_script_size > 0) {{
-        // Load bytecode from embedded data
-        PyObject* code = PyMarshal_ReadObjectFromString((char*)main_script_data + 12, main_script_size - 12);
-        if (!code) {{
-            PyErr_Print();
-            Py_Finalize();
-            return 1;
-        }}
-        
-        // Create main module
-        PyObject* main_module = PyImport_AddModule("__main__");
-        if (!main_module) {{
-            Py_DECREF(code);
-            Py_Finalize();
-            return 1;
-        }}
-        
-        PyObject* main_dict = PyModule_GetDict(main_module);
-        
-        // Execute the code
-        PyObject* result = PyEval_EvalCode(code, main_dict, main_dict);
-        
-        Py_DECREF(code);
-        
-        if (!result) {{
-            PyErr_Print();
-            Py_Finalize();
-            return 1;
-        }}
-        
-        Py_DECREF(result);
-    }}
-    
-    // Clean up
-    Py_Finalize();
-    return 0;
-}}
-'''
+    }
+    
+    const unsigned char *trailer = payload + payload_size - BPE_TRAILER_SIZE;
+    uint64_t boot_offset = read_u64(trailer + 32);
+    uint64_t boot_size = read_u64(trailer + 40);
+    
+    if (install_frozen_modules(payload, payload_size) != 0) {
+        fprintf(stderr, "Could not register frozen modules\n");
+        return 1;
+    }
+    
+    // Initialize Python with argv passed through untouched
+    PyStatus status;
+    PyConfig config;
+    PyConfig_InitPythonConfig(&config);
+    config.parse_argv = 0;
+    
+    status = PyConfig_SetBytesArgv(&config, argc, argv);
+    if (!PyStatus_Exception(status)) {
+        status = Py_InitializeFromConfig(&config);
+    }
+    PyConfig_Clear(&config);
+    
+    if (PyStatus_Exception(status)) {
+        Py_ExitStatusException(status);
+    }
     
+    // Run the runtime bootstrap with the payload exposed as a read-only buffer
+    PyObject *buffer = PyMemoryView_FromMemory((char *)payload, (Py_ssize_t)payload_size, PyBUF_READ);
+    PyObject *code = PyMarshal_ReadObjectFromString((const char *)payload + boot_offset, (Py_ssize_t)boot_size);
+    PyObject *globals = PyDict_New();
+    
+    if (!buffer || !code || !globals ||
+        PyDict_SetItemString(globals, "__builtins__", PyEval_GetBuiltins()) < 0 ||
+        PyDict_SetItemString(globals, "__name__", PyUnicode_FromString("__bpe_bootstrap__")) < 0 ||
+        PyDict_SetItemString(globals, "__payload__", buffer) < 0) {
+        PyErr_Print();
+        return 1;
+    }
+    
+    int exit_code = 0;
+    PyObject *result = PyEval_EvalCode(code, globals, globals);
+    if (!result) {
+        // Exits the process with the right status on SystemExit
+        PyErr_Print();
+        exit_code = 1;
+    }
+    
+    Py_XDECREF(result);
+    Py_DECREF(globals);
+    Py_DECREF(code);
+    Py_DECREF(buffer);
+    
+    if (Py_FinalizeEx() < 0) {
+        exit_code = 120;
+    }
+
+#ifndef BPE_EMBEDDED_PAYLOAD
+    unload_payload((unsigned char *)payload, payload_size);
+#endif
+    return exit_code;
+}
+"""
+
     def _bytes_to_c_array(self, data: bytes) -> str:
         """Convert bytes to C array format"""
         if not data:
             return ""
         return ','.join(f'0x{b:02x}' for b in data)
     
-    def _compile_executable(self, bootstrap_path: str, compiled_files: Dict[str, Path]) -> Path:
-        """Compile the C bootstrap into an executable"""
-        output_path = self.config.get_output_path(self.config.output_name)
-        
-        if self.platform_info['system'] == 'windows':
-            output_path = output_path.with_suffix('.exe')
+    def _compile_executable(self, sources: List[str], output_path: Path, defines: List[str] = None) -> Path:
+        """Compile C sources into an executable, reusing a cached binary when possible"""
+        defines = defines or []
         
         # Find Python includes and libraries
         python_includes = self._get_python_includes()
@@ -214,31 +529,46 @@ int main(int argc, char* argv[]) {{
         # Build compiler command
         if self.platform_info['system'] == 'windows':
             # Windows with MSVC
+            version = sys.version_info
             cmd = [
                 'cl',
                 '/nologo',
                 f'/I{python_includes}',
-                bootstrap_path,
+                *(f'/D{define}' for define in defines),
+                *sources,
                 f'/Fe{output_path}',
                 f'/link', f'/LIBPATH:{python_libs}',
-                'python3.lib'
+                f'python{version.major}{version.minor}.lib'
             ]
         else:
             # Unix-like systems with GCC
             cmd = [
                 'gcc',
+                '-O2',
                 '-o', str(output_path),
                 f'-I{python_includes}',
-                bootstrap_path,
-                f'-L{python_libs}',
-                '-lpython3.11',  # Adjust version as needed
-                '-ldl', '-lm'
+                *(f'-D{define}' for define in defines),
+                *sources,
+                *self._get_link_flags(python_libs),
             ]
         
         self.logger.debug(f"Compiler command: {' '.join(cmd)}")
         
+        # The linked binary depends only on the sources and toolchain settings
+        source_contents = []
+        for source in sources:
+            with open(source, 'rb') as f:
+                source_contents.append(f.read())
+        cache_key = self.config.cache.key(
+            'executable', *source_contents, *defines, cmd[0], python_includes, python_libs, self.platform_info['machine']
+        )
+        if self.config.cache.fetch_file('executable', cache_key, output_path):
+            self.logger.debug("Reused cached executable")
+            return output_path
+        
         try:
             result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            self.config.cache.store_file('executable', cache_key, output_path)
             self.logger.debug("Compilation successful")
             return output_path
         except subprocess.CalledProcessError as e:
@@ -247,6 +577,23 @@ int main(int argc, char* argv[]) {{
             self.logger.error(f"Stderr: {e.stderr}")
             raise
     
+    def _get_link_flags(self, python_libs: str) -> List[str]:
+        """Get the flags to link against the running interpreter's libpython"""
+        import sysconfig
+        
+        flags = [f'-L{python_libs}', f"-lpython{sysconfig.get_config_var('LDVERSION')}"]
+        for var in ['LIBS', 'SYSLIBS']:
+            flags.extend((sysconfig.get_config_var(var) or '').split())
+        
+        if sysconfig.get_config_var('Py_ENABLE_SHARED'):
+            # Let the executable find the shared libpython it was linked against
+            flags.append(f'-Wl,-rpath,{python_libs}')
+        else:
+            # Extension modules resolve interpreter symbols from the executable itself
+            flags.extend((sysconfig.get_config_var('LINKFORSHARED') or '').split())
+        
+        return flags
+    
     def _get_python_includes(self) -> str:
         """Get Python include directory"""
         import sysconfig
@@ -257,7 +604,7 @@ int main(int argc, char* argv[]) {{
         import sysconfig
         
         if self.platform_info['system'] == 'windows':
-            return sysconfig.get_path('stdlib')
+            return str(Path(sys.base_prefix) / 'libs')
         else:
             # For Unix-like systems
             return sysconfig.get_config_var('LIBDIR') or '/usr/lib'
@@ -0,0 +1,205 @@
+"""
+Build cache for PyPack
+Persistent content-addressed store shared by every stage of the build
+"""
+
+from header_imports import *
+
+# Bump whenever the format of any cached artifact changes
+CACHE_VERSION = 9
+
+def default_cache_dir() -> Path:
+    """Get the per-user cache directory"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local'
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'bellande_python_executable'
+
+class BuildCache:
+    """Content-addressed on-disk cache keyed by content hash, interpreter and options"""
+    
+    def __init__(self, root: Optional[Path] = None, enabled: bool = True):
+        self.root = Path(root) if root else default_cache_dir()
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._digests = {}
+        self._used_digests = set()
+        self._memory = {}
+        self._memory_used = {}
+        
+        # Everything stored depends on the interpreter that produced it
+        self.interpreter_tag = '|'.join([
+            str(CACHE_VERSION),
+            sys.version,
+            importlib.util.MAGIC_NUMBER.hex(),
+            sys.platform,
+            str(sys.implementation.cache_tag),
+        ])
+    
+    def key(self, namespace: str, *parts) -> str:
+        """Derive a cache key from the interpreter tag and the given parts"""
+        digest = hashlib.sha256()
+        digest.update(self.interpreter_tag.encode())
+        digest.update(b'\0' + namespace.encode())
+        for part in parts:
+            if not isinstance(part, bytes):
+                part = str(part).encode('utf-8', 'surrogateescape')
+            digest.update(b'\0' + part)
+        return digest.hexdigest()
+    
+    def file_digest(self, file_path: Path) -> str:
+        """Get the content hash of a file, memoized on (path, mtime, size)"""
+        stat = os.stat(file_path)
+        memo_key = (str(file_path), stat.st_mtime_ns, stat.st_size)
+        
+        self._used_digests.add(memo_key)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+            self._digests[memo_key] = digest
+        
+        return digest
+    
+    def cached_digest(self, file_path: Path) -> Optional[str]:
+        """Get the memoized content hash of a file without reading it, or None"""
+        stat = os.stat(file_path)
+        memo_key = (str(file_path), stat.st_mtime_ns, stat.st_size)
+        
+        digest = self._digests.get(memo_key)
+        if digest is not None:
+            self._used_digests.add(memo_key)
+        return digest
+    
+    def read_file(self, file_path: Path) -> Tuple[bytes, str]:
+        """Read a file and get its content hash, memoized like file_digest"""
+        stat = os.stat(file_path)
+        memo_key = (str(file_path), stat.st_mtime_ns, stat.st_size)
+        
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        
+        digest = hashlib.sha256(data).hexdigest()
+        self._used_digests.add(memo_key)
+        self._digests[memo_key] = digest
+        return data, digest
+    
+    def load_digests(self, entries: List[list]):
+        """Seed the file digest memo with [path, mtime, size, digest] entries"""
+        for path, mtime, size, digest in entries:
+            self._digests[(path, mtime, size)] = digest
+    
+    def export_digests(self) -> List[list]:
+        """Get the file digests used since the last export as [path, mtime, size, digest] entries"""
+        entries = sorted([*memo_key, self._digests[memo_key]] for memo_key in self._used_digests if memo_key in self._digests)
+        self._used_digests = set()
+        return entries
+    
+    def retain(self, namespace: str):
+        """Keep the entries of a namespace in memory until trim_retained drops them"""
+        self._memory.setdefault(namespace, {})
+        self._memory_used.setdefault(namespace, set())
+    
+    def trim_retained(self):
+        """Drop the in-memory entries not used since the last trim, such as those of edited files"""
+        for namespace, memory in self._memory.items():
+            used = self._memory_used[namespace]
+            self._memory[namespace] = {key: data for key, data in memory.items() if key in used}
+            self._memory_used[namespace] = set()
+    
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        """Get cached bytes or None"""
+        memory = self._memory.get(namespace)
+        if memory is not None and key in memory:
+            self.hits += 1
+            self._memory_used[namespace].add(key)
+            return memory[key]
+        
+        if not self.enabled:
+            return None
+        
+        try:
+            with open(self._entry_path(namespace, key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        
+        if memory is not None:
+            memory[key] = data
+            self._memory_used[namespace].add(key)
+        self.hits += 1
+        return data
+    
+    def put(self, namespace: str, key: str, data: bytes):
+        """Store bytes in the cache"""
+        if namespace in self._memory:
+            self._memory[namespace][key] = data
+            self._memory_used[namespace].add(key)
+        
+        if not self.enabled:
+            return
+        
+        entry_path = self._entry_path(namespace, key)
+        temp_path = None
+        try:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so readers never see partial entries
+            fd, temp_path = tempfile.mkstemp(dir=entry_path.parent, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            # A cache that cannot be written is only a missed optimization
+            if temp_path:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+    
+    def get_json(self, namespace: str, key: str):
+        """Get a cached JSON value or None"""
+        data = self.get(namespace, key)
+        if data is None:
+            return None
+        
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
+    
+    def put_json(self, namespace: str, key: str, value):
+        """Store a JSON-serializable value in the cache"""
+        self.put(namespace, key, json.dumps(value, sort_keys=True).encode())
+    
+    def fetch_file(self, namespace: str, key: str, dest_path: Path) -> bool:
+        """Copy a cached file to dest_path, returning True on a hit"""
+        if not self.enabled:
+            return False
+        
+        entry_path = self._entry_path(namespace, key)
+        if not entry_path.is_file():
+            self.misses += 1
+            return False
+        
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(entry_path, dest_path)
+        self.hits += 1
+        return True
+    
+    def store_file(self, namespace: str, key: str, src_path: Path):
+        """Store a copy of a file in the cache"""
+        if not self.enabled:
+            return
+        
+        with open(src_path, 'rb') as f:
+            self.put(namespace, key, f.read())
+    
+    def _entry_path(self, namespace: str, key: str) -> Path:
+        """Get the on-disk location of a cache entry"""
+        return self.root / namespace / key[:2] / key
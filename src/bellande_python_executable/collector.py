@@ -4,6 +4,21 @@ Gathers all Python source files and modules needed for the executable
 """
 
 from header_imports import *
+from payload import EXTRACTION_RUNTIME_MODULES, NATIVE_RUNTIME_MODULES
+from resolver import ModuleRecord
+from utilities import find_python_dll, get_python_paths
+
+# Package resources bundled alongside the modules of a package
+PACKAGE_DATA_SUFFIXES = ['.txt', '.json', '.xml', '.yaml', '.yml', '.cfg', '.ini']
+
+# How missing modules of each kind are reported
+MODULE_KIND_NAMES = {'stdlib': "Standard library", 'third_party': "Third-party", 'local': "Local"}
+
+@dataclass
+class CollectedFile:
+    """A collected file and its path inside the archive"""
+    path: Path
+    arcname: str
 
 class CodeCollector:
     """Collects all necessary Python files and resources"""
@@ -11,11 +26,16 @@ class CodeCollector:
     def __init__(self, config, logger):
         self.config = config
         self.logger = logger
+        self.resolver = config.resolver
         self.collected_files = {}
         self.python_paths = get_python_paths()
     
-    def collect(self, dependencies: Dict[str, Set[str]]) -> Dict[str, List[Path]]:
-        """Collect all necessary files"""
+    def collect(self, dependencies: Dict[str, Set[str]]) -> Dict[str, List[CollectedFile]]:
+        """Collect all necessary files
+        
+        Module categories hold one entry per reachable module, named by its
+        package path (e.g. 'json/decoder.py'), plus resources of included packages.
+        """
         self.logger.debug("Starting code collection")
         
         result = {
@@ -24,26 +44,38 @@ class CodeCollector:
             'third_party_modules': [],
             'local_modules': [],
             'data_files': [],
+            'native_libraries': [],
             'python_dll': None
         }
         
         # Collect main script
         result['main_script'] = [self.config.script_path]
         
-        # Collect standard library modules
-        for module in dependencies['stdlib']:
-            files = self._collect_stdlib_module(module)
-            result['stdlib_modules'].extend(files)
-        
-        # Collect third-party modules
-        for module in dependencies['third_party']:
-            files = self._collect_third_party_module(module)
-            result['third_party_modules'].extend(files)
-        
-        # Collect local modules
-        for module in dependencies['local']:
-            files = self._collect_local_module(module)
-            result['local_modules'].extend(files)
+        # Collect standard library, third-party and local modules
+        for kind in ['stdlib', 'third_party', 'local']:
+            for module in sorted(dependencies[kind]):
+                result[f"{kind}_modules"].extend(self._collect_module(module, kind))
+        
+        # Collect the shared libraries extension modules link against
+        records = [self.resolver.resolve(module) for kind in ['stdlib', 'third_party', 'local'] for module in dependencies[kind]]
+        extensions = {record.name: record.path for record in records if record.is_extension}
+        if extensions:
+            # elf imports this module for CollectedFile
+            from elf import NATIVE_LOADER_MODULE, NativeLibraryWalker
+            
+            walker = NativeLibraryWalker(self.config, self.logger)
+            result['native_libraries'], self.config.native_dependencies = walker.walk(extensions)
+            if result['native_libraries']:
+                # The runtime loads and verifies the libraries with these
+                for module in [NATIVE_LOADER_MODULE] + NATIVE_RUNTIME_MODULES:
+                    if module not in extensions:
+                        result['stdlib_modules'].extend(self._collect_module(module, 'stdlib'))
+            
+            # The runtime locks its extraction cache with these before writing native code
+            if os.name == 'posix':
+                for module in EXTRACTION_RUNTIME_MODULES:
+                    if module not in extensions:
+                        result['stdlib_modules'].extend(self._collect_module(module, 'stdlib'))
         
         # Collect additional data files
         for data_spec in self.config.add_data:
@@ -51,7 +83,6 @@ class CodeCollector:
             result['data_files'].extend(files)
         
         # Find Python DLL/SO
-        from utils import find_python_dll
         python_dll = find_python_dll()
         if python_dll:
             result['python_dll'] = python_dll
@@ -62,109 +93,54 @@ class CodeCollector:
         
         return result
     
-    def _collect_stdlib_module(self, module_name: str) -> List[Path]:
-        """Collect standard library module files"""
-        files = []
-        
-        try:
-            spec = importlib.util.find_spec(module_name)
-            if spec is None:
-                self.logger.warning(f"Standard library module not found: {module_name}")
-                return files
-            
-            if spec.origin:
-                # Single file module
-                files.append(Path(spec.origin))
-            elif spec.submodule_search_locations:
-                # Package
-                for location in spec.submodule_search_locations:
-                    path = Path(location)
-                    if path.exists():
-                        files.extend(self._collect_package_files(path))
-        
-        except ImportError as e:
-            self.logger.warning(f"Could not collect stdlib module {module_name}: {e}")
-        
-        return files
+    def _collect_module(self, module_name: str, kind: str) -> List[CollectedFile]:
+        """Collect the files of a module of the given kind ('stdlib', 'third_party' or 'local')"""
+        record = self.resolver.resolve(module_name)
+        if record.kind == 'missing':
+            self.logger.warning(f"{MODULE_KIND_NAMES[kind]} module not found: {module_name}")
+            return []
+        
+        return self._collect_module_files(record)
     
-    def _collect_third_party_module(self, module_name: str) -> List[Path]:
-        """Collect third-party module files"""
+    def _collect_module_files(self, record: ModuleRecord) -> List[CollectedFile]:
+        """Collect the file of a single module and, for packages, their resources"""
         files = []
+        parts = record.name.split('.')
         
-        try:
-            spec = importlib.util.find_spec(module_name)
-            if spec is None:
-                self.logger.warning(f"Third-party module not found: {module_name}")
-                return files
-            
-            if spec.origin:
+        if record.is_package:
+            package_dir = '/'.join(parts)
+            if record.path:
                 # Single file module
-                files.append(Path(spec.origin))
-                
-                # Also collect any related files (e.g., .so files)
-                module_dir = Path(spec.origin).parent
-                module_stem = Path(spec.origin).stem
-                
-                # Look for compiled extensions
-                for ext in ['.so', '.pyd', '.dll']:
-                    ext_file = module_dir / f"{module_stem}{ext}"
-                    if ext_file.exists():
-                        files.append(ext_file)
+                files.append(CollectedFile(record.path, f"{package_dir}/{record.path.name}"))
             
-            elif spec.submodule_search_locations:
-                # Package
-                for location in spec.submodule_search_locations:
-                    path = Path(location)
-                    if path.exists():
-                        files.extend(self._collect_package_files(path))
+            # Package resources
+            for location in record.search_locations:
+                path = Path(location)
+                if path.exists():
+                    files.extend(self._collect_package_files(path, package_dir))
         
-        except ImportError as e:
-            self.logger.warning(f"Could not collect third-party module {module_name}: {e}")
+        elif record.path:
+            files.append(CollectedFile(record.path, '/'.join(parts[:-1] + [record.path.name])))
         
         return files
     
-    def _collect_local_module(self, module_name: str) -> List[Path]:
-        """Collect local module files"""
-        files = []
+    def _collect_package_files(self, package_path: Path, package_dir: str) -> List[CollectedFile]:
+        """Collect the resource files of a package directory
         
-        try:
-            spec = importlib.util.find_spec(module_name)
-            if spec is None:
-                self.logger.warning(f"Local module not found: {module_name}")
-                return files
-            
-            if spec.origin:
-                files.append(Path(spec.origin))
-            elif spec.submodule_search_locations:
-                for location in spec.submodule_search_locations:
-                    path = Path(location)
-                    if path.exists():
-                        files.extend(self._collect_package_files(path))
-        
-        except ImportError as e:
-            self.logger.warning(f"Could not collect local module {module_name}: {e}")
-        
-        return files
-    
-    def _collect_package_files(self, package_path: Path) -> List[Path]:
-        """Collect all files in a package directory"""
+        Subpackages are skipped; their modules are collected only if reachable.
+        """
         files = []
         
-        for item in package_path.rglob('*'):
-            if item.is_file():
-                # Include Python files
-                if item.suffix in ['.py', '.pyx']:
-                    files.append(item)
-                # Include compiled extensions
-                elif item.suffix in ['.so', '.pyd', '.dll']:
-                    files.append(item)
-                # Include data files in packages
-                elif item.suffix in ['.txt', '.json', '.xml', '.yaml', '.yml', '.cfg', '.ini']:
-                    files.append(item)
+        for item in sorted(package_path.iterdir()):
+            if item.is_file() and item.suffix in PACKAGE_DATA_SUFFIXES:
+                files.append(CollectedFile(item, f"{package_dir}/{item.name}"))
+            elif item.is_dir() and not (item / '__init__.py').exists() and item.name != '__pycache__':
+                # Resource directory
+                files.extend(self._collect_package_files(item, f"{package_dir}/{item.name}"))
         
         return files
     
-    def _collect_data_files(self, data_spec: str) -> List[Path]:
+    def _collect_data_files(self, data_spec: str) -> List[CollectedFile]:
         """Collect data files specified by user"""
         files = []
         
@@ -175,59 +151,15 @@ class CodeCollector:
             dest = None
         
         src_path = Path(src)
+        dest_dir = Path(dest or '.')
         
         if src_path.is_file():
-            files.append(src_path)
+            files.append(CollectedFile(src_path, (dest_dir / src_path.name).as_posix()))
         elif src_path.is_dir():
-            files.extend(src_path.rglob('*'))
+            for item in sorted(src_path.rglob('*')):
+                if item.is_file():
+                    files.append(CollectedFile(item, (dest_dir / item.relative_to(src_path)).as_posix()))
         else:
             self.logger.warning(f"Data file not found: {src}")
         
         return files
-    
-    def copy_to_work_dir(self, collected_files: Dict[str, List[Path]]) -> Dict[str, List[Path]]:
-        """Copy collected files to work directory"""
-        self.logger.debug("Copying files to work directory")
-        
-        result = {}
-        
-        for category, files in collected_files.items():
-            if category == 'python_dll':
-                # Special handling for Python DLL
-                if files:
-                    dll_dest = self.config.get_work_path(files.name)
-                    shutil.copy2(files, dll_dest)
-                    result[category] = dll_dest
-                continue
-            
-            result[category] = []
-            
-            for file_path in files:
-                if not isinstance(file_path, Path):
-                    continue
-                
-                # Determine destination path
-                if category == 'main_script':
-                    dest_path = self.config.get_work_path(file_path.name)
-                elif category == 'local_modules':
-                    # Preserve relative structure for local modules
-                    try:
-                        rel_path = file_path.relative_to(self.config.script_path.parent)
-                        dest_path = self.config.get_work_path('local', rel_path)
-                    except ValueError:
-                        dest_path = self.config.get_work_path('local', file_path.name)
-                else:
-                    # For stdlib and third-party, preserve the package structure
-                    dest_path = self.config.get_work_path(category, file_path.name)
-                
-                # Create destination directory
-                dest_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Copy file
-                try:
-                    shutil.copy2(file_path, dest_path)
-                    result[category].append(dest_path)
-                except Exception as e:
-                    self.logger.warning(f"Could not copy {file_path}: {e}")
-        
-        return result
@@ -4,6 +4,20 @@ Compiles Python source files to bytecode for distribution
 """
 
 from header_imports import *
+from archive import CODEC_MODULES, FLAG_PACKAGE, FLAG_RESOURCE, PYC_HEADER_SIZE, ArchiveWriter, archive_key, read_archive
+from collector import CollectedFile
+from minimizer import module_matches
+
+# Entries that gain nothing from deflate are stored as-is; native extensions are
+# stored so the runtime can load them without a decompressor
+STORED_SUFFIXES = {'.gz', '.bz2', '.xz', '.zip', '.whl', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.so', '.pyd', '.dll'}
+MIN_COMPRESS_SIZE = 256
+
+# Stdlib modules up to this source size are frozen by the :small-stdlib pattern
+FREEZE_SIZE_LIMIT = 16 * 1024
+
+# Bytes read while hashing that are kept for the compile pass; files past this are read again
+STREAM_BUFFER_SIZE = 64 * 1024 * 1024
 
 class BytecodeCompiler:
     """Compiles Python source files to bytecode"""
@@ -11,9 +25,18 @@ class BytecodeCompiler:
     def __init__(self, config, logger):
         self.config = config
         self.logger = logger
+        self.cache = config.cache
+        self.decompressor_modules = {name for names in CODEC_MODULES.values() for name in names}
+        self.frozen = set()
+        self.sources = {}
+        self.buffered = 0
     
-    def compile(self, collected_files: Dict[str, List[Path]]) -> Dict[str, Path]:
-        """Compile all Python files to bytecode and create archives"""
+    def compile(self, collected_files: Dict[str, List[CollectedFile]]) -> Dict[str, Union[Path, bytes]]:
+        """Compile all Python files to bytecode and create archives
+        
+        The main script and the archives are returned as bytes; collected files
+        are read straight from their original location and nothing is staged.
+        """
         self.logger.debug("Starting bytecode compilation")
         
         result = {}
@@ -21,102 +44,311 @@ class BytecodeCompiler:
         # Compile main script
         if collected_files['main_script']:
             main_script = collected_files['main_script'][0]
-            compiled_main = self._compile_single_file(main_script)
-            result['main_script'] = compiled_main
+            result['main_script'] = self._compile_main_script(main_script)
+        
+        # Frozen modules are registered with the interpreter and left out of the archives
+        if self.config.freeze:
+            result['frozen_modules'] = self._create_frozen_section(collected_files)
         
         # Create archives for different categories
         for category in ['stdlib_modules', 'third_party_modules', 'local_modules']:
-            if collected_files[category]:
-                archive_path = self._create_module_archive(category, collected_files[category])
+            files = [entry for entry in collected_files[category] if not self._is_frozen(entry)]
+            if files:
+                archive_path = self._create_module_archive(category, files)
                 result[category] = archive_path
         
+        # Modules imported before the script's first real statement, unmarshalled in one go
+        if self.config.warm_modules:
+            result['warm_modules'] = self._create_warm_section(collected_files)
+        
         # Handle data files
         if collected_files['data_files']:
             data_archive = self._create_data_archive(collected_files['data_files'])
             result['data_files'] = data_archive
         
+        # Shared libraries needed by extension modules
+        if collected_files.get('native_libraries'):
+            result['native_libraries'] = self._create_native_archive(collected_files['native_libraries'])
+        
         # Copy Python DLL
         if collected_files.get('python_dll'):
             result['python_dll'] = collected_files['python_dll']
         
         return result
     
-    def _compile_single_file(self, source_path: Path) -> Path:
-        """Compile a single Python file to bytecode"""
-        output_path = self.config.get_work_path(f"{source_path.stem}.pyc")
+    def _compile_main_script(self, source_path: Path) -> bytes:
+        """Compile the main script to .pyc bytes"""
+        _, bytecode = next(self._compile_files([source_path]))
+        if bytecode is None:
+            raise RuntimeError(f"Failed to compile {source_path}")
         
-        try:
-            py_compile.compile(source_path, output_path, doraise=True)
-            self.logger.debug(f"Compiled {source_path} to {output_path}")
-            return output_path
-        except py_compile.PyCompileError as e:
-            self.logger.error(f"Failed to compile {source_path}: {e}")
-            raise
-    
-    def _create_module_archive(self, category: str, files: List[Path]) -> Path:
-        """Create a ZIP archive containing compiled modules"""
-        archive_path = self.config.get_work_path(f"{category}.zip")
-        
-        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in files:
-                if file_path.suffix == '.py':
-                    # Compile Python file
-                    try:
-                        compiled_path = self._compile_python_to_bytecode(file_path)
-                        arcname = file_path.stem + '.pyc'
-                        zipf.write(compiled_path, arcname)
-                        # Clean up temporary compiled file
-                        compiled_path.unlink()
-                    except Exception as e:
-                        self.logger.warning(f"Could not compile {file_path}: {e}")
-                        # Fall back to source
-                        arcname = file_path.name
-                        zipf.write(file_path, arcname)
-                else:
-                    # Copy non-Python files as-is
-                    arcname = file_path.name
-                    zipf.write(file_path, arcname)
-        
-        self.logger.debug(f"Created module archive: {archive_path}")
-        return archive_path
-    
-    def _create_data_archive(self, files: List[Path]) -> Path:
-        """Create a ZIP archive containing data files"""
-        archive_path = self.config.get_work_path("data_files.zip")
-        
-        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in files:
-                if file_path.is_file():
-                    # Preserve directory structure
-                    arcname = file_path.name
-                    zipf.write(file_path, arcname)
-        
-        self.logger.debug(f"Created data archive: {archive_path}")
-        return archive_path
-    
-    def _compile_python_to_bytecode(self, source_path: Path) -> Path:
-        """Compile Python source to bytecode"""
-        output_path = source_path.with_suffix('.pyc')
-        
-        with open(source_path, 'r', encoding='utf-8') as f:
-            source_code = f.read()
+        self.logger.debug(f"Compiled {source_path}")
+        return bytecode
+    
+    def _create_module_archive(self, category: str, files: List[CollectedFile]) -> bytes:
+        """Create an indexed archive containing compiled modules"""
+        # The archive only depends on its members and the layout and codec options
+        codec, level = self.config.compression_policy[category]
+        digests = {entry.path: self._file_digest(entry.path) for entry in files}
+        members = sorted(f"{entry.arcname}:{entry.path}:{digests[entry.path]}" for entry in files)
+        options = [codec, level, '\n'.join(self.config.startup_order)]
+        cache_key = self.cache.key('archive', category, *options, *members)
         
-        try:
-            # Compile to code object
-            code_obj = compile(source_code, str(source_path), 'exec')
+        # Incremental builds keep the archive in the work directory to reuse unchanged entries
+        archive_path = self.config.get_work_path(f"{category}.bpa") if self.config.manifest.enabled else None
+        sources = {archive_key(entry.arcname)[0]: f"{entry.arcname}:{digests[entry.path]}:{codec}:{level}" for entry in files}
+        previous_sources = self.config.manifest.get_archive(category)
+        reusable = {}
+        if previous_sources and archive_path and archive_path.is_file():
+            with open(archive_path, 'rb') as f:
+                reusable = {
+                    key: packed for key, packed in read_archive(f.read()).items()
+                    if key in sources and previous_sources.get(key) == sources[key]
+                }
+        self.config.manifest.record_archive(category, sources)
+        
+        archive = self.cache.get('archive', cache_key)
+        if archive is not None:
+            self.logger.debug(f"Reused cached {category} archive")
+            self._release(files)
+        else:
+            archive = self._write_module_archive(category, files, reusable)
+            self.cache.put('archive', cache_key, archive)
+        
+        if archive_path:
+            with open(archive_path, 'wb') as f:
+                f.write(archive)
+        return archive
+    
+    def _write_module_archive(self, category: str, files: List[CollectedFile], reusable: Dict[str, tuple]) -> bytes:
+        """Compile, compress and append every entry not reused from the previous archive"""
+        writer = ArchiveWriter(*self.config.compression_policy[category])
+        for key, (flags, data, raw_size) in reusable.items():
+            writer.add_packed(key, flags, data, raw_size)
+        if reusable:
+            self.logger.debug(f"Reused {len(reusable)} of {len(files)} entries of the {category} archive")
+        
+        self._release([entry for entry in files if archive_key(entry.arcname)[0] in reusable])
+        files = [entry for entry in files if archive_key(entry.arcname)[0] not in reusable]
+        python_files = [entry for entry in files if entry.path.suffix == '.py']
+        other_files = [entry for entry in files if entry.path.suffix != '.py']
+        
+        # Bytecode arrives in order from the compile workers
+        compiled = self._compile_files([entry.path for entry in python_files])
+        for entry, (_, bytecode) in zip(python_files, compiled):
+            if bytecode is not None:
+                self._add_entry(writer, entry.arcname[:-len('.py')] + '.pyc', bytecode)
+            else:
+                # Fall back to source
+                self._add_entry(writer, entry.arcname, self._read(entry.path))
+            self._release([entry])
+        
+        for entry in other_files:
+            # Copy non-Python files as-is
+            self._add_entry(writer, entry.arcname, self._read(entry.path))
+        
+        self.logger.debug(f"Created {category} archive")
+        return writer.to_bytes(self.config.startup_order)
+    
+    def _create_data_archive(self, files: List[CollectedFile]) -> bytes:
+        """Create an indexed archive containing data files"""
+        writer = ArchiveWriter(*self.config.compression_policy['data_files'])
+        for entry in files:
+            if entry.path.is_file():
+                # Preserve directory structure
+                self._add_entry(writer, entry.arcname, self._read(entry.path))
+        
+        self.logger.debug("Created data archive")
+        return writer.to_bytes()
+    
+    def _create_native_archive(self, files: List[CollectedFile]) -> bytes:
+        """Create an indexed archive containing shared libraries, compressed like third-party modules
+        
+        Libraries are keyed by their full file name, the name they are extracted under.
+        """
+        writer = ArchiveWriter(*self.config.compression_policy['third_party_modules'])
+        for entry in files:
+            self._add_entry(writer, entry.arcname, self._read(entry.path), key=entry.arcname)
+        
+        self.logger.debug(f"Created native library archive with {len(files)} libraries")
+        return writer.to_bytes()
+    
+    def _file_digest(self, file_path: Path) -> str:
+        """Hash a file, keeping its bytes for the compile pass while the stream buffer has room"""
+        digest = self.cache.cached_digest(file_path)
+        if digest is not None:
+            return digest
+        
+        if self.buffered >= STREAM_BUFFER_SIZE:
+            return self.cache.file_digest(file_path)
+        
+        data, digest = self.cache.read_file(file_path)
+        self.sources[file_path] = data
+        self.buffered += len(data)
+        return digest
+    
+    def _read(self, file_path: Path) -> bytes:
+        """Get the bytes of a file, read during hashing or from disk, and let go of them"""
+        data = self.sources.pop(file_path, None)
+        if data is None:
+            return file_path.read_bytes()
+        self.buffered -= len(data)
+        return data
+    
+    def _release(self, files: List[CollectedFile]):
+        """Drop the kept bytes of files that are no longer needed"""
+        for entry in files:
+            data = self.sources.pop(entry.path, None)
+            if data is not None:
+                self.buffered -= len(data)
+    
+    def _create_frozen_section(self, collected_files: Dict[str, List[CollectedFile]]) -> bytes:
+        """Serialize the modules selected by --freeze for the bootstrap's frozen table
+        
+        Layout: count:u32, then per module name_size:u16 is_package:u8 name
+        code_size:u32 code, where code is the marshalled code object.
+        """
+        categories = ['stdlib_modules', 'third_party_modules', 'local_modules']
+        
+        # The frozen importer cannot read package resources, so those packages stay in the archives
+        keys = [archive_key(entry.arcname) for category in categories for entry in collected_files[category]]
+        packages = {key for key, flags in keys if flags & FLAG_PACKAGE}
+        resource_packages = set()
+        for key, flags in keys:
+            if flags & FLAG_RESOURCE:
+                # Resources in data directories belong to the closest package above them
+                parts = key.split('/')[:-1]
+                while parts and '.'.join(parts) not in packages:
+                    parts.pop()
+                if parts:
+                    resource_packages.add('.'.join(parts))
+        
+        candidates = []
+        for category in categories:
+            for entry in collected_files[category]:
+                if entry.path.suffix != '.py':
+                    continue
+                key, flags = archive_key(entry.arcname)
+                # Frozen module names must be ASCII
+                if key.isascii() and key not in resource_packages and self._should_freeze(key, category, entry.path):
+                    candidates.append((key, bool(flags & FLAG_PACKAGE), entry.path))
+        
+        modules = [len(candidates).to_bytes(4, 'little')]
+        compiled = self._compile_files([path for _, _, path in candidates])
+        for (name, is_package, _), (_, bytecode) in zip(candidates, compiled):
+            if bytecode is None:
+                # Left in its archive
+                continue
             
-            # Write bytecode file
-            with open(output_path, 'wb') as f:
-                # Write magic number and timestamp
-                f.write(py_compile.MAGIC)
-                f.write(b'\x00\x00\x00\x00')  # timestamp
-                f.write(b'\x00\x00\x00\x00')  # size
-                
-                # Write marshalled code
-                marshal.dump(code_obj, f)
+            encoded = name.encode('ascii')
+            code = bytecode[PYC_HEADER_SIZE:]
+            modules.extend([
+                len(encoded).to_bytes(2, 'little'),
+                bytes([is_package]),
+                encoded,
+                len(code).to_bytes(4, 'little'),
+                code,
+            ])
+            self.frozen.add(name)
+        
+        modules[0] = len(self.frozen).to_bytes(4, 'little')
+        self.logger.debug(f"Freezing {len(self.frozen)} modules")
+        return b''.join(modules)
+    
+    def _should_freeze(self, module_name: str, category: str, source_path: Path) -> bool:
+        """Check a module against the --freeze patterns"""
+        for pattern in self.config.freeze:
+            if pattern == ':local' and category == 'local_modules':
+                return True
+            if pattern == ':small-stdlib' and category == 'stdlib_modules' and source_path.stat().st_size <= FREEZE_SIZE_LIMIT:
+                return True
+        return module_matches(module_name, self.config.freeze) is not None
+    
+    def _is_frozen(self, entry: CollectedFile) -> bool:
+        """Check if an entry is the source of a frozen module"""
+        return entry.path.suffix == '.py' and archive_key(entry.arcname)[0] in self.frozen
+    
+    def _create_warm_section(self, collected_files: Dict[str, List[CollectedFile]]) -> bytes:
+        """Marshal the code of the warm modules, in import order, into a single object"""
+        # Later categories shadow earlier ones at runtime
+        sources = {}
+        for category in ['stdlib_modules', 'third_party_modules', 'local_modules']:
+            for entry in collected_files[category]:
+                if entry.path.suffix == '.py':
+                    key, flags = archive_key(entry.arcname)
+                    sources[key] = (category, bool(flags & FLAG_PACKAGE), entry.path)
+        
+        warm = [name for name in self.config.warm_modules if name in sources and name not in self.frozen]
+        compiled = self._compile_files([sources[name][2] for name in warm])
+        
+        modules = []
+        for name, (_, bytecode) in zip(warm, compiled):
+            if bytecode is not None:
+                category, is_package, _ = sources[name]
+                modules.append((name, category, is_package, marshal.loads(bytecode[PYC_HEADER_SIZE:])))
+        
+        self.logger.debug(f"Warm set: {len(modules)} of {len(self.config.warm_modules)} traced modules")
+        return marshal.dumps(tuple(modules))
+    
+    def _add_entry(self, writer: ArchiveWriter, arcname: str, data: bytes, key: Optional[str] = None):
+        """Add an in-memory entry, choosing its compression per entry"""
+        # The decompressors themselves must be readable before any codec is loaded
+        codec = None
+        if key is None and archive_key(arcname)[0] in self.decompressor_modules:
+            codec = ('stored', 0)
+        
+        if not writer.add(arcname, data, compress=self._should_compress(arcname, data), codec=codec, key=key):
+            self.logger.warning(f"Skipping {arcname}: another archive entry provides the same name")
+    
+    def _should_compress(self, arcname: str, data: bytes) -> bool:
+        """Choose whether a single archive entry is deflated"""
+        return len(data) >= MIN_COMPRESS_SIZE and Path(arcname).suffix.lower() not in STORED_SUFFIXES
+    
+    def _compile_files(self, files: List[Path]):
+        """Yield (source_path, bytecode) in order, compiling cache misses in parallel"""
+        pending = []
+        for file_path in files:
+            cache_key = self.cache.key('bytecode', self.cache.file_digest(file_path), file_path)
+            pending.append((file_path, cache_key, self.cache.get('bytecode', cache_key)))
+        
+        misses = [str(file_path) for file_path, _, bytecode in pending if bytecode is None]
+        # Sources already read while hashing are shipped to the workers instead of read again
+        miss_sources = [self.sources.get(file_path) for file_path, _, bytecode in pending if bytecode is None]
+        jobs = min(self.config.jobs, len(misses))
+        self.logger.debug(f"Compiling {len(misses)} of {len(files)} modules with {max(jobs, 1)} jobs")
+        
+        executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+        try:
+            if executor:
+                chunksize = max(1, len(misses) // (jobs * 8))
+                results = executor.map(compile_to_bytecode, misses, miss_sources, chunksize=chunksize)
+            else:
+                results = map(compile_to_bytecode, misses, miss_sources)
             
-            return output_path
+            for file_path, cache_key, bytecode in pending:
+                if bytecode is None:
+                    bytecode, error = next(results)
+                    if error:
+                        self.logger.warning(f"Could not compile {file_path}: {error}")
+                    else:
+                        self.cache.put('bytecode', cache_key, bytecode)
+                yield file_path, bytecode
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+def compile_to_bytecode(source_path: str, source: Optional[bytes] = None):
+    """Compile a source file, or its bytes when already read, to .pyc bytes, returning (bytecode, error)"""
+    try:
+        if source is None:
+            with open(source_path, 'rb') as f:
+                source = f.read()
         
-        except SyntaxError as e:
-            self.logger.error(f"Syntax error in {source_path}: {e}")
-            raise
+        # Compile to code object
+        code_obj = compile(source, source_path, 'exec', dont_inherit=True)
+    except (OSError, SyntaxError, ValueError) as e:
+        return None, str(e)
+    
+    # Unchecked hash-based header (PEP 552) keeps the bytes reproducible
+    header = importlib.util.MAGIC_NUMBER + (0b01).to_bytes(4, 'little') + importlib.util.source_hash(source)
+    return header + marshal.dumps(code_obj), None
@@ -0,0 +1,270 @@
+"""
+Native library walker for PyPack
+Follows the shared libraries bundled extension modules need, reading ELF dynamic sections in pure Python
+"""
+
+from header_imports import *
+from collector import CollectedFile
+
+ELF_MAGIC = b'\x7fELF'
+ELFCLASS32 = 1
+ELFDATA2LSB = 1
+
+# Program header types and dynamic tags, see elf(5)
+PT_LOAD = 1
+PT_DYNAMIC = 2
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_STRSZ = 10
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+# Provided by every target system; bundling them breaks more than it fixes
+EXCLUDED_LIBRARIES = [
+    'ld-linux*', 'ld64.so*', 'linux-vdso.so*', 'libc.so*', 'libm.so*', 'libmvec.so*', 'libpthread.so*',
+    'libdl.so*', 'librt.so*', 'libutil.so*', 'libresolv.so*', 'libnsl.so*', 'libcrypt.so*', 'libanl.so*',
+    'libBrokenLocale.so*', 'libpython*',
+]
+
+# Searched after the ld.so.conf directories
+DEFAULT_LIBRARY_DIRS = ['/lib64', '/usr/lib64', '/lib', '/usr/lib']
+
+# Loads the bundled libraries at runtime, so its own dependencies must come from the system
+NATIVE_LOADER_MODULE = '_ctypes'
+
+@dataclass
+class ElfInfo:
+    """The parts of an ELF file's dynamic section the dynamic loader searches with"""
+    path: Path
+    elf_class: int
+    machine: int
+    soname: Optional[str] = None
+    needed: List[str] = None
+    rpath: List[str] = None
+    runpath: List[str] = None
+
+def read_elf(path: Path) -> Optional[ElfInfo]:
+    """Read the dynamic section of a shared object, or None if it is not an ELF file"""
+    try:
+        with open(path, 'rb') as f:
+            return _read_elf(f, Path(path))
+    except (OSError, struct.error):
+        return None
+
+def _read_elf(f, path: Path) -> Optional[ElfInfo]:
+    """Parse the ELF header, program headers and dynamic entries of an open file"""
+    ident = f.read(16)
+    if len(ident) < 16 or ident[:4] != ELF_MAGIC:
+        return None
+    
+    elf_class = ident[4]
+    endian = '<' if ident[5] == ELFDATA2LSB else '>'
+    if elf_class == ELFCLASS32:
+        header = struct.Struct(endian + 'HHIIIIIHHHHHH')
+        program_header = struct.Struct(endian + 'IIIIIIII')
+        dynamic_entry = struct.Struct(endian + 'iI')
+    else:
+        header = struct.Struct(endian + 'HHIQQQIHHHHHH')
+        program_header = struct.Struct(endian + 'IIQQQQQQ')
+        dynamic_entry = struct.Struct(endian + 'qQ')
+    
+    _, machine, _, _, phoff, _, _, _, phentsize, phnum, _, _, _ = header.unpack(f.read(header.size))
+    
+    # (vaddr, filesz, offset) of each loaded segment, and the dynamic segment
+    loads = []
+    dynamic = None
+    for index in range(phnum):
+        f.seek(phoff + index * phentsize)
+        fields = program_header.unpack(f.read(program_header.size))
+        if elf_class == ELFCLASS32:
+            p_type, p_offset, p_vaddr, _, p_filesz, _, _, _ = fields
+        else:
+            p_type, _, p_offset, p_vaddr, _, p_filesz, _, _ = fields
+        if p_type == PT_LOAD:
+            loads.append((p_vaddr, p_filesz, p_offset))
+        elif p_type == PT_DYNAMIC:
+            dynamic = (p_offset, p_filesz)
+    
+    info = ElfInfo(path, elf_class, machine, needed=[], rpath=[], runpath=[])
+    if dynamic is None:
+        # Statically linked
+        return info
+    
+    f.seek(dynamic[0])
+    data = f.read(dynamic[1])
+    entries = []
+    for offset in range(0, len(data) - dynamic_entry.size + 1, dynamic_entry.size):
+        tag, value = dynamic_entry.unpack_from(data, offset)
+        if tag == DT_NULL:
+            break
+        entries.append((tag, value))
+    
+    # String table addresses are virtual, map them back to a file offset
+    tags = dict(entries)
+    strtab = None
+    for vaddr, filesz, offset in loads:
+        if vaddr <= tags.get(DT_STRTAB, -1) < vaddr + filesz:
+            strtab = tags[DT_STRTAB] - vaddr + offset
+    if strtab is None:
+        return info
+    
+    f.seek(strtab)
+    strings = f.read(tags.get(DT_STRSZ, 0))
+    
+    def string(offset):
+        return strings[offset:strings.index(b'\0', offset)].decode('utf-8', 'surrogateescape')
+    
+    for tag, value in entries:
+        if tag == DT_NEEDED:
+            info.needed.append(string(value))
+        elif tag == DT_SONAME:
+            info.soname = string(value)
+        elif tag == DT_RPATH:
+            info.rpath.extend(string(value).split(':'))
+        elif tag == DT_RUNPATH:
+            info.runpath.extend(string(value).split(':'))
+    
+    return info
+
+def system_library_dirs() -> List[str]:
+    """Get the directories the dynamic loader searches by default, from /etc/ld.so.conf"""
+    dirs = []
+    
+    def read_conf(conf_path):
+        try:
+            with open(conf_path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        
+        for line in lines:
+            line = line.split('#', 1)[0].strip()
+            if line.startswith('include '):
+                pattern = line[len('include '):].strip()
+                if not os.path.isabs(pattern):
+                    pattern = os.path.join(os.path.dirname(conf_path), pattern)
+                for included in sorted(Path('/').glob(pattern.lstrip('/'))):
+                    read_conf(included)
+            elif line and line not in dirs:
+                dirs.append(line)
+    
+    read_conf('/etc/ld.so.conf')
+    return dirs + [path for path in DEFAULT_LIBRARY_DIRS if path not in dirs]
+
+class NativeLibraryWalker:
+    """Collects the shared libraries extension modules load, without running ldd
+    
+    Libraries are searched the way the dynamic loader does: DT_RPATH, then
+    LD_LIBRARY_PATH, then DT_RUNPATH, then the system directories. Those found
+    in a system directory, by any of these, are only bundled with
+    --bundle-system-libs; the others, such as the libraries wheels vendor next
+    to their extensions, stop resolving once the extension is extracted
+    elsewhere, so they always are. Identical libraries are bundled once,
+    keyed by content hash.
+    """
+    
+    def __init__(self, config, logger):
+        self.config = config
+        self.logger = logger
+        self.system_dirs = system_library_dirs()
+        self.real_system_dirs = {os.path.realpath(path) for path in self.system_dirs}
+        self.environment_dirs = [path for path in os.environ.get('LD_LIBRARY_PATH', '').split(':') if path]
+        self._elf = {}
+        self._resolved = {}
+        self._missing = set()
+    
+    def walk(self, extensions: Dict[str, Path]) -> Tuple[List[CollectedFile], Dict[str, List[str]]]:
+        """Get the libraries to bundle and, per extension module, the archive keys of the ones it needs in load order"""
+        keys = {}
+        libraries = []
+        dependencies = {}
+        
+        for module_name, extension_path in sorted(extensions.items()):
+            if module_name == NATIVE_LOADER_MODULE:
+                continue
+            
+            info = self._read(Path(extension_path))
+            if info is None:
+                continue
+            
+            order = []
+            self._closure(info, order, set())
+            
+            needed = []
+            for library_path in order:
+                digest = self.config.cache.file_digest(library_path)
+                if digest not in keys:
+                    # Keyed and extracted by full file name, such as libfoo.so.1
+                    arcname = library_path.name
+                    if arcname in keys.values():
+                        # Same name, different content
+                        arcname = f"{digest[:12]}-{arcname}"
+                    keys[digest] = arcname
+                    libraries.append(CollectedFile(library_path, arcname))
+                needed.append(keys[digest])
+            
+            if needed:
+                dependencies[module_name] = needed
+        
+        self.logger.debug(f"Bundling {len(libraries)} native libraries for {len(dependencies)} extension modules")
+        return libraries, dependencies
+    
+    def _closure(self, info: ElfInfo, order: List[Path], visiting: Set[Path]):
+        """Append the bundled dependencies of an object to order, dependencies first"""
+        for name in info.needed:
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in EXCLUDED_LIBRARIES):
+                continue
+            
+            resolved = self._resolve(name, info)
+            if resolved is None:
+                if name not in self._missing:
+                    self._missing.add(name)
+                    self.logger.warning(f"Could not find {name}, needed by {info.path.name}")
+                continue
+            
+            library_path, is_system = resolved
+            if (is_system and not self.config.bundle_system_libs) or library_path in order or library_path in visiting:
+                continue
+            
+            library = self._read(library_path)
+            if library is None:
+                continue
+            
+            visiting.add(library_path)
+            self._closure(library, order, visiting)
+            order.append(library_path)
+    
+    def _resolve(self, name: str, info: ElfInfo) -> Optional[Tuple[Path, bool]]:
+        """Find a needed library as (path, found in a system directory)"""
+        origin = str(info.path.parent)
+        cache_key = (name, origin, tuple(info.rpath), tuple(info.runpath), info.elf_class, info.machine)
+        if cache_key in self._resolved:
+            return self._resolved[cache_key]
+        
+        if '/' in name:
+            dirs = [os.path.dirname(name)]
+            name = os.path.basename(name)
+        else:
+            # DT_RPATH is ignored when DT_RUNPATH is present
+            dirs = ([] if info.runpath else info.rpath) + self.environment_dirs + info.runpath + self.system_dirs
+        
+        result = None
+        for directory in dirs:
+            directory = directory.replace('${ORIGIN}', origin).replace('$ORIGIN', origin)
+            candidate = Path(directory) / name
+            library = self._read(candidate) if candidate.is_file() else None
+            if library is not None and (library.elf_class, library.machine) == (info.elf_class, info.machine):
+                # However it was found, for example through LD_LIBRARY_PATH, a library in a system directory is the system's
+                result = (candidate.resolve(), os.path.realpath(directory) in self.real_system_dirs)
+                break
+        
+        self._resolved[cache_key] = result
+        return result
+    
+    def _read(self, path: Path) -> Optional[ElfInfo]:
+        """Read an ELF file once"""
+        if path not in self._elf:
+            self._elf[path] = read_elf(path)
+        return self._elf[path]
@@ -0,0 +1,90 @@
+"""
+Build manifest for PyPack
+Records what the previous build in a work directory consumed and produced
+"""
+
+from header_imports import *
+
+# Bump whenever the manifest layout changes
+MANIFEST_VERSION = 4
+MANIFEST_NAME = 'manifest.json'
+
+class BuildManifest:
+    """Persistent state of the previous build, used by incremental builds
+    
+    Holds file digests by (path, mtime, size), extracted imports by content
+    digest, the source of every archive entry and the digest of each output.
+    Lookups see the previous build; records made during this build replace it
+    on save, so nothing stale is carried over. Without a path it lives in
+    memory only.
+    """
+    
+    def __init__(self, path: Optional[Path] = None, interpreter_tag: str = ''):
+        self.path = Path(path) if path else None
+        self.interpreter_tag = interpreter_tag
+        self.previous = self._load()
+        self.current = {'files': [], 'imports': {}, 'archives': {}, 'outputs': {}}
+    
+    def _load(self) -> Dict[str, object]:
+        """Read the manifest, starting empty if it is missing or stale"""
+        empty = {'files': [], 'imports': {}, 'archives': {}, 'outputs': {}}
+        if self.path is None:
+            return empty
+        
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return empty
+        
+        # Nothing recorded by another interpreter or layout can be trusted
+        if data.get('version') != MANIFEST_VERSION or data.get('interpreter') != self.interpreter_tag:
+            return empty
+        
+        return {name: data.get(name, value) for name, value in empty.items()}
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether the manifest persists between builds"""
+        return self.path is not None
+    
+    def get_imports(self, digest: str) -> Optional[list]:
+        """Get the imports extracted from a file with this content digest"""
+        return self.previous['imports'].get(digest)
+    
+    def record_imports(self, digest: str, imports: list):
+        """Record the imports extracted from a file with this content digest"""
+        self.current['imports'][digest] = imports
+    
+    def get_archive(self, category: str) -> Dict[str, str]:
+        """Get the source id of every entry of an archive, by key"""
+        return self.previous['archives'].get(category, {})
+    
+    def record_archive(self, category: str, sources: Dict[str, str]):
+        """Record the source id of every entry of an archive, by key"""
+        self.current['archives'][category] = sources
+    
+    def get_output(self, name: str) -> Optional[list]:
+        """Get the [digest, size] of an output"""
+        return self.previous['outputs'].get(name)
+    
+    def record_output(self, name: str, digest: str, size: int):
+        """Record the digest and size of an output"""
+        self.current['outputs'][name] = [digest, size]
+    
+    def save(self, files: List[list]):
+        """Write the manifest atomically, with the file digests used by this build
+        
+        The saved build becomes the previous one for the next build in this process.
+        """
+        data = dict(self.current, files=files)
+        self.previous = data
+        self.current = {'files': [], 'imports': {}, 'archives': {}, 'outputs': {}}
+        if self.path is None:
+            return
+        
+        data = dict(data, version=MANIFEST_VERSION, interpreter=self.interpreter_tag)
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, sort_keys=True)
+        os.replace(temp_path, self.path)
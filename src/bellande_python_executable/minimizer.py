@@ -0,0 +1,94 @@
+"""
+Standard library minimizer for PyPack
+Shakes the stdlib down to the modules reachable from the entry script
+"""
+
+from header_imports import *
+
+# Never needed by applications, but reachable through stray imports in the stdlib
+DEFAULT_STDLIB_DENY = ['test', 'idlelib', 'turtledemo', 'ensurepip']
+
+def module_matches(module_name: str, patterns: List[str]) -> Optional[str]:
+    """Return the first pattern matching a module or one of its parent packages"""
+    for pattern in patterns:
+        if module_name == pattern or module_name.startswith(pattern + '.') or fnmatch.fnmatchcase(module_name, pattern):
+            return pattern
+    return None
+
+class StdlibMinimizer:
+    """Computes the reachable stdlib closure and reports what was dropped"""
+    
+    def __init__(self, config, logger):
+        self.config = config
+        self.logger = logger
+        self.resolver = config.resolver
+        self.allow = list(config.stdlib_allow)
+        self.deny = DEFAULT_STDLIB_DENY + list(config.stdlib_deny)
+    
+    def minimize(self, dependencies: Dict[str, Set[str]], import_graph: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+        """Return dependencies with the stdlib reduced to its reachable closure"""
+        self.logger.debug("Starting stdlib minimization")
+        
+        stdlib = dependencies['stdlib']
+        roots = ['__main__'] + self.config.include_modules + self.allow
+        
+        reachable = self._reachable(roots, import_graph, blocked=set())
+        denied = {name for name in stdlib if self._is_denied(name)}
+        kept = self._reachable(roots, import_graph, blocked=denied)
+        
+        dropped = {}
+        for name in stdlib:
+            if name in denied:
+                dropped[name] = f"denied by '{module_matches(name, self.deny)}'"
+            elif name not in kept and name in reachable:
+                dropped[name] = "only reachable through denied modules"
+            elif name not in kept:
+                dropped[name] = "unreachable from the entry script"
+        
+        self._write_report(stdlib & kept, dropped)
+        
+        result = dict(dependencies)
+        result['stdlib'] = stdlib & kept
+        self.logger.debug(f"Stdlib: kept {len(result['stdlib'])}, dropped {len(stdlib - kept)}")
+        return result
+    
+    def _is_denied(self, module_name: str) -> bool:
+        """Check if a module is denied and not explicitly allowed
+        
+        Parent packages of allowed modules are allowed too, since importing a submodule runs them.
+        """
+        if module_matches(module_name, self.deny) is None or module_matches(module_name, self.allow) is not None:
+            return False
+        return not any(allowed.startswith(module_name + '.') for allowed in self.allow)
+    
+    def _reachable(self, roots: List[str], import_graph: Dict[str, Set[str]], blocked: Set[str]) -> Set[str]:
+        """Get every module reachable from the roots without entering blocked modules"""
+        seen = set()
+        pending = [root for root in roots if root not in blocked]
+        
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            
+            for imported in import_graph.get(name, ()):
+                if imported not in seen and imported not in blocked:
+                    pending.append(imported)
+        
+        return seen
+    
+    def _write_report(self, kept: Set[str], dropped: Dict[str, str]):
+        """Write the list of kept and dropped modules to the work directory"""
+        report_path = self.config.get_work_path('stdlib_report.json')
+        report = {
+            'allow': self.allow,
+            'deny': self.deny,
+            'kept': sorted(kept),
+            'dropped': dict(sorted(dropped.items())),
+        }
+        
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        
+        self.logger.info(f"Dropped {len(dropped)} stdlib modules, see {report_path}")
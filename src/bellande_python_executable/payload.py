@@ -0,0 +1,118 @@
+"""
+Payload format for PyPack
+Builds the section table appended to (or embedded in) the bootstrap executable
+
+Layout, all integers little-endian and offsets relative to the payload start:
+
+    section data ...
+    table of contents: count:u32, then per section
+                       name_size:u16 name offset:u64 size:u64
+    trailer:           magic:8 payload_size:u64 toc_offset:u64 toc_size:u64
+                       boot_offset:u64 boot_size:u64
+
+The trailer sits at the very end of the file, so the bootstrap finds the payload
+by reading the last TRAILER_SIZE bytes of its own executable.
+"""
+
+from header_imports import *
+from archive import CODEC_MODULES
+
+PAYLOAD_MAGIC = b'BPEPAYL1'
+TRAILER_SIZE = 48
+BOOTSTRAP_SECTION = '__bootstrap__'
+MAIN_SECTION = '__main__'
+OPTIONS_SECTION = '__options__'
+WARM_SECTION = '__warm__'
+FROZEN_SECTION = '__frozen__'
+NATIVE_SECTION = '__native__'
+
+# Modules the runtime imports from the payload itself, bundled with every build;
+# the decompressors of the codecs in use are added by runtime_modules
+RUNTIME_MODULES = []
+
+# Also bundled when the runtime writes a startup profile
+PROFILE_RUNTIME_MODULES = ['json']
+
+# Also bundled when the runtime loads modules lazily, for the modules importlib.util imports
+LAZY_RUNTIME_MODULES = ['importlib.util']
+
+# Also bundled on POSIX when the collected files contain native code, which the
+# runtime extracts to a shared directory under a lock
+EXTRACTION_RUNTIME_MODULES = ['fcntl']
+
+# Also bundled with native libraries, whose extracted copies the runtime checks
+# against the CRC-32 of their compressed entries
+NATIVE_RUNTIME_MODULES = ['binascii']
+
+def runtime_modules(config) -> List[str]:
+    """Get the modules the runtime bootstrap itself imports from the payload"""
+    modules = list(RUNTIME_MODULES)
+    if config.profile_startup:
+        modules.extend(PROFILE_RUNTIME_MODULES)
+    if config.lazy_imports:
+        modules.extend(LAZY_RUNTIME_MODULES)
+    for codec, _ in config.compression_policy.values():
+        modules.extend(name for name in CODEC_MODULES.get(codec, []) if name not in modules)
+    return modules
+
+class PayloadWriter:
+    """Collects named sections and serializes them in the payload format"""
+    
+    def __init__(self):
+        self.sections = []
+    
+    def add_section(self, name: str, data: bytes):
+        """Add a named section"""
+        if any(existing == name for existing, _ in self.sections):
+            raise ValueError(f"Duplicate payload section: {name}")
+        self.sections.append((name, data))
+    
+    def write(self, f) -> int:
+        """Write the payload to a binary file object and return its size"""
+        toc = [len(self.sections).to_bytes(4, 'little')]
+        offsets = {}
+        offset = 0
+        
+        # Section data
+        for name, data in self.sections:
+            f.write(data)
+            offsets[name] = (offset, len(data))
+            encoded_name = name.encode('utf-8')
+            toc.append(len(encoded_name).to_bytes(2, 'little'))
+            toc.append(encoded_name)
+            toc.append(offset.to_bytes(8, 'little'))
+            toc.append(len(data).to_bytes(8, 'little'))
+            offset += len(data)
+        
+        if BOOTSTRAP_SECTION not in offsets:
+            raise ValueError(f"Payload is missing the {BOOTSTRAP_SECTION} section")
+        
+        # Table of contents
+        toc_data = b''.join(toc)
+        toc_offset = offset
+        f.write(toc_data)
+        offset += len(toc_data)
+        
+        # Trailer
+        boot_offset, boot_size = offsets[BOOTSTRAP_SECTION]
+        payload_size = offset + TRAILER_SIZE
+        f.write(PAYLOAD_MAGIC)
+        for value in (payload_size, toc_offset, len(toc_data), boot_offset, boot_size):
+            f.write(value.to_bytes(8, 'little'))
+        
+        return payload_size
+    
+    def digest(self) -> str:
+        """Get a hash of the section names and contents"""
+        hasher = hashlib.sha256()
+        for name, data in self.sections:
+            hasher.update(name.encode('utf-8') + b'\0' + len(data).to_bytes(8, 'little'))
+            hasher.update(data)
+        return hasher.hexdigest()
+    
+    def to_bytes(self) -> bytes:
+        """Serialize the payload in memory"""
+        import io
+        buffer = io.BytesIO()
+        self.write(buffer)
+        return buffer.getvalue()
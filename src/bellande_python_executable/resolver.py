@@ -0,0 +1,162 @@
+"""
+Module resolver for PyPack
+Resolves and classifies module names once and shares the result across all stages
+"""
+
+from header_imports import *
+
+@dataclass
+class ModuleRecord:
+    """Resolved location and classification of a module"""
+    name: str
+    kind: str
+    origin: Optional[str] = None
+    search_locations: Optional[List[str]] = None
+    is_package: bool = False
+    has_location: bool = False
+    
+    @property
+    def path(self) -> Optional[Path]:
+        """Path of the module file, if it has one"""
+        return Path(self.origin) if self.has_location and self.origin else None
+    
+    @property
+    def is_extension(self) -> bool:
+        """Whether the module is a compiled extension"""
+        return self.path is not None and self.path.suffix in ['.so', '.pyd', '.dll']
+
+class ModuleResolver:
+    """Memoized find_spec wrapper with precomputed path prefixes
+    
+    Kinds: builtin, frozen, stdlib, third_party, local and missing.
+    """
+    
+    def __init__(self, project_dir: Optional[Path] = None):
+        self.project_dir = Path(project_dir).resolve() if project_dir else None
+        self._records = {}
+        
+        # utilities imports this module for ConfigManager
+        from utilities import get_python_paths
+        
+        # Path prefixes are computed once; site-packages usually lives inside the
+        # stdlib directory, so it is checked first
+        paths = get_python_paths()
+        self.site_prefixes = self._prefixes([paths['purelib'], paths['platlib']] + self._site_paths())
+        self.stdlib_prefixes = self._prefixes([paths['stdlib'], paths['platstdlib']])
+        self.project_prefixes = self._prefixes([self.project_dir] if self.project_dir else [])
+    
+    def resolve(self, module_name: str) -> ModuleRecord:
+        """Resolve a module name, using the cached record when available"""
+        record = self._records.get(module_name)
+        if record is None:
+            record = self._resolve(module_name)
+            self._records[module_name] = record
+        return record
+    
+    def invalidate(self, kinds: List[str]):
+        """Forget the records of these kinds so they are resolved again"""
+        self._records = {name: record for name, record in self._records.items() if record.kind not in kinds}
+    
+    def kind(self, module_name: str) -> str:
+        """Get the classification of a module"""
+        return self.resolve(module_name).kind
+    
+    def _resolve(self, module_name: str) -> ModuleRecord:
+        """Resolve a module name without consulting the cache"""
+        if not module_name or module_name.startswith('.'):
+            return ModuleRecord(module_name, 'missing')
+        
+        if module_name in sys.builtin_module_names:
+            return ModuleRecord(module_name, 'builtin', origin='built-in')
+        
+        try:
+            spec = self._find_spec(module_name)
+        except (ImportError, ValueError, AttributeError):
+            spec = None
+        
+        if spec is None:
+            return ModuleRecord(module_name, 'missing')
+        
+        if spec.name != module_name:
+            # An alias of a module found under its own name, so it has no file of its own
+            return ModuleRecord(module_name, self.kind(spec.name), origin=spec.origin)
+        
+        search_locations = None
+        if spec.submodule_search_locations is not None:
+            search_locations = [str(location) for location in spec.submodule_search_locations]
+        
+        return ModuleRecord(
+            name=module_name,
+            kind=self._classify(spec, search_locations),
+            origin=spec.origin,
+            search_locations=search_locations,
+            is_package=search_locations is not None,
+            has_location=bool(spec.has_location),
+        )
+    
+    def _find_spec(self, module_name: str):
+        """Find a spec without importing any parent package"""
+        parent_name, _, _ = module_name.rpartition('.')
+        
+        if parent_name:
+            parent = self.resolve(parent_name)
+            if parent.search_locations:
+                # Submodules are looked up in the parent's search locations directly
+                return importlib.machinery.PathFinder.find_spec(module_name, parent.search_locations)
+            
+            # A plain module can still bind a submodule name, as os does for os.path
+            return getattr(sys.modules.get(module_name), '__spec__', None)
+        
+        # The script directory comes first on sys.path when the script runs
+        if self.project_dir:
+            spec = importlib.machinery.PathFinder.find_spec(module_name, [str(self.project_dir)])
+            if spec is not None:
+                return spec
+        
+        return importlib.util.find_spec(module_name)
+    
+    def _classify(self, spec, search_locations: Optional[List[str]]) -> str:
+        """Classify a spec by the location it was found at"""
+        if spec.origin == 'built-in':
+            return 'builtin'
+        
+        if spec.origin and not spec.has_location:
+            return 'frozen'
+        
+        if spec.origin and spec.has_location:
+            location = spec.origin
+        elif search_locations:
+            # Namespace package
+            location = search_locations[0]
+        else:
+            return 'third_party'
+        
+        location = os.path.realpath(location)
+        if location.startswith(self.site_prefixes):
+            return 'third_party'
+        if location.startswith(self.stdlib_prefixes):
+            return 'stdlib'
+        if location.startswith(self.project_prefixes):
+            return 'local'
+        return 'third_party'
+    
+    def _site_paths(self) -> List[str]:
+        """Get site-packages directories that are on sys.path"""
+        return [path for path in sys.path if Path(path).name in ['site-packages', 'dist-packages']]
+    
+    def _prefixes(self, paths) -> tuple:
+        """Normalize directories into prefixes usable with str.startswith"""
+        prefixes = set()
+        for path in paths:
+            if path:
+                prefixes.add(os.path.join(os.path.realpath(path), ''))
+        return tuple(prefixes)
+
+_default_resolver = None
+
+def get_default_resolver() -> ModuleResolver:
+    """Get the resolver shared by the module-level helpers"""
+    global _default_resolver
+    if _default_resolver is None:
+        _default_resolver = ModuleResolver()
+    return _default_resolver
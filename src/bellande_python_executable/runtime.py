@@ -0,0 +1,741 @@
+"""
+Runtime bootstrap for PyPack executables
+Compiled into the payload and executed by the C bootstrap with __payload__ bound
+to a read-only buffer over the payload. Only builtin and frozen modules may be
+imported at the top level here.
+"""
+
+import sys, marshal, time
+import _frozen_importlib, _frozen_importlib_external
+
+PAYLOAD_MAGIC = b'BPEPAYL1'
+TRAILER_SIZE = 48
+PYC_HEADER_SIZE = 16
+OPTIONS_SECTION = '__options__'
+WARM_SECTION = '__warm__'
+NATIVE_SECTION = '__native__'
+
+# Archive sections in increasing priority, later ones shadow earlier ones
+MODULE_SECTIONS = ['stdlib_modules', 'third_party_modules', 'local_modules']
+
+# Indexed archive format, see archive.py
+ARCHIVE_MAGIC = b'BPEARC02'
+ARCHIVE_HEADER_SIZE = 16
+ARCHIVE_ENTRY_SIZE = 32
+FLAG_PACKAGE = 0x01
+FLAG_BYTECODE = 0x04
+FLAG_SOURCE = 0x08
+FLAG_EXTENSION = 0x10
+FLAG_RESOURCE = 0x20
+CODEC_SHIFT = 8
+CODEC_MASK = 0xf00
+CODEC_DEFLATE = 1
+CODEC_ZSTD = 2
+CODEC_LZ4 = 3
+
+# Extension modules implementing each codec, loaded without importing their packages
+DECOMPRESSOR_MODULES = {CODEC_DEFLATE: 'zlib', CODEC_ZSTD: 'zstandard.backend_c', CODEC_LZ4: 'lz4.block._block'}
+
+# Default budget of an application's extraction cache, across its builds
+EXTRACT_CACHE_SIZE = 512 * 1024 * 1024
+
+def _read_u16(buffer, offset):
+    return int.from_bytes(buffer[offset:offset + 2], 'little')
+
+def _read_u32(buffer, offset):
+    return int.from_bytes(buffer[offset:offset + 4], 'little')
+
+def _read_u64(buffer, offset):
+    return int.from_bytes(buffer[offset:offset + 8], 'little')
+
+def read_sections(payload):
+    """Parse the table of contents into a mapping of section name to buffer"""
+    trailer = len(payload) - TRAILER_SIZE
+    if bytes(payload[trailer:trailer + 8]) != PAYLOAD_MAGIC:
+        raise RuntimeError("Corrupt executable payload")
+    
+    toc_offset = _read_u64(payload, trailer + 16)
+    count = _read_u32(payload, toc_offset)
+    position = toc_offset + 4
+    
+    sections = {}
+    for _ in range(count):
+        name_size = _read_u16(payload, position)
+        position += 2
+        name = bytes(payload[position:position + name_size]).decode('utf-8')
+        position += name_size
+        offset = _read_u64(payload, position)
+        size = _read_u64(payload, position + 8)
+        position += 16
+        sections[name] = payload[offset:offset + size]
+    
+    return sections
+
+class PayloadArchive:
+    """Read-only indexed archive over a payload buffer, resolved without copying it"""
+    
+    def __init__(self, name, buffer, decompressor):
+        if bytes(buffer[:8]) != ARCHIVE_MAGIC:
+            raise RuntimeError(f"Corrupt archive section: {name}")
+        
+        self.name = name
+        self.buffer = buffer
+        self.decompressor = decompressor
+        self.count = _read_u32(buffer, 8)
+        self.bucket_mask = _read_u32(buffer, 12) - 1
+        self.entries_offset = ARCHIVE_HEADER_SIZE + 4 * (self.bucket_mask + 1)
+        self._resource_keys = None
+    
+    def find(self, key):
+        """Get the entry index for a key, or None"""
+        buffer = self.buffer
+        encoded = key.encode('utf-8')
+        
+        value = 0x811c9dc5
+        for byte in encoded:
+            value = ((value ^ byte) * 0x01000193) & 0xffffffff
+        
+        slot = value & self.bucket_mask
+        while True:
+            index = _read_u32(buffer, ARCHIVE_HEADER_SIZE + 4 * slot)
+            if not index:
+                return None
+            entry = self.entries_offset + ARCHIVE_ENTRY_SIZE * (index - 1)
+            name_offset = _read_u32(buffer, entry)
+            if buffer[name_offset:name_offset + _read_u32(buffer, entry + 4)] == encoded:
+                return index - 1
+            slot = (slot + 1) & self.bucket_mask
+    
+    def key(self, index):
+        """Get the key of an entry"""
+        entry = self.entries_offset + ARCHIVE_ENTRY_SIZE * index
+        name_offset = _read_u32(self.buffer, entry)
+        return bytes(self.buffer[name_offset:name_offset + _read_u32(self.buffer, entry + 4)]).decode('utf-8')
+    
+    def resource_keys(self):
+        """Get the keys of every resource entry, read from the index once"""
+        if self._resource_keys is None:
+            self._resource_keys = [self.key(index) for index in range(self.count) if self.flags(index) & FLAG_RESOURCE]
+        return self._resource_keys
+    
+    def flags(self, index):
+        """Get the flags of an entry"""
+        return _read_u32(self.buffer, self.entries_offset + ARCHIVE_ENTRY_SIZE * index + 28)
+    
+    def size(self, index):
+        """Get the uncompressed size of an entry"""
+        return _read_u32(self.buffer, self.entries_offset + ARCHIVE_ENTRY_SIZE * index + 24)
+    
+    def read(self, index):
+        """Get the contents of an entry, as a view into the payload when stored"""
+        entry = self.entries_offset + ARCHIVE_ENTRY_SIZE * index
+        offset = _read_u64(self.buffer, entry + 8)
+        data = self.buffer[offset:offset + _read_u64(self.buffer, entry + 16)]
+        codec = (self.flags(index) & CODEC_MASK) >> CODEC_SHIFT
+        
+        if not codec:
+            return data
+        
+        raw_size = _read_u32(self.buffer, entry + 24)
+        module = self.decompressor(codec)
+        if codec == CODEC_DEFLATE:
+            return module.decompress(data, -15, raw_size)
+        if codec == CODEC_ZSTD:
+            return module.ZstdDecompressor().decompress(data, max_output_size=raw_size)
+        return module.decompress(data, uncompressed_size=raw_size)
+
+class PayloadResource:
+    """A resource file or directory of a bundled package, importlib.resources.abc.Traversable over an archive
+    
+    Directories list the package's resources and resource directories, not its modules.
+    """
+    
+    def __init__(self, archive, path):
+        self.archive = archive
+        self.path = path
+    
+    @property
+    def name(self):
+        return self.path.rpartition('/')[2]
+    
+    def is_file(self):
+        index = self.archive.find(self.path)
+        return index is not None and bool(self.archive.flags(index) & FLAG_RESOURCE)
+    
+    def is_dir(self):
+        index = self.archive.find(self.path.replace('/', '.'))
+        if index is not None and self.archive.flags(index) & FLAG_PACKAGE:
+            return True
+        prefix = self.path + '/'
+        return any(key.startswith(prefix) for key in self.archive.resource_keys())
+    
+    def iterdir(self):
+        prefix = self.path + '/'
+        names = []
+        for key in self.archive.resource_keys():
+            if key.startswith(prefix):
+                name = key[len(prefix):].partition('/')[0]
+                if name not in names:
+                    names.append(name)
+        return iter([PayloadResource(self.archive, prefix + name) for name in names])
+    
+    def joinpath(self, *descendants):
+        path = '/'.join([self.path] + [part for descendant in descendants for part in str(descendant).split('/') if part])
+        return PayloadResource(self.archive, path)
+    
+    def __truediv__(self, child):
+        return self.joinpath(child)
+    
+    def open(self, mode='r', *args, **kwargs):
+        import io
+        index = self.archive.find(self.path)
+        if index is None or not self.archive.flags(index) & FLAG_RESOURCE:
+            raise FileNotFoundError(f"Resource not found in executable: {self.path}")
+        stream = io.BytesIO(bytes(self.archive.read(index)))
+        if 'b' in mode:
+            return stream
+        return io.TextIOWrapper(stream, *args, **kwargs)
+    
+    def read_bytes(self):
+        with self.open('rb') as f:
+            return f.read()
+    
+    def read_text(self, encoding=None):
+        with self.open(encoding=encoding) as f:
+            return f.read()
+    
+    def __repr__(self):
+        return f"PayloadResource({self.archive.name!r}, {self.path!r})"
+
+class PayloadResourceReader:
+    """importlib.resources.abc.TraversableResources of a bundled package"""
+    
+    def __init__(self, archive, package):
+        self.archive = archive
+        self.package = package
+    
+    def files(self):
+        return PayloadResource(self.archive, self.package.replace('.', '/'))
+    
+    def open_resource(self, resource):
+        return self.files().joinpath(resource).open('rb')
+    
+    def resource_path(self, resource):
+        # Resources have no path on disk; importlib.resources.as_file copies them out
+        raise FileNotFoundError(resource)
+    
+    def is_resource(self, path):
+        return self.files().joinpath(path).is_file()
+    
+    def contents(self):
+        return (item.name for item in self.files().iterdir())
+
+class StartupProfile:
+    """Per-module timings of the imports served from the payload
+    
+    Phases are lookup, decompress, unmarshal and exec; exec includes the
+    modules imported while executing. Written on exit as a JSON summary in
+    first-use order and as a Chrome trace.
+    """
+    
+    def __init__(self):
+        self.origin = time.perf_counter_ns()
+        self.records = {}
+        self.events = []
+    
+    def add(self, module, phase, start, archive=None):
+        """Record a phase of a module load that started at the given counter value"""
+        end = time.perf_counter_ns()
+        record = self.records.get(module)
+        if record is None:
+            record = {'module': module, 'archive': None, 'first_use_us': (start - self.origin) / 1000}
+            for name in ('lookup', 'decompress', 'unmarshal', 'exec'):
+                record[f"{name}_us"] = 0.0
+            self.records[module] = record
+        
+        if archive is not None:
+            record['archive'] = archive
+        record[f"{phase}_us"] += (end - start) / 1000
+        self.events.append({
+            'name': module, 'cat': phase, 'ph': 'X', 'pid': 1, 'tid': 1,
+            'ts': (start - self.origin) / 1000, 'dur': (end - start) / 1000,
+        })
+    
+    def write(self):
+        """Write the summary and trace next to the working directory, best effort"""
+        import os, json
+        
+        directory = os.environ.get('BPE_PROFILE_DIR') or os.getcwd()
+        name = os.path.basename(sys.executable)
+        summary = {
+            'executable': sys.executable,
+            'total_us': (time.perf_counter_ns() - self.origin) / 1000,
+            'modules': list(self.records.values()),
+        }
+        
+        try:
+            with open(os.path.join(directory, f"{name}.startup.json"), 'w') as f:
+                json.dump(summary, f, indent=2)
+            with open(os.path.join(directory, f"{name}.startup.trace.json"), 'w') as f:
+                json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+        except OSError as e:
+            sys.stderr.write(f"Could not write startup profile: {e}\n")
+
+class ExtractionCache:
+    """Directory native code is extracted to, shared by every run of one build
+    
+    Lives in $BPE_EXTRACT_DIR or $XDG_CACHE_HOME/bellande_python_executable, in
+    <executable name>/<build id>/. Files are written under a temporary name and
+    renamed into place, so no process ever loads a partial file, and writers
+    hold an advisory lock on the application's directory so each file is
+    extracted once. A file already there is only used once its size and
+    checksum match the payload. When a run extracts anything, other builds of
+    the application are evicted, least recently used first, until the
+    directory fits in $BPE_EXTRACT_CACHE_SIZE bytes.
+    
+    Falls back to a private directory removed on exit when the cache directory
+    cannot be created.
+    """
+    
+    def __init__(self, build_id, checksums):
+        import os
+        self.checksums = checksums
+        self.verified = set()
+        self.locking = False
+        self.locked = False
+        self.evicted = False
+        
+        root = os.environ.get('BPE_EXTRACT_DIR')
+        if not root:
+            cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            root = os.path.join(cache_home, 'bellande_python_executable')
+        self.app_dir = os.path.join(root, os.path.splitext(os.path.basename(sys.executable))[0])
+        self.directory = os.path.join(self.app_dir, build_id or 'unversioned')
+        
+        try:
+            if not build_id:
+                raise OSError("payload has no build id")
+            os.makedirs(self.directory, exist_ok=True)
+            # Directory mtimes order the builds for eviction
+            os.utime(self.directory)
+            self.shared = True
+        except OSError:
+            base = os.environ.get('TMPDIR') or os.environ.get('TEMP') or '/tmp'
+            self.directory = os.path.join(base, f"bpe-{os.getpid()}")
+            self.shared = False
+            import atexit
+            atexit.register(self._cleanup)
+    
+    def extract(self, archive, key, index, filename):
+        """Get the path of an archive entry on disk, writing it unless a valid copy is there"""
+        import os
+        path = os.path.join(self.directory, filename)
+        if path in self.verified:
+            return path
+        
+        checksum = self.checksums.get((archive.name, key))
+        if not self._valid(path, archive, index, checksum):
+            lock = self._lock()
+            try:
+                # Another process may have written it while this one waited
+                if not self._valid(path, archive, index, checksum):
+                    # Read first: loading a compressed entry may itself extract an extension
+                    data = archive.read(index)
+                    os.makedirs(self.directory, exist_ok=True)
+                    temp_path = f"{path}.{os.getpid()}.tmp"
+                    with open(temp_path, 'wb') as f:
+                        f.write(data)
+                    os.replace(temp_path, path)
+                    if lock is not None and not self.evicted:
+                        self.evicted = True
+                        self._evict()
+            finally:
+                if lock is not None:
+                    self.locked = False
+                    os.close(lock)
+        
+        self.verified.add(path)
+        return path
+    
+    def _valid(self, path, archive, index, checksum):
+        """Check an extracted file against its archive entry"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+        
+        if len(data) != archive.size(index):
+            return False
+        if checksum is None or not archive.flags(index) & CODEC_MASK:
+            # Stored entries, including every decompressor, are compared in place
+            return data == archive.read(index)
+        
+        # Not zlib, which may itself be an extracted extension
+        import binascii
+        return binascii.crc32(data) == checksum
+    
+    def _lock(self):
+        """Take the cross-process lock on the application's directory, or None when not taken here
+        
+        Reading an entry under the lock may extract a decompressor, which runs
+        under the same lock, as does extracting the lock module itself, which
+        the atomic rename keeps safe.
+        """
+        if not self.shared or self.locking or self.locked:
+            return None
+        
+        self.locking = True
+        try:
+            import fcntl
+        except ImportError:
+            return None
+        finally:
+            self.locking = False
+        
+        import os
+        fd = os.open(os.path.join(self.app_dir, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except OSError:
+            os.close(fd)
+            raise
+        self.locked = True
+        return fd
+    
+    def _evict(self):
+        """Remove other builds, least recently used first, while the application's directory is over budget"""
+        import os
+        budget = int(os.environ.get('BPE_EXTRACT_CACHE_SIZE') or EXTRACT_CACHE_SIZE)
+        
+        builds = []
+        total = 0
+        for entry in os.scandir(self.app_dir):
+            if entry.is_dir(follow_symlinks=False):
+                size = sum(item.stat().st_size for item in os.scandir(entry.path) if item.is_file(follow_symlinks=False))
+                builds.append((entry.stat().st_mtime, entry.path, size))
+                total += size
+        
+        for _, path, size in sorted(builds):
+            if total <= budget:
+                break
+            if path != self.directory:
+                # Running processes keep their mapped copies
+                self._remove_tree(path)
+                total -= size
+    
+    def _cleanup(self):
+        """Remove the private directory, best effort"""
+        self._remove_tree(self.directory)
+    
+    def _remove_tree(self, directory):
+        """Remove a directory of extracted files, best effort"""
+        import os
+        for root, dirs, files in os.walk(directory, topdown=False):
+            for name in files:
+                try:
+                    os.unlink(os.path.join(root, name))
+                except OSError:
+                    pass
+            try:
+                os.rmdir(root)
+            except OSError:
+                pass
+
+class PayloadImporter:
+    """Meta path finder and loader serving modules straight from payload archives"""
+    
+    def __init__(self, sections, profile=None, options=None):
+        options = options or {}
+        
+        # Highest priority first
+        self.archives = [
+            PayloadArchive(name, sections[name], self.decompressor) for name in reversed(MODULE_SECTIONS) if name in sections
+        ]
+        self.profile = profile
+        
+        # Native code is extracted on first use to a directory shared by every run of this build
+        self.build_id = options.get('build_id')
+        self.checksums = options.get('extraction_checksums', {})
+        self.extraction_cache = None
+        
+        # Shared libraries loaded before the extension modules that link against them
+        self.native = PayloadArchive(NATIVE_SECTION, sections[NATIVE_SECTION], self.decompressor) if NATIVE_SECTION in sections else None
+        self.native_dependencies = options.get('native_dependencies', {})
+        self.loaded_libraries = set()
+        
+        # Modules whose body runs on first attribute access instead of on import
+        self.lazy_modules = frozenset(options.get('lazy_modules', ()))
+        self.lazy_loader = None
+        
+        # Registered with the importlib.resources ABCs on first use
+        self.resource_abcs_registered = False
+        
+        # Code of the modules imported at startup, unmarshalled in a single call
+        self.warm = {}
+        if WARM_SECTION in sections:
+            start = time.perf_counter_ns() if profile else 0
+            for name, section, is_package, code in marshal.loads(sections[WARM_SECTION]):
+                self.warm[name] = (section, is_package, code)
+            if profile:
+                profile.add(WARM_SECTION, 'unmarshal', start)
+    
+    def decompressor(self, codec):
+        """Get the module implementing a codec, loading it straight from the payload"""
+        name = DECOMPRESSOR_MODULES.get(codec)
+        if name is None:
+            raise RuntimeError(f"Unsupported archive codec {codec}")
+        
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        
+        archive, index = self._lookup(name)
+        if archive is None or name in sys.builtin_module_names:
+            # Built into this interpreter, nothing to extract
+            return __import__(name)
+        
+        # Loaded on its own so the package, whose modules may use this codec, is not imported
+        loader = _frozen_importlib_external.ExtensionFileLoader(name, self._extract(name, archive, index))
+        spec = _frozen_importlib.spec_from_loader(name, loader)
+        module = loader.create_module(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+        return module
+    
+    def _lookup(self, key):
+        """Find the archive and entry index providing a key"""
+        for archive in self.archives:
+            index = archive.find(key)
+            if index is not None:
+                return archive, index
+        return None, None
+    
+    def find_spec(self, fullname, path=None, target=None):
+        start = time.perf_counter_ns() if self.profile else 0
+        
+        warm = self.warm.get(fullname)
+        if warm is not None:
+            section, is_package, _ = warm
+            if self.profile:
+                self.profile.add(fullname, 'lookup', start, WARM_SECTION)
+            return self._module_spec(fullname, section, FLAG_BYTECODE | (FLAG_PACKAGE if is_package else 0))
+        
+        archive, index = self._lookup(fullname)
+        if archive is None:
+            return None
+        if self.profile:
+            self.profile.add(fullname, 'lookup', start, archive.name)
+        
+        flags = archive.flags(index)
+        if flags & FLAG_RESOURCE:
+            return None
+        
+        if not flags & (FLAG_BYTECODE | FLAG_SOURCE | FLAG_EXTENSION):
+            # Namespace package
+            spec = _frozen_importlib.ModuleSpec(fullname, None, is_package=True)
+            spec.submodule_search_locations = []
+            return spec
+        
+        if flags & FLAG_EXTENSION:
+            # Native code can only be loaded from a real file
+            start = time.perf_counter_ns() if self.profile else 0
+            self._load_libraries(fullname)
+            loader = _frozen_importlib_external.ExtensionFileLoader(fullname, self._extract(fullname, archive, index))
+            if self.profile:
+                self.profile.add(fullname, 'decompress', start)
+            return _frozen_importlib.spec_from_loader(fullname, loader)
+        
+        return self._module_spec(fullname, archive.name, flags)
+    
+    def _module_spec(self, fullname, section, flags):
+        """Get the spec of a module this importer loads"""
+        is_package = bool(flags & FLAG_PACKAGE)
+        loader = self._get_lazy_loader() if fullname in self.lazy_modules else self
+        spec = _frozen_importlib.ModuleSpec(fullname, loader, origin=self._virtual_path(section, fullname, flags), is_package=is_package)
+        spec.has_location = True
+        if is_package:
+            spec.submodule_search_locations = [spec.origin.rpartition('/')[0]]
+        return spec
+    
+    def _get_lazy_loader(self):
+        """Get the LazyLoader wrapping this importer, created on first use
+        
+        This importer is installed by then, so the modules importlib.util imports
+        come from the payload; importlib.util itself is frozen into the interpreter
+        from Python 3.11.
+        """
+        if self.lazy_loader is None:
+            import importlib.util
+            self.lazy_loader = importlib.util.LazyLoader(self)
+            # importlib.resources asks the spec's loader, which LazyLoader only wraps
+            self.lazy_loader.get_resource_reader = self.get_resource_reader
+        return self.lazy_loader
+    
+    def create_module(self, spec):
+        return None
+    
+    def exec_module(self, module):
+        code = self.get_code(module.__spec__.name)
+        if self.profile:
+            start = time.perf_counter_ns()
+            try:
+                exec(code, module.__dict__)
+            finally:
+                self.profile.add(module.__spec__.name, 'exec', start)
+        else:
+            exec(code, module.__dict__)
+    
+    def is_package(self, fullname):
+        if fullname in self.warm:
+            return self.warm[fullname][1]
+        archive, index = self._lookup(fullname)
+        return archive is not None and bool(archive.flags(index) & FLAG_PACKAGE)
+    
+    def get_code(self, fullname):
+        # Warm code is handed out once, later calls read the archive
+        warm = self.warm.pop(fullname, None)
+        if warm is not None:
+            return warm[2]
+        
+        archive, index = self._lookup(fullname)
+        flags = archive.flags(index)
+        if self.profile:
+            return self._get_code_profiled(fullname, archive, index, flags)
+        data = archive.read(index)
+        
+        if flags & FLAG_BYTECODE:
+            return marshal.loads(data)
+        return compile(bytes(data), self._virtual_path(archive.name, fullname, flags), 'exec', dont_inherit=True)
+    
+    def _get_code_profiled(self, fullname, archive, index, flags):
+        """get_code, recording read and unmarshal times"""
+        start = time.perf_counter_ns()
+        data = archive.read(index)
+        self.profile.add(fullname, 'decompress', start)
+        
+        start = time.perf_counter_ns()
+        if flags & FLAG_BYTECODE:
+            code = marshal.loads(data)
+        else:
+            code = compile(bytes(data), self._virtual_path(archive.name, fullname, flags), 'exec', dont_inherit=True)
+        self.profile.add(fullname, 'unmarshal', start)
+        return code
+    
+    def get_source(self, fullname):
+        archive, index = self._lookup(fullname)
+        if not archive.flags(index) & FLAG_SOURCE:
+            return None
+        return bytes(archive.read(index)).decode('utf-8')
+    
+    def get_data(self, path):
+        """Read a resource bundled next to a module, given its virtual path"""
+        for archive in self.archives:
+            prefix = f"{sys.executable}/{archive.name}/"
+            if path.startswith(prefix):
+                index = archive.find(path[len(prefix):])
+                if index is not None:
+                    return bytes(archive.read(index))
+        raise OSError(f"Resource not found in executable: {path}")
+    
+    def get_resource_reader(self, fullname):
+        """Get the importlib.resources reader of a bundled package"""
+        archive, index = self._lookup(fullname)
+        if archive is None or not archive.flags(index) & FLAG_PACKAGE:
+            return None
+        
+        if not self.resource_abcs_registered:
+            # Not imported by the runtime itself, only once an application uses resources
+            try:
+                from importlib.resources.abc import Traversable, TraversableResources
+            except ImportError:
+                from importlib.abc import Traversable, TraversableResources
+            Traversable.register(PayloadResource)
+            TraversableResources.register(PayloadResourceReader)
+            self.resource_abcs_registered = True
+        
+        return PayloadResourceReader(archive, fullname)
+    
+    def _virtual_path(self, section, fullname, flags):
+        """Get the path reported as __file__ for a module entry"""
+        path = fullname.replace('.', '/')
+        if flags & FLAG_PACKAGE:
+            path += '/__init__'
+        suffix = '.pyc' if flags & FLAG_BYTECODE else '.py'
+        return f"{sys.executable}/{section}/{path}{suffix}"
+    
+    def _load_libraries(self, fullname):
+        """Load the bundled shared libraries an extension module needs, dependencies first
+        
+        Loaded by path, the dynamic loader then matches the extension's DT_NEEDED
+        entries against their sonames instead of searching the system.
+        """
+        libraries = [key for key in self.native_dependencies.get(fullname, ()) if key not in self.loaded_libraries]
+        if not libraries:
+            return
+        
+        import os, _ctypes
+        for key in libraries:
+            path = self._extract(key, self.native, self.native.find(key), key)
+            _ctypes.dlopen(path, os.RTLD_NOW | os.RTLD_GLOBAL)
+            self.loaded_libraries.add(key)
+    
+    def _extract(self, fullname, archive, index, filename=None):
+        """Get the path of a native extension or shared library on disk, extracting it on first use"""
+        if self.extraction_cache is None:
+            self.extraction_cache = ExtractionCache(self.build_id, self.checksums)
+        return self.extraction_cache.extract(archive, fullname, index, filename or fullname + _frozen_importlib_external.EXTENSION_SUFFIXES[-1])
+
+def read_options(sections):
+    """Get the build options recorded in the payload"""
+    options_section = sections.get(OPTIONS_SECTION)
+    if options_section is None:
+        return {}
+    return marshal.loads(options_section)
+
+def install_importer(sections, profile=None, options=None):
+    """Put the payload importer on sys.meta_path, ahead of the path-based finder"""
+    importer = PayloadImporter(sections, profile, options)
+    
+    position = len(sys.meta_path)
+    for index, finder in enumerate(sys.meta_path):
+        if finder is _frozen_importlib_external.PathFinder:
+            position = index
+            break
+    
+    sys.meta_path.insert(position, importer)
+    return importer
+
+def run_main(sections, profile=None):
+    """Execute the bundled main script as __main__"""
+    main_section = sections.get('__main__')
+    if main_section is None:
+        return
+    
+    code = marshal.loads(main_section[PYC_HEADER_SIZE:])
+    main_module = sys.modules['__main__']
+    main_module.__dict__.setdefault('__builtins__', __builtins__)
+    main_module.__dict__.setdefault('__file__', code.co_filename)
+    
+    if profile:
+        start = time.perf_counter_ns()
+        try:
+            exec(code, main_module.__dict__)
+        finally:
+            profile.add('__main__', 'exec', start)
+    else:
+        exec(code, main_module.__dict__)
+
+if __name__ == '__bpe_bootstrap__':
+    sys.frozen = True
+    payload_sections = read_sections(__payload__)
+    payload_options = read_options(payload_sections)
+    
+    startup_profile = None
+    if payload_options.get('profile_startup'):
+        import atexit
+        startup_profile = StartupProfile()
+        atexit.register(startup_profile.write)
+    
+    install_importer(payload_sections, startup_profile, payload_options)
+    run_main(payload_sections, startup_profile)
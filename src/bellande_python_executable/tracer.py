@@ -0,0 +1,236 @@
+"""
+Import tracer for PyPack
+Records the order in which a program first imports its modules
+"""
+
+from header_imports import *
+
+TRACE_TIMEOUT = 60
+
+# Marks the end of a script's import phase; without it the leading imports are used
+IMPORT_PHASE_MARKER = '# bpe: end-imports'
+
+# Runs in a child interpreter; every first import statement raises the 'import'
+# audit event, importlib.import_module only reaches the meta path, and modules
+# loaded behind both are caught by comparing sys.modules on exit
+TRACER_SOURCE = r'''
+import sys, os
+
+def main():
+    trace_path, source_path, script_path = sys.argv[1], sys.argv[2], sys.argv[3]
+    trace = open(trace_path, 'w', encoding='utf-8')
+    
+    # Read and compile with builtins only, so no import of the tracer itself is recorded
+    with open(source_path, 'rb') as f:
+        code = compile(f.read(), script_path, 'exec')
+    
+    def record(name):
+        trace.write(name + '\n')
+        trace.flush()
+    
+    def hook(event, args):
+        if event == 'import' and args[0]:
+            record(args[0])
+    
+    class Recorder:
+        @staticmethod
+        def find_spec(fullname, path=None, target=None):
+            record(fullname)
+            return None
+    
+    sys.argv = sys.argv[3:]
+    sys.path[0] = os.path.dirname(os.path.abspath(script_path))
+    namespace = sys.modules['__main__'].__dict__
+    namespace['__file__'] = script_path
+    preloaded = set(sys.modules)
+    sys.meta_path.insert(0, Recorder)
+    sys.addaudithook(hook)
+    try:
+        exec(code, namespace)
+    finally:
+        for name in list(sys.modules):
+            if name not in preloaded:
+                record(name)
+
+main()
+'''
+
+# Installed as sitecustomize for --trace-command, so every Python process the
+# command starts appends the modules it loads to $BPE_TRACE_FILE
+TRACE_SITE_SOURCE = r'''
+import sys, os, atexit
+
+def _install():
+    trace = open(os.environ['BPE_TRACE_FILE'], 'a', encoding='utf-8')
+    preloaded = set(sys.modules)
+    
+    def record(name):
+        trace.write(name + '\n')
+        trace.flush()
+    
+    def hook(event, args):
+        if event == 'import' and args[0]:
+            record(args[0])
+    
+    class Recorder:
+        @staticmethod
+        def find_spec(fullname, path=None, target=None):
+            record(fullname)
+            return None
+    
+    def finish():
+        for name in list(sys.modules):
+            if name not in preloaded:
+                record(name)
+    
+    sys.meta_path.insert(0, Recorder)
+    sys.addaudithook(hook)
+    atexit.register(finish)
+
+_install()
+
+# Chain to the sitecustomize this one shadows, if any
+_here = os.path.dirname(os.path.abspath(__file__))
+sys.path[:] = [entry for entry in sys.path if os.path.abspath(entry or '.') != _here]
+del sys.modules['sitecustomize']
+try:
+    import sitecustomize
+except ImportError:
+    pass
+'''
+
+def import_phase_end(source: str) -> int:
+    """Get the number of leading source lines that make up the import phase"""
+    lines = source.splitlines()
+    for number, line in enumerate(lines):
+        if line.strip() == IMPORT_PHASE_MARKER:
+            return number
+    
+    end = 0
+    for node in ast.parse(source).body:
+        if not _is_import_statement(node):
+            break
+        end = node.end_lineno
+    return end
+
+def _is_import_statement(node: ast.stmt) -> bool:
+    """Check if a top-level statement only imports, including guarded imports and docstrings"""
+    if isinstance(node, (ast.Import, ast.ImportFrom, ast.Pass)):
+        return True
+    if isinstance(node, ast.Expr):
+        return isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+    if isinstance(node, ast.Try):
+        # try: import x / except ImportError: x = None
+        handlers = [statement for handler in node.handlers for statement in handler.body]
+        return (
+            all(_is_import_statement(statement) for statement in node.body) and
+            all(_is_import_statement(statement) or isinstance(statement, ast.Assign) for statement in handlers)
+        )
+    return False
+
+def load_startup_profile(profile_path: Path) -> List[str]:
+    """Get module names in first-use order from a --profile-startup summary"""
+    with open(profile_path, 'r', encoding='utf-8') as f:
+        profile = json.load(f)
+    
+    modules = sorted(profile.get('modules', []), key=lambda record: record.get('first_use_us', 0))
+    return [record['module'] for record in modules if record.get('module') != '__main__']
+
+class ImportTracer:
+    """Runs the script in a child interpreter and records its import order"""
+    
+    def __init__(self, config, logger):
+        self.config = config
+        self.logger = logger
+    
+    def startup_order(self) -> List[str]:
+        """Get the first-use order from the configured profile or a traced run"""
+        if self.config.startup_profile:
+            order = load_startup_profile(Path(self.config.startup_profile))
+            self.logger.debug(f"Loaded startup order of {len(order)} modules from {self.config.startup_profile}")
+            return order
+        return self.trace()
+    
+    def trace_import_phase(self) -> List[str]:
+        """Run only the script's import phase and return the modules it imported, in order"""
+        source = self.config.script_path.read_text(encoding='utf-8')
+        end = import_phase_end(source)
+        self.logger.debug(f"Import phase ends at line {end} of {self.config.script_path}")
+        
+        phase_path = self.config.get_work_path('import_phase.py')
+        phase_path.write_text(''.join(source.splitlines(keepends=True)[:end]), encoding='utf-8')
+        return self.trace(source_path=phase_path)
+    
+    def trace_analysis(self) -> List[str]:
+        """Get every module loaded by the traced runs of --trace-analysis, --trace-args and --trace-command"""
+        runs = [shlex.split(args) for args in self.config.trace_args]
+        if self.config.trace_analysis and not runs:
+            runs = [[]]
+        
+        modules = []
+        for args in runs:
+            modules.extend(self.trace(args))
+        for command in self.config.trace_commands:
+            modules.extend(self.trace_command(command))
+        
+        # First use order across all runs
+        return list(dict.fromkeys(modules))
+    
+    def trace_command(self, command: str) -> List[str]:
+        """Run a shell command with every Python process it starts traced and return the modules they loaded"""
+        site_dir = self.config.get_work_path('trace_site')
+        site_dir.mkdir(exist_ok=True)
+        (site_dir / 'sitecustomize.py').write_text(TRACE_SITE_SOURCE, encoding='utf-8')
+        
+        trace_path = self.config.get_work_path('command_trace.txt')
+        trace_path.write_text('', encoding='utf-8')
+        
+        env = dict(os.environ, BPE_TRACE_FILE=str(trace_path.resolve()))
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(site_dir.resolve()), os.environ.get('PYTHONPATH')]))
+        
+        self.logger.debug(f"Tracing command: {command}")
+        try:
+            result = subprocess.run(command, shell=True, env=env, capture_output=True, text=True, timeout=TRACE_TIMEOUT, stdin=subprocess.DEVNULL)
+            if result.returncode != 0:
+                self.logger.warning(f"Traced command exited with status {result.returncode}, using the imports seen so far")
+                self.logger.debug(f"Stderr: {result.stderr}")
+        except subprocess.TimeoutExpired:
+            self.logger.warning(f"Traced command did not finish within {TRACE_TIMEOUT}s, using the imports seen so far")
+        
+        return self._read_trace(trace_path)
+    
+    def trace(self, args: List[str] = None, source_path: Optional[Path] = None) -> List[str]:
+        """Run the script with the given arguments and return the modules it imported, in order
+        
+        source_path replaces the code that is run, which still runs as the script.
+        """
+        trace_path = self.config.get_work_path('import_trace.txt')
+        script_path = str(self.config.script_path)
+        cmd = [sys.executable, '-c', TRACER_SOURCE, str(trace_path), str(source_path or script_path), script_path] + list(args or [])
+        
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=TRACE_TIMEOUT, stdin=subprocess.DEVNULL)
+            if result.returncode != 0:
+                self.logger.warning(f"Traced run exited with status {result.returncode}, using the imports seen so far")
+                self.logger.debug(f"Stderr: {result.stderr}")
+        except subprocess.TimeoutExpired:
+            self.logger.warning(f"Traced run did not finish within {TRACE_TIMEOUT}s, using the imports seen so far")
+        
+        return self._read_trace(trace_path)
+    
+    def _read_trace(self, trace_path: Path) -> List[str]:
+        """Read module names from a trace file, in first-use order"""
+        order = []
+        seen = set()
+        try:
+            with open(trace_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    module_name = line.strip()
+                    if module_name and module_name not in seen:
+                        seen.add(module_name)
+                        order.append(module_name)
+        except OSError:
+            self.logger.warning("Traced run recorded no imports")
+        
+        self.logger.debug(f"Traced {len(order)} imports")
+        return order
@@ -3,6 +3,10 @@ Utility classes and functions for PyPack
 """
 
 from header_imports import *
+from archive import parse_compression_policy
+from cache import BuildCache
+from manifest import MANIFEST_NAME, BuildManifest
+from resolver import ModuleResolver, get_default_resolver
 
 class Logger:
     """Simple logging utility"""
@@ -34,6 +38,28 @@ class ConfigManager:
     exclude_modules: List[str] = None
     include_modules: List[str] = None
     add_data: List[str] = None
+    cache_dir: Optional[str] = None
+    no_cache: bool = False
+    payload_mode: str = 'append'
+    payload_access: str = 'mmap'
+    profile_startup: bool = False
+    startup_profile: Optional[str] = None
+    trace_startup: bool = False
+    compression: List[str] = None
+    frozen_startup: bool = False
+    freeze: List[str] = None
+    incremental: bool = False
+    trace_analysis: bool = False
+    trace_args: List[str] = None
+    trace_commands: List[str] = None
+    lazy_imports: bool = False
+    lazy_allow: List[str] = None
+    lazy_deny: List[str] = None
+    bundle_system_libs: bool = False
+    jobs: Optional[int] = None
+    minimize_stdlib: bool = True
+    stdlib_allow: List[str] = None
+    stdlib_deny: List[str] = None
     
     def __post_init__(self):
         if self.exclude_modules is None:
@@ -42,17 +68,65 @@ class ConfigManager:
             self.include_modules = []
         if self.add_data is None:
             self.add_data = []
+        if self.stdlib_allow is None:
+            self.stdlib_allow = []
+        if self.stdlib_deny is None:
+            self.stdlib_deny = []
+        if self.compression is None:
+            self.compression = []
+        if self.freeze is None:
+            self.freeze = []
+        if self.trace_args is None:
+            self.trace_args = []
+        if self.trace_commands is None:
+            self.trace_commands = []
+        if self.lazy_allow is None:
+            self.lazy_allow = []
+        if self.lazy_deny is None:
+            self.lazy_deny = []
+        if not self.jobs:
+            self.jobs = os.cpu_count() or 1
         
-        # Create work directory
-        self.work_dir = Path(f"build_{self.output_name}_{int(time.time())}")
-        self.work_dir.mkdir(exist_ok=True)
+        # Codec and level per archive category
+        self.compression_policy = parse_compression_policy(self.compression)
+        
+        # Module names in first-use order, filled in by the import tracer
+        self.startup_order = []
+        self.warm_modules = []
+        
+        # Modules loaded by traced runs, filled in before analysis
+        self.traced_modules = []
+        
+        # Modules the runtime loads lazily, selected from the analyzed import contexts
+        self.lazy_modules = []
+        
+        # Bundled shared libraries each extension module needs, filled in by the collector
+        self.native_dependencies = {}
+        
+        # Work directory, reused between incremental builds and only created when something is written
+        if self.incremental:
+            self.work_dir = Path(f"build_{self.output_name}")
+        else:
+            self.work_dir = Path(f"build_{self.output_name}_{int(time.time())}")
         
         # Output directory
         self.output_dir = Path("dist")
         self.output_dir.mkdir(exist_ok=True)
+        
+        # Persistent build cache shared by all stages
+        self.cache = BuildCache(self.cache_dir, enabled=not self.no_cache)
+        
+        # Record of the previous build in the work directory
+        manifest_path = self.get_work_path(MANIFEST_NAME) if self.incremental else None
+        self.manifest = BuildManifest(manifest_path, self.cache.interpreter_tag)
+        self.cache.load_digests(self.manifest.previous['files'])
+        
+        # Module resolver shared by all stages
+        self.resolver = ModuleResolver(self.script_path.parent)
     
     def get_work_path(self, *args):
-        """Get path relative to work directory"""
+        """Get path relative to work directory, creating the directory on first use"""
+        self.work_dir.mkdir(exist_ok=True)
         return self.work_dir / Path(*args)
     
     def get_output_path(self, *args):
@@ -155,40 +229,7 @@ def is_builtin_module(module_name):
 
 def is_stdlib_module(module_name):
     """Check if a module is part of the standard library"""
-    import importlib.util
-    
-    if is_builtin_module(module_name):
-        return True
-    
-    try:
-        spec = importlib.util.find_spec(module_name)
-        if spec is None:
-            return False
-        
-        if spec.origin is None:
-            return True  # namespace package, likely stdlib
-        
-        # Check if the module is in the standard library path
-        stdlib_path = Path(get_python_paths()['stdlib'])
-        platstdlib_path = Path(get_python_paths()['platstdlib'])
-        
-        module_path = Path(spec.origin)
-        
-        try:
-            module_path.relative_to(stdlib_path)
-            return True
-        except ValueError:
-            pass
-        
-        try:
-            module_path.relative_to(platstdlib_path)
-            return True
-        except ValueError:
-            pass
-        
-        return False
-    except ImportError:
-        return False
+    return get_default_resolver().kind(module_name) in ['builtin', 'frozen', 'stdlib']
 
 def create_temp_file(content, suffix=".c"):
     """Create a temporary file with content"""
@@ -0,0 +1,239 @@
+"""
+File watcher for PyPack
+Rebuilds the executable whenever one of the project files it was built from changes
+"""
+
+from header_imports import *
+
+# Seconds between scans when inotify is not available
+POLL_INTERVAL = 0.5
+
+# Seconds without further events before a burst of saves triggers one rebuild
+DEBOUNCE_INTERVAL = 0.1
+
+# inotify(7) event masks
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')
+
+class InotifyWatcher:
+    """Watches directories with inotify through ctypes, without a third-party package
+    
+    Directories are watched rather than files, so editors that save by writing a
+    new file and renaming it over the old one are seen too.
+    """
+    
+    def __init__(self, directories: Set[Path]):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        
+        self.directories = {}
+        try:
+            for directory in directories:
+                descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+                if descriptor < 0:
+                    raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+                self.directories[descriptor] = directory
+        except OSError:
+            self.close()
+            raise
+    
+    def wait(self, timeout: Optional[float] = None) -> Optional[Set[Path]]:
+        """Block until events arrive and return the paths they name, or None on overflow"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        
+        paths = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return paths
+        
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, name_size = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            name = data[offset:offset + name_size].rstrip(b'\0')
+            offset += name_size
+            
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if name and descriptor in self.directories:
+                paths.add(self.directories[descriptor] / os.fsdecode(name))
+        
+        return paths
+    
+    def close(self):
+        """Release the inotify descriptor and all its watches"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    """Watches files by comparing their mtime and size on a fixed interval"""
+    
+    def __init__(self, directories: Set[Path]):
+        self.directories = directories
+        self.snapshot = self._scan()
+    
+    def wait(self, timeout: Optional[float] = None) -> Optional[Set[Path]]:
+        """Sleep for one interval and return the paths that changed since the last scan"""
+        time.sleep(POLL_INTERVAL if timeout is None else min(timeout, POLL_INTERVAL))
+        
+        snapshot = self._scan()
+        paths = {path for path in snapshot.keys() | self.snapshot.keys() if snapshot.get(path) != self.snapshot.get(path)}
+        self.snapshot = snapshot
+        return paths
+    
+    def close(self):
+        """Nothing to release"""
+    
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        """Get the (mtime, size) of every file in the watched directories"""
+        snapshot = {}
+        for directory in self.directories:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue
+        
+        return snapshot
+
+class BuildWatcher:
+    """Runs a build, then reruns it every time a project file it used is saved
+    
+    The build stages keep their state on the shared config between runs: the
+    manifest holds the previous build's digests, imports and archive sources, and
+    the cache keeps compiled bytecode in memory, so each rebuild only redoes the
+    work for the files that changed.
+    """
+    
+    def __init__(self, config, logger):
+        self.config = config
+        self.logger = logger
+        self.config.cache.retain('bytecode')
+    
+    def watch(self, build: Callable[[], List[Path]]):
+        """Build once and rebuild on every change until interrupted
+        
+        build runs every build stage and returns the project files it read.
+        """
+        # Watched from before each build, so saves made while it runs are not lost
+        watcher = self._create_watcher([])
+        
+        try:
+            sources = self._run(build)
+            while True:
+                # The sources may live in new directories now; the old watcher is drained
+                # once the new one is open
+                previous, watcher = watcher, self._create_watcher(sources)
+                try:
+                    changed = self._pending_changes(previous, sources)
+                finally:
+                    previous.close()
+                
+                changed = changed or self._wait_for_change(watcher, sources)
+                for path in sorted(changed):
+                    self.logger.info(f"Changed: {path}")
+                
+                # Modules may have been added, moved or removed
+                self.config.resolver.invalidate(['local', 'missing'])
+                sources = self._run(build) or sources
+        except KeyboardInterrupt:
+            self.logger.info("Stopped watching")
+        finally:
+            watcher.close()
+    
+    def _run(self, build: Callable[[], List[Path]]) -> List[Path]:
+        """Run one build, reporting failures instead of stopping the watch"""
+        started = time.perf_counter()
+        try:
+            sources = build()
+        except Exception as e:
+            self.logger.error(f"Build failed: {e}")
+            if self.config.debug:
+                import traceback
+                traceback.print_exc()
+            return []
+        
+        # Compiled bytecode of files that changed is not needed again
+        self.config.cache.trim_retained()
+        self.logger.info(f"Build finished in {time.perf_counter() - started:.2f}s, watching {len(sources)} files for changes")
+        return sources
+    
+    def _create_watcher(self, sources: List[Path]):
+        """Watch the directories of the sources with inotify, or poll them"""
+        directories = {Path(path).resolve().parent for path in sources + [self.config.script_path]}
+        
+        if sys.platform.startswith('linux'):
+            try:
+                return InotifyWatcher(directories)
+            except (OSError, AttributeError) as e:
+                self.logger.debug(f"inotify is not available ({e}), polling instead")
+        
+        return PollingWatcher(directories)
+    
+    def _wait_for_change(self, watcher, sources: List[Path]) -> Set[Path]:
+        """Wait for a burst of events that touches a source or adds a module"""
+        watched = self._watched(sources)
+        
+        while True:
+            events = watcher.wait()
+            if events is None:
+                # Events were dropped, so anything may have changed
+                return watched
+            
+            changed = self._relevant(events, watched)
+            if not changed:
+                continue
+            
+            # Let the rest of a multi-file save land before rebuilding
+            while True:
+                events = watcher.wait(DEBOUNCE_INTERVAL)
+                if events is None:
+                    return watched
+                if not events:
+                    return changed
+                changed |= self._relevant(events, watched)
+    
+    def _pending_changes(self, watcher, sources: List[Path]) -> Set[Path]:
+        """Get the relevant changes a watcher has already seen, without waiting"""
+        watched = self._watched(sources)
+        changed = set()
+        
+        while True:
+            events = watcher.wait(0)
+            if events is None:
+                return watched
+            if not events:
+                return changed
+            changed |= self._relevant(events, watched)
+    
+    def _watched(self, sources: List[Path]) -> Set[Path]:
+        """Get the resolved paths of the files a build used"""
+        return {Path(path).resolve() for path in sources + [self.config.script_path]}
+    
+    def _relevant(self, events: Set[Path], watched: Set[Path]) -> Set[Path]:
+        """Keep the events that touch a source or, being a new .py file, may satisfy a missing import
+        
+        Only files named like a module can be imported, which leaves out editor
+        lock and backup files such as .#app.py, and dotfiles.
+        """
+        return {path for path in events if path in watched or (path.suffix == '.py' and path.stem.isidentifier())}
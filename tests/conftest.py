@@ -0,0 +1,87 @@
+"""
+Test setup for PyPack
+Loads the modules through header_imports.py, the star-import chain main.py uses
+"""
+
+import os
+import shutil
+import sys
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / 'src' / 'bellande_python_executable'), str(ROOT / 'header_imports')]
+
+if 'header_imports' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('header_imports', ROOT / 'header_imports.py')
+    header_imports = importlib.util.module_from_spec(spec)
+    sys.modules['header_imports'] = header_imports
+    spec.loader.exec_module(header_imports)
+
+# main.py itself, for the build stages it runs
+spec = importlib.util.spec_from_file_location('bpe_main', ROOT / 'main.py')
+main = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(main)
+
+from archive import resolve_compression_policy
+from utilities import ConfigManager, Logger
+
+# A script importing a local package with absolute and relative imports
+PROJECT_FILES = {
+    'app.py': 'import json\nimport mypkg.api\nfrom mypkg import helpers\n\nprint(mypkg.api.run(), helpers.NAME)\n',
+    'mypkg/__init__.py': '',
+    'mypkg/api.py': 'from . import helpers\nfrom .sub.deep import VALUE\n\ndef run():\n    return helpers.NAME, VALUE\n',
+    'mypkg/helpers.py': 'import csv\n\nNAME = "helpers"\n',
+    'mypkg/sub/__init__.py': '',
+    'mypkg/sub/deep.py': 'from ..helpers import NAME\nimport textwrap\n\nVALUE = textwrap.shorten(NAME, 20)\n',
+    'mypkg/config.json': '{"name": "mypkg"}\n',
+    'mypkg/data/table.json': '{"key": "value"}\n',
+}
+
+@pytest.fixture
+def project(tmp_path):
+    """Write PROJECT_FILES to a project directory and return the path of its script"""
+    project_dir = tmp_path / 'project'
+    for name, source in PROJECT_FILES.items():
+        path = project_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source)
+    return project_dir / 'app.py'
+
+@pytest.fixture
+def make_config(tmp_path, monkeypatch):
+    """Create build configurations that keep dist/, work directories and the cache under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    
+    def make(script_path, **options):
+        options.setdefault('cache_dir', str(tmp_path / 'cache'))
+        return ConfigManager(Path(script_path), Path(script_path).stem, **options)
+    
+    return make
+
+@pytest.fixture(scope='session')
+def shared_cache_dir(tmp_path_factory):
+    """Build cache shared by the tests that build executables, so each compiles the bootstrap and stdlib once"""
+    return tmp_path_factory.mktemp('cache')
+
+@pytest.fixture
+def build_executable(make_config, shared_cache_dir, tmp_path, monkeypatch):
+    """Build executables with the stages main.py runs and return their paths
+    
+    Native code they extract when run goes to tmp_path.
+    """
+    if os.name != 'posix' or shutil.which('gcc') is None:
+        pytest.skip("needs POSIX and gcc")
+    monkeypatch.setenv('BPE_EXTRACT_DIR', str(tmp_path / 'extract'))
+    
+    def build(script_path, **options):
+        options.setdefault('cache_dir', str(shared_cache_dir))
+        config = make_config(script_path, **options)
+        logger = Logger()
+        config.compression_policy = resolve_compression_policy(config.compression_policy, logger)
+        main.build(config, logger)
+        return config.get_output_path(config.output_name).resolve()
+    
+    return build
@@ -0,0 +1,122 @@
+"""
+Import scanner tests for PyPack
+Checks the imports found in a source and the context each one runs in
+"""
+
+import analyzer
+from analyzer import DependencyAnalyzer, parse_imports
+from utilities import Logger
+
+def contexts(source: str):
+    imports, error = parse_imports(source.encode())
+    assert error is None
+    return {module: context for module, _, _, context in imports}
+
+def test_no_imports():
+    assert parse_imports(b'x = 1\n') == ([], None)
+
+def test_syntax_error_reported():
+    imports, error = parse_imports(b'import os\ndef broken(:\n')
+    assert imports is None
+    assert error is not None
+
+def test_from_imports_and_levels():
+    imports, _ = parse_imports(b'from pkg import a, b\nfrom . import sibling\nfrom ..parent import c\n')
+    assert imports == [
+        ['pkg', ['a', 'b'], 0, 'module'],
+        ['', ['sibling'], 1, 'module'],
+        ['parent', ['c'], 2, 'module'],
+    ]
+
+def test_module_level_use_is_eager():
+    assert contexts('import json\nprint(json.dumps(1))\n') == {'json': 'module'}
+
+def test_use_only_inside_functions_is_deferred():
+    source = 'import json\n\ndef dump(value):\n    return json.dumps(value)\n'
+    assert contexts(source) == {'json': 'deferred'}
+
+def test_unused_import_is_eager():
+    # Imported for its side effects, such as registering a plugin
+    source = 'import registry\nimport plugin\n\ndef handlers():\n    return registry.HANDLERS\n'
+    assert contexts(source) == {'registry': 'deferred', 'plugin': 'module'}
+
+def test_decorators_defaults_and_annotations_are_module_level():
+    source = (
+        'import functools\nimport defaults\nimport typing\n\n'
+        '@functools.cache\ndef f(x=defaults.VALUE) -> typing.Any:\n    return x\n'
+    )
+    assert contexts(source) == {'functools': 'module', 'defaults': 'module', 'typing': 'module'}
+
+def test_class_body_is_module_level():
+    source = 'import enum\n\nclass Color(enum.Enum):\n    RED = 1\n'
+    assert contexts(source) == {'enum': 'module'}
+
+def test_dotted_import_binds_top_package():
+    source = 'import os.path\n\ndef join(a, b):\n    return os.path.join(a, b)\n'
+    assert contexts(source) == {'os.path': 'deferred'}
+
+def test_function_imports():
+    source = 'def load():\n    import csv\n    from json import loads\n    return csv, loads\n'
+    assert contexts(source) == {'csv': 'function', 'json': 'function'}
+
+def test_optional_imports():
+    source = (
+        'try:\n    import orjson\nexcept ImportError:\n    orjson = None\n'
+        'try:\n    import yaml\nexcept (ValueError, ModuleNotFoundError):\n    yaml = None\n'
+        'try:\n    import toml\nexcept ValueError:\n    toml = None\n'
+        'print(orjson, yaml, toml)\n'
+    )
+    assert contexts(source) == {'orjson': 'optional', 'yaml': 'optional', 'toml': 'module'}
+
+def test_imports_in_nested_blocks():
+    source = 'import sys\nif sys.platform == "win32":\n    import winreg\nelse:\n    import posix\nprint(winreg, posix)\n'
+    assert contexts(source) == {'sys': 'module', 'winreg': 'module', 'posix': 'module'}
+
+def test_analyze_project(project, make_config):
+    config = make_config(project)
+    dependencies = DependencyAnalyzer(config, Logger()).analyze()
+    
+    assert dependencies['local'] == {'mypkg', 'mypkg.api', 'mypkg.helpers', 'mypkg.sub', 'mypkg.sub.deep'}
+    assert {'json', 'csv', 'textwrap'} <= dependencies['stdlib']
+
+def test_concurrent_analysis_matches_serial(project, make_config, monkeypatch):
+    def analyze(jobs):
+        # Uncached, so every file is parsed again
+        config = make_config(project, jobs=jobs, no_cache=True)
+        dependency_analyzer = DependencyAnalyzer(config, Logger())
+        dependencies = dependency_analyzer.analyze()
+        return dependencies, dependency_analyzer.import_graph, dependency_analyzer.import_contexts
+    
+    serial = analyze(1)
+    # Send every wave of more than one file to the worker processes
+    monkeypatch.setattr(analyzer, 'PARALLEL_PARSE_SIZE', 0)
+    assert analyze(4) == serial
+
+def test_relative_imports(make_config, tmp_path, capsys):
+    files = {
+        'app.py': 'import pkg\nfrom . import sibling\n',
+        'pkg/__init__.py': 'from .a import A\n',
+        'pkg/a.py': 'from . import b\nfrom .sub import c\n\nA = 1\n',
+        'pkg/b.py': '',
+        'pkg/sub/__init__.py': '',
+        'pkg/sub/c.py': 'from ..b import *\nfrom .. import A\nfrom .... import beyond\n',
+    }
+    for name, source in files.items():
+        path = tmp_path / 'project' / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source)
+    
+    dependency_analyzer = DependencyAnalyzer(make_config(tmp_path / 'project' / 'app.py'), Logger())
+    dependencies = dependency_analyzer.analyze()
+    graph = dependency_analyzer.import_graph
+    
+    # A package anchors its own relative imports, a module its parent's
+    assert 'pkg.a' in graph['pkg']
+    assert {'pkg', 'pkg.b', 'pkg.sub.c'} <= graph['pkg.a']
+    assert {'pkg', 'pkg.b'} <= graph['pkg.sub.c']
+    # Names that are not submodules add nothing
+    assert dependencies['local'] == {'pkg', 'pkg.a', 'pkg.b', 'pkg.sub', 'pkg.sub.c'}
+    
+    output = capsys.readouterr().out
+    assert 'has no parent package' in output
+    assert 'Could not resolve relative import in pkg.sub.c' in output
@@ -0,0 +1,92 @@
+"""
+Archive format tests for PyPack
+Entries written by ArchiveWriter are read back by the build-time reader and the runtime reader
+"""
+
+import zlib
+
+import pytest
+
+import runtime
+from archive import (
+    ArchiveWriter, CODEC_MASK, CODEC_SHIFT, CODECS, FLAG_BYTECODE, FLAG_EXTENSION, FLAG_PACKAGE, FLAG_RESOURCE,
+    FLAG_SOURCE, PYC_HEADER_SIZE, archive_key, codec_available, decompress_data, read_archive,
+)
+
+ENTRIES = {
+    'pkg/__init__.pyc': b'\0' * PYC_HEADER_SIZE + b'package code',
+    'pkg/mod.py': b'print("hello")\n' * 50,
+    'pkg/_native.cpython-311-x86_64-linux-gnu.so': bytes(range(256)) * 8,
+    'pkg/data/table.json': b'{"key": "value"}',
+}
+
+def decompressor(codec):
+    """Module the runtime reader decompresses a codec with"""
+    if codec == CODECS['deflate']:
+        return zlib
+    if codec == CODECS['zstd']:
+        return pytest.importorskip('zstandard')
+    return pytest.importorskip('lz4.block')
+
+def build(codec='deflate', level=9, order=None):
+    writer = ArchiveWriter(codec, level)
+    for arcname, data in ENTRIES.items():
+        assert writer.add(arcname, data)
+    return writer.to_bytes(order)
+
+def test_archive_key():
+    assert archive_key('pkg/__init__.pyc') == ('pkg', FLAG_BYTECODE | FLAG_PACKAGE)
+    assert archive_key('pkg/mod.py') == ('pkg.mod', FLAG_SOURCE)
+    assert archive_key('pkg/_native.cpython-311-x86_64-linux-gnu.so') == ('pkg._native', FLAG_EXTENSION)
+    assert archive_key('pkg/data/table.json') == ('pkg/data/table.json', FLAG_RESOURCE)
+
+def test_duplicate_key_rejected():
+    writer = ArchiveWriter()
+    assert writer.add('pkg/mod.py', b'a = 1')
+    assert not writer.add('pkg/mod.pyc', b'\0' * PYC_HEADER_SIZE + b'code')
+
+@pytest.mark.parametrize('codec, level', [('stored', 0), ('deflate', 9), ('zstd', 3), ('lz4', 0)])
+def test_round_trip(codec, level):
+    if not codec_available(codec):
+        pytest.skip(f"{codec} is not installed")
+    
+    data = build(codec, level)
+    entries = read_archive(data)
+    archive = runtime.PayloadArchive('test', memoryview(data), decompressor)
+    
+    assert len(entries) == archive.count == len(ENTRIES)
+    for arcname, raw in ENTRIES.items():
+        key, flags = archive_key(arcname)
+        if flags & FLAG_BYTECODE:
+            # Stored as the bare code object
+            raw = raw[PYC_HEADER_SIZE:]
+        
+        entry_flags, packed, raw_size = entries[key]
+        codec_name = {value: name for name, value in CODECS.items()}[(entry_flags & CODEC_MASK) >> CODEC_SHIFT]
+        assert entry_flags & ~CODEC_MASK == flags
+        assert raw_size == len(raw)
+        assert decompress_data(packed, codec_name, raw_size) == raw
+        
+        index = archive.find(key)
+        assert index is not None
+        assert archive.flags(index) == entry_flags
+        assert archive.size(index) == len(raw)
+        assert bytes(archive.read(index)) == raw
+    
+    assert archive.find('pkg.missing') is None
+
+def test_compressible_entries_are_compressed():
+    entries = read_archive(build('deflate', 9))
+    flags, packed, raw_size = entries['pkg.mod']
+    assert (flags & CODEC_MASK) >> CODEC_SHIFT == CODECS['deflate']
+    assert len(packed) < raw_size
+
+def test_startup_order_lays_out_data():
+    order = ['pkg.mod', 'pkg']
+    data = build(order=order)
+    entries = read_archive(data)
+    offsets = {key: data.index(packed) for key, (_, packed, _) in entries.items() if packed}
+    assert offsets['pkg.mod'] < offsets['pkg']
+    
+    # The layout changes where entries are, not what they hold
+    assert entries == read_archive(build())
@@ -0,0 +1,116 @@
+"""
+Build cache tests for PyPack
+Entries are keyed by content, interpreter and options and survive only complete writes
+"""
+
+import os
+import sys
+
+from cache import BuildCache
+
+def test_key_follows_interpreter_and_options(tmp_path, monkeypatch):
+    cache = BuildCache(tmp_path)
+    key = cache.key('bytecode', 'digest', 'optimize=0')
+    
+    assert cache.key('bytecode', 'digest', 'optimize=0') == key
+    assert cache.key('bytecode', 'digest', 'optimize=2') != key
+    assert cache.key('bytecode', 'other', 'optimize=0') != key
+    assert cache.key('imports', 'digest', 'optimize=0') != key
+    
+    monkeypatch.setattr(sys, 'version', sys.version + ' (patched)')
+    assert BuildCache(tmp_path).key('bytecode', 'digest', 'optimize=0') != key
+
+def test_round_trips(tmp_path):
+    cache = BuildCache(tmp_path)
+    key = cache.key('bytecode', 'digest')
+    
+    assert cache.get('bytecode', key) is None
+    cache.put('bytecode', key, b'code')
+    assert cache.get('bytecode', key) == b'code'
+    
+    cache.put_json('imports', key, [['json', [], 0, 'module']])
+    assert cache.get_json('imports', key) == [['json', [], 0, 'module']]
+    
+    # Entries are on disk, so a later build sees them
+    assert BuildCache(tmp_path).get('bytecode', key) == b'code'
+    assert (cache.hits, cache.misses) == (2, 1)
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = BuildCache(tmp_path / 'cache', enabled=False)
+    cache.put('bytecode', 'key', b'code')
+    assert cache.get('bytecode', 'key') is None
+    assert not (tmp_path / 'cache').exists()
+
+def test_failed_write_leaves_no_entry(tmp_path, monkeypatch):
+    cache = BuildCache(tmp_path)
+    key = cache.key('bytecode', 'digest')
+    
+    def fail(*args):
+        raise OSError("disk full")
+    
+    monkeypatch.setattr(os, 'replace', fail)
+    cache.put('bytecode', key, b'code')
+    monkeypatch.undo()
+    
+    assert cache.get('bytecode', key) is None
+    assert [path for path in tmp_path.rglob('*') if path.is_file()] == []
+
+def test_corrupt_json_is_a_miss(tmp_path):
+    cache = BuildCache(tmp_path)
+    cache.put('imports', 'key', b'{not json')
+    assert cache.get_json('imports', 'key') is None
+
+def test_retained_entries_are_trimmed(tmp_path):
+    cache = BuildCache(tmp_path, enabled=False)
+    cache.retain('bytecode')
+    cache.put('bytecode', 'old', b'old code')
+    cache.put('bytecode', 'kept', b'kept code')
+    cache.trim_retained()
+    
+    # Without a disk cache, retained entries are all there is
+    assert cache.get('bytecode', 'old') == b'old code'
+    assert cache.get('bytecode', 'kept') == b'kept code'
+    
+    # Only entries used since the last trim survive the next one
+    cache.trim_retained()
+    assert cache.get('bytecode', 'kept') == b'kept code'
+    cache.trim_retained()
+    cache.trim_retained()
+    assert cache.get('bytecode', 'kept') is None
+    assert cache.get('bytecode', 'old') is None
+
+def test_retained_disk_hits_stay_in_memory(tmp_path):
+    BuildCache(tmp_path).put('bytecode', 'key', b'code')
+    
+    cache = BuildCache(tmp_path)
+    cache.retain('bytecode')
+    assert cache.get('bytecode', 'key') == b'code'
+    
+    for path in tmp_path.rglob('*'):
+        if path.is_file():
+            path.unlink()
+    assert cache.get('bytecode', 'key') == b'code'
+
+def test_digests_export_and_load(tmp_path):
+    source = tmp_path / 'module.py'
+    source.write_text('x = 1\n')
+    
+    cache = BuildCache(tmp_path / 'cache')
+    digest = cache.file_digest(source)
+    assert cache.read_file(source) == (b'x = 1\n', digest)
+    
+    entries = cache.export_digests()
+    stat = source.stat()
+    assert entries == [[str(source), stat.st_mtime_ns, stat.st_size, digest]]
+    # Exporting resets what counts as used
+    assert cache.export_digests() == []
+    
+    # A new build trusts loaded digests while mtime and size match
+    later = BuildCache(tmp_path / 'cache')
+    assert later.cached_digest(source) is None
+    later.load_digests(entries)
+    assert later.cached_digest(source) == digest
+    
+    source.write_text('x = 22\n')
+    assert later.cached_digest(source) is None
+    assert later.file_digest(source) != digest
@@ -0,0 +1,61 @@
+"""
+Bytecode compiler tests for PyPack
+Collected projects are compiled into archives and the frozen module section
+"""
+
+from analyzer import DependencyAnalyzer
+from archive import CODEC_MASK, CODEC_SHIFT, CODECS, FLAG_BYTECODE, read_archive
+from collector import CodeCollector, CollectedFile
+from compiler import BytecodeCompiler
+from utilities import Logger
+
+def collect(config):
+    """Analyze and collect a project the way main.py does before compiling"""
+    dependencies = DependencyAnalyzer(config, Logger()).analyze()
+    return CodeCollector(config, Logger()).collect(dependencies)
+
+def test_packages_with_nested_resources_are_not_frozen(project, make_config):
+    # Leave only data/table.json, in a directory that is not a package
+    (project.parent / 'mypkg' / 'config.json').unlink()
+    config = make_config(project, freeze=[':local'])
+    compiler = BytecodeCompiler(config, Logger())
+    compiler.compile(collect(config))
+    
+    assert compiler.frozen == {'mypkg.api', 'mypkg.helpers', 'mypkg.sub', 'mypkg.sub.deep'}
+
+def test_parallel_compile_matches_serial(project, make_config):
+    config = make_config(project, no_cache=True, jobs=1)
+    collected_files = collect(config)
+    serial = BytecodeCompiler(config, Logger()).compile(collected_files)
+    
+    config.jobs = 4
+    parallel = BytecodeCompiler(config, Logger()).compile(collected_files)
+    
+    assert serial.keys() == parallel.keys()
+    for category in ['main_script', 'stdlib_modules', 'local_modules']:
+        assert parallel[category] == serial[category]
+
+def test_entries_are_compressed_individually(project, make_config):
+    assets = project.parent / 'assets'
+    assets.mkdir()
+    data = {'notes.txt': b'note ' * 200, 'image.png': b'\0' * 1000, 'tiny.txt': b'x'}
+    for name, content in data.items():
+        (assets / name).write_bytes(content)
+    
+    collected_files = {
+        'main_script': [project],
+        'stdlib_modules': [],
+        'third_party_modules': [],
+        'local_modules': [CollectedFile(project.parent / 'mypkg' / 'helpers.py', 'mypkg/helpers.py')],
+        'data_files': [CollectedFile(assets / name, f"assets/{name}") for name in data],
+    }
+    result = BytecodeCompiler(make_config(project), Logger()).compile(collected_files)
+    
+    # Already compressed formats and entries too small to gain are stored
+    codecs = {key: (flags & CODEC_MASK) >> CODEC_SHIFT for key, (flags, _, _) in read_archive(result['data_files']).items()}
+    assert codecs == {'assets/notes.txt': CODECS['deflate'], 'assets/image.png': CODECS['stored'], 'assets/tiny.txt': CODECS['stored']}
+    
+    # Bytecode is built in memory, nothing is written next to the sources
+    flags, _, _ = read_archive(result['local_modules'])['mypkg.helpers']
+    assert flags & FLAG_BYTECODE
+    assert list(project.parent.rglob('*.pyc')) == []
@@ -0,0 +1,122 @@
+"""
+ELF reader tests for PyPack
+Shared libraries are linked with the system compiler and their dynamic sections read back
+"""
+
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import elf
+from cache import BuildCache
+from elf import ELFCLASS32, NativeLibraryWalker, read_elf
+from utilities import Logger
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith('linux') or shutil.which('gcc') is None, reason="needs Linux and gcc"
+)
+
+class WalkerConfig:
+    """The options NativeLibraryWalker reads"""
+    
+    def __init__(self, tmp_path, bundle_system_libs=False):
+        self.bundle_system_libs = bundle_system_libs
+        self.cache = BuildCache(tmp_path / 'cache')
+
+def link(output, source, *flags):
+    source_path = output.with_suffix('.c')
+    source_path.write_text(source)
+    subprocess.run(['gcc', '-shared', '-fPIC', '-o', str(output), str(source_path), *flags], check=True)
+    return output
+
+@pytest.fixture
+def libraries(tmp_path):
+    """ext.so needs libtwo.so.2 through $ORIGIN/../libs, which needs libone.so.1 from its own directory"""
+    libs = tmp_path / 'libs'
+    package = tmp_path / 'package'
+    libs.mkdir()
+    package.mkdir()
+    
+    link(libs / 'libone.so.1', 'int one(void) { return 1; }\n', '-Wl,-soname,libone.so.1')
+    link(
+        libs / 'libtwo.so.2', 'int one(void);\nint two(void) { return one() + 1; }\n',
+        '-Wl,-soname,libtwo.so.2', f'-L{libs}', '-l:libone.so.1', '-Wl,-rpath,$ORIGIN',
+    )
+    link(
+        package / 'ext.so', 'int two(void);\nint ext(void) { return two(); }\n',
+        f'-L{libs}', '-Wl,--no-as-needed', '-l:libtwo.so.2', '-lm', '-Wl,-rpath,$ORIGIN/../libs',
+    )
+    return libs, package
+
+def test_read_dynamic_section(libraries):
+    libs, package = libraries
+    
+    extension = read_elf(package / 'ext.so')
+    assert extension.soname is None
+    assert extension.needed[:2] == ['libtwo.so.2', 'libm.so.6']
+    # Modern linkers emit DT_RUNPATH, older ones DT_RPATH
+    assert (extension.runpath or extension.rpath) == ['$ORIGIN/../libs']
+    
+    library = read_elf(libs / 'libtwo.so.2')
+    assert library.soname == 'libtwo.so.2'
+    assert library.needed[0] == 'libone.so.1'
+    assert library.elf_class != ELFCLASS32 or sys.maxsize < 2 ** 32
+    assert library.machine == extension.machine
+
+def test_non_elf_files(tmp_path):
+    text = tmp_path / 'module.py'
+    text.write_text('x = 1\n')
+    assert read_elf(text) is None
+    assert read_elf(tmp_path / 'missing.so') is None
+    
+    # Truncated after the identification bytes
+    truncated = tmp_path / 'truncated.so'
+    truncated.write_bytes(b'\x7fELF\x02\x01\x01' + b'\0' * 9)
+    assert read_elf(truncated) is None
+
+def test_walk_bundles_origin_dependencies_first(libraries, tmp_path):
+    libs, package = libraries
+    walker = NativeLibraryWalker(WalkerConfig(tmp_path), Logger())
+    
+    files, dependencies = walker.walk({'package.ext': package / 'ext.so'})
+    
+    # libm is never bundled, and libraries keep their full file names
+    assert [(entry.path, entry.arcname) for entry in files] == [
+        ((libs / 'libone.so.1').resolve(), 'libone.so.1'),
+        ((libs / 'libtwo.so.2').resolve(), 'libtwo.so.2'),
+    ]
+    assert dependencies == {'package.ext': ['libone.so.1', 'libtwo.so.2']}
+
+def test_unversioned_library_names_are_kept(libraries, tmp_path):
+    libs, package = libraries
+    link(libs / 'libthree.so', 'int three(void) { return 3; }\n', '-Wl,-soname,libthree.so')
+    link(
+        package / 'three.so', 'int three(void);\nint ext(void) { return three(); }\n',
+        f'-L{libs}', '-l:libthree.so', '-Wl,-rpath,$ORIGIN/../libs',
+    )
+    
+    files, dependencies = NativeLibraryWalker(WalkerConfig(tmp_path), Logger()).walk({'package.three': package / 'three.so'})
+    assert [entry.arcname for entry in files] == ['libthree.so']
+    assert dependencies == {'package.three': ['libthree.so']}
+
+def test_library_path_finds_in_system_directories(libraries, tmp_path, monkeypatch):
+    libs, package = libraries
+    link(
+        package / 'plain.so', 'int one(void);\nint ext(void) { return one(); }\n',
+        f'-L{libs}', '-l:libone.so.1',
+    )
+    extensions = {'package.plain': package / 'plain.so'}
+    monkeypatch.setenv('LD_LIBRARY_PATH', str(libs))
+    
+    files, _ = NativeLibraryWalker(WalkerConfig(tmp_path), Logger()).walk(extensions)
+    assert [entry.arcname for entry in files] == ['libone.so.1']
+    
+    # Found through LD_LIBRARY_PATH, but in a system directory
+    monkeypatch.setattr(elf, 'system_library_dirs', lambda: [str(libs)])
+    files, _ = NativeLibraryWalker(WalkerConfig(tmp_path), Logger()).walk(extensions)
+    assert files == []
+    
+    files, _ = NativeLibraryWalker(WalkerConfig(tmp_path, bundle_system_libs=True), Logger()).walk(extensions)
+    assert [entry.arcname for entry in files] == ['libone.so.1']
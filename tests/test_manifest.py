@@ -0,0 +1,98 @@
+"""
+Incremental build tests for PyPack
+The manifest carries a build's state to the next one, which redoes only what changed
+"""
+
+import subprocess
+
+import compiler
+from archive import read_archive
+from collector import CollectedFile
+from compiler import BytecodeCompiler
+from manifest import MANIFEST_VERSION, BuildManifest
+from utilities import Logger
+
+def test_round_trip(tmp_path):
+    manifest = BuildManifest(tmp_path / 'manifest.json', 'cpython-311')
+    assert not manifest.get_imports('digest')
+    
+    manifest.record_imports('digest', [['json', [], 0, 'module']])
+    manifest.record_archive('local_modules', {'mypkg': 'mypkg/__init__.py:digest:deflate:9'})
+    manifest.record_output('dist/app', 'output', 1024)
+    manifest.save([['app.py', 1, 2, 'digest']])
+    
+    # Records are only visible to the next build
+    for later in [manifest, BuildManifest(tmp_path / 'manifest.json', 'cpython-311')]:
+        assert later.get_imports('digest') == [['json', [], 0, 'module']]
+        assert later.get_archive('local_modules') == {'mypkg': 'mypkg/__init__.py:digest:deflate:9'}
+        assert later.get_output('dist/app') == ['output', 1024]
+        assert later.previous['files'] == [['app.py', 1, 2, 'digest']]
+    
+    # Anything the next build does not record again is dropped
+    manifest.save([])
+    assert manifest.get_imports('digest') is None
+
+def test_stale_manifest_is_ignored(tmp_path):
+    path = tmp_path / 'manifest.json'
+    manifest = BuildManifest(path, 'cpython-311')
+    manifest.record_output('dist/app', 'output', 1024)
+    manifest.save([])
+    
+    assert BuildManifest(path, 'cpython-312').get_output('dist/app') is None
+    
+    path.write_text(path.read_text().replace(f'"version": {MANIFEST_VERSION}', '"version": 0'))
+    assert BuildManifest(path, 'cpython-311').get_output('dist/app') is None
+    
+    path.write_text('{"truncated')
+    assert BuildManifest(path, 'cpython-311').get_output('dist/app') is None
+
+def test_only_changed_modules_are_recompiled(project, make_config, monkeypatch):
+    package_dir = project.parent / 'mypkg'
+    collected_files = {
+        'main_script': [project],
+        'stdlib_modules': [],
+        'third_party_modules': [],
+        'local_modules': [
+            CollectedFile(path, path.relative_to(project.parent).as_posix())
+            for path in sorted(package_dir.rglob('*')) if path.is_file()
+        ],
+        'data_files': [],
+    }
+    
+    compiled = []
+    compile_to_bytecode = compiler.compile_to_bytecode
+    
+    def record(source_path, source=None):
+        compiled.append(source_path)
+        return compile_to_bytecode(source_path, source)
+    
+    monkeypatch.setattr(compiler, 'compile_to_bytecode', record)
+    
+    def build(**options):
+        # Uncached, so only the manifest can save work
+        config = make_config(project, no_cache=True, jobs=1, **options)
+        result = BytecodeCompiler(config, Logger()).compile(collected_files)
+        config.manifest.save(config.cache.export_digests())
+        return result
+    
+    build(incremental=True)
+    (package_dir / 'helpers.py').write_text('import csv\n\nNAME = "changed"\n')
+    compiled.clear()
+    result = build(incremental=True)
+    
+    # The main script is always compiled, its bytecode is not in an archive
+    assert sorted(compiled) == sorted([str(project), str(package_dir / 'helpers.py')])
+    assert read_archive(result['local_modules']) == read_archive(build()['local_modules'])
+
+def test_unchanged_build_is_not_relinked(project, build_executable):
+    executable = build_executable(project, incremental=True)
+    built = executable.stat()
+    
+    assert build_executable(project, incremental=True) == executable
+    assert executable.stat().st_mtime_ns == built.st_mtime_ns
+    
+    (project.parent / 'mypkg' / 'helpers.py').write_text('import csv\n\nNAME = "changed"\n')
+    build_executable(project, incremental=True)
+    result = subprocess.run([str(executable)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-1] == 'changed'
@@ -0,0 +1,62 @@
+"""
+Stdlib minimizer tests for PyPack
+The stdlib is reduced to what the entry script reaches, with every dropped module reported
+"""
+
+import json
+
+from minimizer import StdlibMinimizer, module_matches
+from utilities import Logger
+
+# __main__ imports json and csv, csv pulls in unittest, and test is reachable only through json
+IMPORT_GRAPH = {
+    '__main__': {'json', 'csv'},
+    'json': {'json.decoder', 'test.support'},
+    'json.decoder': {'json'},
+    'csv': {'unittest'},
+    'unittest': {'unittest.mock'},
+    'unittest.mock': {'unittest', 'asyncio'},
+    'test.support': {'test'},
+    'xml': set(),
+}
+DEPENDENCIES = {
+    'builtin': set(),
+    'stdlib': {'json', 'json.decoder', 'csv', 'unittest', 'unittest.mock', 'asyncio', 'test', 'test.support', 'xml'},
+    'third_party': set(),
+    'local': {'mypkg'},
+}
+
+def minimize(config):
+    result = StdlibMinimizer(config, Logger()).minimize(DEPENDENCIES, IMPORT_GRAPH)
+    with open(config.get_work_path('stdlib_report.json'), 'r', encoding='utf-8') as f:
+        return result, json.load(f)
+
+def test_module_matches():
+    assert module_matches('unittest.mock', ['json', 'unittest']) == 'unittest'
+    assert module_matches('unittestx', ['unittest']) is None
+    assert module_matches('encodings.cp1252', ['encodings.cp*']) == 'encodings.cp*'
+
+def test_unreachable_and_denied_modules_are_dropped(project, make_config):
+    result, report = minimize(make_config(project))
+    
+    assert result['stdlib'] == {'json', 'json.decoder', 'csv', 'unittest', 'unittest.mock', 'asyncio'}
+    assert result['local'] == {'mypkg'}
+    assert report['kept'] == sorted(result['stdlib'])
+    assert report['dropped'] == {
+        'test': "denied by 'test'",
+        'test.support': "denied by 'test'",
+        'xml': "unreachable from the entry script",
+    }
+
+def test_deny_and_allow_rules(project, make_config):
+    result, report = minimize(make_config(project, stdlib_deny=['unittest'], stdlib_allow=['test.support', 'xml']))
+    
+    # Allowed modules are kept and followed even where a deny rule matches
+    assert result['stdlib'] == {'json', 'json.decoder', 'csv', 'test', 'test.support', 'xml'}
+    assert report['allow'] == ['test.support', 'xml']
+    assert report['deny'][-1] == 'unittest'
+    assert report['dropped'] == {
+        'unittest': "denied by 'unittest'",
+        'unittest.mock': "denied by 'unittest'",
+        'asyncio': "only reachable through denied modules",
+    }
@@ -0,0 +1,74 @@
+"""
+Payload format tests for PyPack
+Payloads written by PayloadWriter are parsed back through the trailer and table of contents
+"""
+
+import io
+import marshal
+
+import pytest
+
+import runtime
+from payload import BOOTSTRAP_SECTION, OPTIONS_SECTION, PAYLOAD_MAGIC, TRAILER_SIZE, PayloadWriter
+
+SECTIONS = {
+    BOOTSTRAP_SECTION: marshal.dumps(compile('x = 1', '<test>', 'exec')),
+    OPTIONS_SECTION: marshal.dumps({'profile_startup': False}),
+    'stdlib_modules': b'archive bytes' * 100,
+    'empty': b'',
+}
+
+def build():
+    writer = PayloadWriter()
+    for name, data in SECTIONS.items():
+        writer.add_section(name, data)
+    return writer
+
+def test_round_trip():
+    writer = build()
+    data = writer.to_bytes()
+    
+    buffer = io.BytesIO()
+    assert writer.write(buffer) == len(data)
+    assert buffer.getvalue() == data
+    
+    # Appended to an executable, the payload is found from the end of the file
+    sections = runtime.read_sections(memoryview(b'\x7fELF executable' + data)[len(b'\x7fELF executable'):])
+    assert {name: bytes(section) for name, section in sections.items()} == SECTIONS
+    assert runtime.read_options(sections) == {'profile_startup': False}
+
+def test_trailer():
+    data = build().to_bytes()
+    trailer = data[-TRAILER_SIZE:]
+    payload_size, toc_offset, toc_size, boot_offset, boot_size = (
+        int.from_bytes(trailer[offset:offset + 8], 'little') for offset in range(8, TRAILER_SIZE, 8)
+    )
+    
+    assert trailer[:8] == PAYLOAD_MAGIC
+    assert payload_size == len(data)
+    assert toc_offset + toc_size == len(data) - TRAILER_SIZE
+    assert data[boot_offset:boot_offset + boot_size] == SECTIONS[BOOTSTRAP_SECTION]
+
+def test_corrupt_trailer_rejected():
+    data = bytearray(build().to_bytes())
+    data[-TRAILER_SIZE] ^= 0xff
+    with pytest.raises(RuntimeError):
+        runtime.read_sections(memoryview(bytes(data)))
+
+def test_invalid_sections_rejected():
+    writer = build()
+    with pytest.raises(ValueError):
+        writer.add_section('stdlib_modules', b'again')
+    
+    writer = PayloadWriter()
+    writer.add_section('stdlib_modules', b'data')
+    with pytest.raises(ValueError):
+        writer.to_bytes()
+
+def test_digest_follows_contents():
+    digest = build().digest()
+    assert build().digest() == digest
+    
+    writer = build()
+    writer.add_section('local_modules', b'changed')
+    assert writer.digest() != digest
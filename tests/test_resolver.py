@@ -0,0 +1,39 @@
+"""
+Module resolver tests for PyPack
+Module names are classified by where they are found, without importing them
+"""
+
+import sys
+
+from analyzer import DependencyAnalyzer
+from resolver import ModuleResolver
+from utilities import Logger
+
+def test_classification(project):
+    resolver = ModuleResolver(project.parent)
+    
+    assert resolver.kind('sys') == 'builtin'
+    assert resolver.kind('json.decoder') == 'stdlib'
+    assert resolver.kind('mypkg.sub.deep') == 'local'
+    assert resolver.kind('no_such_module') == 'missing'
+    assert resolver.kind('mypkg.no_such_module') == 'missing'
+    
+    record = resolver.resolve('mypkg')
+    assert record.is_package and record.path == project.parent / 'mypkg' / '__init__.py'
+    assert 'mypkg.sub.deep' not in sys.modules
+
+def test_submodule_alias():
+    resolver = ModuleResolver()
+    record = resolver.resolve('os.path')
+    
+    # Bound by os, which is not a package, to posixpath or ntpath
+    assert record.kind == resolver.kind(sys.modules['os.path'].__name__)
+    assert record.kind != 'missing'
+    assert record.path is None
+
+def test_submodule_alias_import_is_found(make_config, tmp_path, capsys):
+    script_path = tmp_path / 'paths.py'
+    script_path.write_text('import os.path\n\nprint(os.path.sep)\n')
+    
+    DependencyAnalyzer(make_config(script_path), Logger()).analyze()
+    assert 'os.path' not in capsys.readouterr().out
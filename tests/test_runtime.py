@@ -0,0 +1,132 @@
+"""
+Runtime tests for PyPack
+Built executables serve modules and resources from their payload
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import pytest
+
+import runtime
+from archive import ArchiveWriter
+from payload import NATIVE_SECTION
+
+RESOURCE_SCRIPT = '''import importlib.resources
+import importlib.resources.abc
+import json
+import mypkg
+
+files = importlib.resources.files('mypkg')
+print(isinstance(files, importlib.resources.abc.Traversable))
+print(json.loads(files.joinpath('config.json').read_text())['name'])
+print(json.loads((files / 'data' / 'table.json').read_bytes())['key'])
+print(sorted(item.name for item in files.iterdir()))
+print(files.joinpath('data').is_dir(), files.joinpath('missing.json').is_file())
+with importlib.resources.as_file(files / 'config.json') as path:
+    print(path.read_text().strip())
+'''
+
+def run(executable):
+    """Run a built executable and return its output lines"""
+    result = subprocess.run([str(executable)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.splitlines()
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="importlib.resources.abc is new in Python 3.11")
+def test_package_resources(project, build_executable):
+    script_path = project.with_name('resources.py')
+    script_path.write_text(RESOURCE_SCRIPT)
+    
+    assert run(build_executable(script_path)) == [
+        'True',
+        'mypkg',
+        'value',
+        "['config.json', 'data']",
+        'True False',
+        '{"name": "mypkg"}',
+    ]
+
+# Compressible, so reuse is verified by checksum rather than by comparing contents
+LIBRARY = b'native code ' * 100
+CHECKSUMS = {(NATIVE_SECTION, 'libfoo.so.1'): zlib.crc32(LIBRARY)}
+
+@pytest.fixture
+def native_archive(tmp_path, monkeypatch):
+    """An archive holding libfoo.so.1, extracted under tmp_path"""
+    if os.name != 'posix':
+        pytest.skip("the extraction cache is locked with fcntl")
+    monkeypatch.setenv('BPE_EXTRACT_DIR', str(tmp_path / 'extract'))
+    
+    writer = ArchiveWriter('deflate', 9)
+    writer.add('libfoo.so.1', LIBRARY, key='libfoo.so.1')
+    return runtime.PayloadArchive(NATIVE_SECTION, memoryview(writer.to_bytes()), lambda codec: zlib)
+
+def extract(archive, build_id='build'):
+    cache = runtime.ExtractionCache(build_id, CHECKSUMS)
+    return cache, cache.extract(archive, 'libfoo.so.1', archive.find('libfoo.so.1'), 'libfoo.so.1')
+
+def test_extracted_files_are_reused(native_archive, monkeypatch):
+    cache, path = extract(native_archive)
+    assert path == os.path.join(cache.directory, 'libfoo.so.1')
+    with open(path, 'rb') as f:
+        assert f.read() == LIBRARY
+    
+    # A later run checks the file against its checksum instead of reading the archive
+    def read(index):
+        raise AssertionError("entry read again")
+    
+    monkeypatch.setattr(native_archive, 'read', read)
+    assert extract(native_archive)[1] == path
+
+def test_corrupt_files_are_extracted_again(native_archive):
+    _, path = extract(native_archive)
+    for corrupt in [b'x' * len(LIBRARY), LIBRARY[:-1]]:
+        with open(path, 'wb') as f:
+            f.write(corrupt)
+        assert extract(native_archive)[1] == path
+        with open(path, 'rb') as f:
+            assert f.read() == LIBRARY
+
+def test_writers_wait_for_the_lock(native_archive):
+    import fcntl
+    cache = runtime.ExtractionCache('build', CHECKSUMS)
+    fd = os.open(os.path.join(cache.app_dir, '.lock'), os.O_RDWR | os.O_CREAT)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    
+    paths = []
+    writer = threading.Thread(target=lambda: paths.append(extract(native_archive)[1]))
+    try:
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive()
+        assert os.listdir(cache.directory) == []
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+    
+    writer.join(5)
+    assert not writer.is_alive()
+    # Renamed into place, with no temporary file left behind
+    assert os.listdir(cache.directory) == ['libfoo.so.1']
+    with open(paths[0], 'rb') as f:
+        assert f.read() == LIBRARY
+
+def test_least_recently_used_builds_are_evicted(native_archive, monkeypatch):
+    app_dir = Path(runtime.ExtractionCache('build', CHECKSUMS).app_dir)
+    now = time.time()
+    for age, build_id in enumerate(['newer', 'older'], 1):
+        (app_dir / build_id).mkdir()
+        (app_dir / build_id / 'libfoo.so.1').write_bytes(b'\0' * 2000)
+        os.utime(app_dir / build_id, (now - age * 60, now - age * 60))
+    
+    # Room for one of the old builds next to this one
+    monkeypatch.setenv('BPE_EXTRACT_CACHE_SIZE', str(2000 + len(LIBRARY) + 100))
+    extract(native_archive)
+    
+    assert sorted(path.name for path in app_dir.iterdir() if path.is_dir()) == ['build', 'newer']
@@ -0,0 +1,53 @@
+"""
+Import tracer tests for PyPack
+Modules loaded by traced runs are merged into the statically analyzed graph
+"""
+
+import shlex
+import sys
+
+from analyzer import DependencyAnalyzer
+from tracer import ImportTracer, import_phase_end
+from utilities import Logger
+
+# Plugins are imported by name, which static analysis cannot follow
+PLUGIN_FILES = {
+    'app.py': 'import importlib\nimport sys\n\nimportlib.import_module(sys.argv[1] if len(sys.argv) > 1 else "plugin_a")\n',
+    'plugin_a.py': 'import colorsys\n',
+    'plugin_b.py': '__import__("plugin_c")\n',
+    'plugin_c.py': '',
+}
+
+def write_plugins(tmp_path):
+    project_dir = tmp_path / 'plugins'
+    project_dir.mkdir()
+    for name, source in PLUGIN_FILES.items():
+        (project_dir / name).write_text(source)
+    return project_dir / 'app.py'
+
+def analyze(config):
+    """Trace, then analyze, the way main.py does"""
+    config.traced_modules = ImportTracer(config, Logger()).trace_analysis()
+    dependency_analyzer = DependencyAnalyzer(config, Logger())
+    return dependency_analyzer.analyze(), dependency_analyzer.import_graph
+
+def test_import_phase_end():
+    assert import_phase_end('"""Doc"""\nimport os\ntry:\n    import yaml\nexcept ImportError:\n    yaml = None\nprint(os)\n') == 6
+    assert import_phase_end('import os\nimport sys\n# bpe: end-imports\nimport json\n') == 2
+
+def test_traced_modules_are_merged(make_config, tmp_path):
+    script_path = write_plugins(tmp_path)
+    dependencies, graph = analyze(make_config(script_path, trace_analysis=True))
+    
+    assert dependencies['local'] == {'plugin_a'}
+    assert 'plugin_a' in graph['__main__']
+    # Traced modules are analyzed like any other, so their own imports are followed
+    assert 'colorsys' in graph['plugin_a']
+    assert 'colorsys' in dependencies['stdlib']
+
+def test_trace_args_and_commands_are_combined(make_config, tmp_path):
+    script_path = write_plugins(tmp_path)
+    command = f"cd {shlex.quote(str(script_path.parent))} && {shlex.quote(sys.executable)} app.py plugin_a"
+    dependencies, _ = analyze(make_config(script_path, trace_args=['plugin_b'], trace_commands=[command]))
+    
+    assert dependencies['local'] == {'plugin_a', 'plugin_b', 'plugin_c'}
@@ -0,0 +1,50 @@
+"""
+Watch mode tests for PyPack
+Only saves that can change the build wake the watcher, and a burst of them is one change
+"""
+
+import watcher
+from utilities import Logger
+from watcher import BuildWatcher, PollingWatcher
+
+class SavingWatcher(PollingWatcher):
+    """Runs the next step of a multi-file save each time it is waited on"""
+    
+    def __init__(self, directories, saves):
+        super().__init__(directories)
+        self.saves = saves
+    
+    def wait(self, timeout=None):
+        if self.saves:
+            self.saves.pop(0)()
+        return super().wait(timeout)
+
+def test_relevant_events(project, make_config):
+    build_watcher = BuildWatcher(make_config(project), Logger())
+    project_dir = project.parent.resolve()
+    helpers = project_dir / 'mypkg' / 'helpers.py'
+    watched = build_watcher._watched([helpers])
+    
+    events = {
+        project_dir / 'app.py', helpers, project_dir / 'added.py', project_dir / 'mypkg' / '__init__.py',
+        project_dir / '.#app.py', project_dir / 'app.py~', project_dir / '.hidden.py',
+        project_dir / 'my-module.py', project_dir / 'notes.txt',
+    }
+    assert build_watcher._relevant(events, watched) == {
+        project_dir / 'app.py', helpers, project_dir / 'added.py', project_dir / 'mypkg' / '__init__.py',
+    }
+
+def test_burst_of_saves_is_one_change(project, make_config, monkeypatch):
+    monkeypatch.setattr(watcher, 'POLL_INTERVAL', 0.01)
+    build_watcher = BuildWatcher(make_config(project), Logger())
+    project_dir = project.parent.resolve()
+    
+    saves = [
+        lambda: (project_dir / 'app.py').write_text('print("saved")\n'),
+        lambda: (project_dir / '.#app.py').write_text('lock\n'),
+        lambda: (project_dir / 'added.py').write_text('VALUE = 1\n'),
+    ]
+    polling = SavingWatcher({project_dir}, saves)
+    
+    assert build_watcher._wait_for_change(polling, [project]) == {project_dir / 'app.py', project_dir / 'added.py'}
+    assert saves == []